@@ -0,0 +1,248 @@
+"""
+離線重播與效能量測：把錄影檔、圖片資料夾或合成的皺褶影像餵進與 update_frame 相同的處理流程，
+輸出各段耗時、fps、p50/p99 延遲、記憶體峰值，以及每張影格的區塊數 / 皺褶% 序列。
+不需要攝影機與畫面，可在 CI 上比較參數與版本差異。
+
+  python bench.py --synthetic 300
+  python bench.py --video line3.mp4 --gradient s16_l1 --series out.csv --json report.json
+  python bench.py --images ./frames --full-res --roi 0.1,0.2,0.8,0.5
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from blobs import BACKENDS as BLOB_BACKENDS
+from gradient import BACKENDS
+from metrics import StageTimer
+from thresholding import MODES as THRESHOLD_MODES
+from compositor import DisplayCompositor, PANELS
+from wrinkle_detector import DetectorParams, MultiRoiDetector, RoiSpec
+
+STAGES = ("resize", "change_check", "cvtColor", "sobel", "magnitude", "threshold", "findContours",
+          "components", "contour_filter", "density", "annotate", "display")
+
+
+# ========= 影格來源 ==========
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def image_frames(folder):
+    paths = []
+    for ext in ("png", "jpg", "jpeg", "bmp", "tif", "tiff"):
+        paths += glob.glob(os.path.join(folder, f"*.{ext}"))
+    for path in sorted(paths):
+        # np.fromfile + imdecode：Windows 中文路徑也能讀
+        frame = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            yield frame
+
+
+def synthetic_frames(count, size=(640, 480), seed=0):
+    """
+    產生固定亂數種子的合成皺褶影像：灰階底 + 雜訊 + 幾道會慢慢漂移、強弱變化的斜向皺褶，
+    沒有樣本資料也能跑出有意義的結果。
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    waves = [(rng.uniform(0.3, 1.2), rng.uniform(8, 30), rng.uniform(0, 2 * np.pi)) for _ in range(3)]
+    for i in range(count):
+        img = np.full((h, w), 128, np.float32)
+        for angle, period, phase in waves:
+            strength = 20 + 40 * (0.5 + 0.5 * np.sin(i / 25.0 + phase))
+            proj = xx * np.cos(angle) + yy * np.sin(angle)
+            band = np.sin(proj / period + phase + i * 0.05)
+            img += strength * np.maximum(band, 0) ** 8
+        img += rng.normal(0, 4, img.shape).astype(np.float32)
+        gray = np.clip(img, 0, 255).astype(np.uint8)
+        yield cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+# ========= 量測 ==========
+def percentile_ms(values, q):
+    return float(np.percentile(values, q) * 1000) if len(values) else 0.0
+
+
+def peak_rss_mb():
+    """整個行程的 RSS 峰值（含 OpenCV 內部配置）；Windows 無 resource 模組時回傳 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位 KB，macOS 為 bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run(frames, detector, display=True, warmup=5, limit=None):
+    timer = StageTimer()
+    compositor = DisplayCompositor(detector.base_params.frame_size, PANELS) if display else None
+    latencies = []
+    series = []
+    decode_s = 0.0
+    tracemalloc.start()
+    t_start = None
+    frames = iter(frames)
+    detector.timer = timer
+    i = 0
+    while limit is None or i < limit + warmup:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+        if i == warmup:
+            # 暖機結束：清掉前面幾張的數據（緩衝區配置、執行緒池啟動等一次性成本）
+            timer.reset()
+            latencies.clear()
+            decode_s = 0.0
+            t_start = t1
+        result = detector.process(frame, ts=i, annotate=display)
+        if display:
+            timer.start()
+            shown = next(iter(result.rois.values()))
+            compositor.render({"annotated": result.annotated, "sobel": shown.sobel,
+                               "gray": result.gray, "thresh": shown.thresh})
+            pil = compositor.image()
+            timer.mark("display")
+            if i == 0 and not np.array_equal(np.asarray(pil), compositor.buffer):
+                raise RuntimeError("顯示用的 PIL 影像與拼圖緩衝區內容不一致")
+        t2 = time.perf_counter()
+        decode_s += t1 - t0
+        latencies.append(t2 - t1)
+        row = {"frame": i, "defect_count": result.defect_count, "wrinkle": round(result.wrinkle, 4),
+               "reused": result.reused, "total_length": round(result.total_length, 1)}
+        if len(result.rois) > 1:
+            row["rois"] = {n: [r.defect_count, round(r.wrinkle, 4)] for n, r in result.rois.items()}
+        series.append(row)
+        i += 1
+    elapsed = time.perf_counter() - t_start if t_start is not None else 0.0
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    measured = len(latencies) if t_start is not None else 0
+    reused = sum(row["reused"] for row in series[len(series) - measured:]) if measured else 0
+    stages = {}
+    for name in STAGES:
+        vals = timer.samples.get(name, [])
+        if vals:
+            stages[name] = {"mean_ms": float(np.mean(vals) * 1000), "p50_ms": percentile_ms(vals, 50),
+                            "p99_ms": percentile_ms(vals, 99), "total_s": float(np.sum(vals))}
+    return {
+        "frames": measured,
+        "warmup": min(warmup, len(series)),
+        "fps": measured / elapsed if elapsed > 0 else 0.0,
+        "reused_frames": reused,
+        "fps_excluding_decode": measured / (elapsed - decode_s) if elapsed - decode_s > 0 else 0.0,
+        "latency_p50_ms": percentile_ms(latencies, 50) if measured else 0.0,
+        "latency_p99_ms": percentile_ms(latencies, 99) if measured else 0.0,
+        "decode_ms_mean": decode_s / measured * 1000 if measured else 0.0,
+        "peak_traced_mb": traced_peak / 1024 / 1024,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }, series
+
+
+def parse_pair(text, cast=float, sep=","):
+    return tuple(cast(v) for v in text.split(sep))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RTR-TP 皺褶檢測 離線重播 / 效能量測")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--video", help="錄影檔路徑")
+    src.add_argument("--images", help="圖片資料夾（依檔名排序）")
+    src.add_argument("--synthetic", type=int, metavar="N", help="產生 N 張合成皺褶影像")
+    ap.add_argument("--synthetic-size", default="640x480", help="合成影像大小，例如 1920x1080")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--edge", type=int, default=50, help="邊緣強度")
+    ap.add_argument("--min-area", type=int, default=200, help="最小區塊面積")
+    ap.add_argument("--ksize", type=int, default=3, help="Sobel 核心大小")
+    ap.add_argument("--gradient", choices=BACKENDS, default="f64")
+    ap.add_argument("--blobs", choices=BLOB_BACKENDS, default="contours", help="區塊分析方式")
+    ap.add_argument("--threshold-mode", choices=THRESHOLD_MODES, default="fixed", help="二值化門檻方式")
+    ap.add_argument("--percentile", type=float, default=99.0, help="percentile 模式的百分位數")
+    ap.add_argument("--tiles", type=int, default=0, help="自動門檻分格數（N×N，0 = 整個 ROI 一個門檻）")
+    ap.add_argument("--density", default="0x1", help="分格密度熱度圖 欄x列，例如 8x1（0x1 = 不分格）")
+    ap.add_argument("--roi", action="append", default=None,
+                    help="比例 ROI x,y,w,h（0~1），可重複指定多個")
+    ap.add_argument("--frame-size", default="320x240", help="縮放分析 / 預覽尺寸")
+    ap.add_argument("--full-res", action="store_true", help="ROI 以原始解析度分析")
+    ap.add_argument("--skip-diff", type=float, default=0.0,
+                    help="ROI 平均灰階差不超過此值時沿用上次結果（0 = 每張都分析）")
+    ap.add_argument("--workers", type=int, default=None, help="多 ROI 執行緒數")
+    ap.add_argument("--no-display", action="store_true", help="不量測顯示拼圖（等同無畫面產線電腦）")
+    ap.add_argument("--warmup", type=int, default=5, help="不列入統計的前幾張")
+    ap.add_argument("--limit", type=int, default=None, help="最多處理幾張（不含暖機）")
+    ap.add_argument("--series", help="輸出每張影格結果的 CSV")
+    ap.add_argument("--json", help="輸出統計結果 JSON")
+    args = ap.parse_args(argv)
+
+    if args.video:
+        frames = video_frames(args.video)
+    elif args.images:
+        frames = image_frames(args.images)
+    else:
+        frames = synthetic_frames(args.synthetic, parse_pair(args.synthetic_size, int, "x"), args.seed)
+
+    density = parse_pair(args.density, int, "x")
+    base = DetectorParams(edge_threshold=args.edge, min_area=args.min_area, sobel_ksize=args.ksize,
+                          frame_size=parse_pair(args.frame_size, int, "x"), gradient=args.gradient,
+                          full_res=args.full_res, skip_diff=args.skip_diff, blobs=args.blobs,
+                          threshold_mode=args.threshold_mode, auto_percentile=args.percentile,
+                          adaptive_tiles=args.tiles, density_cols=density[0], density_rows=density[1])
+    rois = [RoiSpec(f"ROI{i + 1}", parse_pair(r), args.edge, args.min_area, args.ksize)
+            for i, r in enumerate(args.roi or ["0.25,0.25,0.5,0.5"])]
+    detector = MultiRoiDetector(base, rois, workers=args.workers)
+    try:
+        report, series = run(frames, detector, display=not args.no_display, warmup=args.warmup, limit=args.limit)
+    finally:
+        detector.close()
+    report["params"] = {"edge": args.edge, "min_area": args.min_area, "ksize": args.ksize,
+                        "gradient": args.gradient, "blobs": args.blobs, "full_res": args.full_res, "skip_diff": args.skip_diff,
+                        "threshold_mode": args.threshold_mode, "percentile": args.percentile, "tiles": args.tiles,
+                        "density": list(density),
+                        "rois": [r.roi for r in rois]}
+
+    print(f"影格數 {report['frames']}（暖機 {report['warmup']}）  fps {report['fps']:.1f}"
+          f"（不含解碼 {report['fps_excluding_decode']:.1f}）  沿用結果 {report['reused_frames']} 張")
+    print(f"延遲 p50 {report['latency_p50_ms']:.2f} ms  p99 {report['latency_p99_ms']:.2f} ms  "
+          f"解碼平均 {report['decode_ms_mean']:.2f} ms")
+    rss = report["peak_rss_mb"]
+    print(f"記憶體峰值 numpy/Python {report['peak_traced_mb']:.1f} MB"
+          + (f"  行程 RSS {rss:.1f} MB" if rss is not None else ""))
+    print(f"{'階段':<16}{'平均 ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, st in report["stages"].items():
+        print(f"{name:<16}{st['mean_ms']:>10.3f}{st['p50_ms']:>10.3f}{st['p99_ms']:>10.3f}")
+
+    if args.series:
+        with open(args.series, "w", encoding="utf-8") as f:
+            f.write("frame,區塊數,皺褶%,各ROI,總皺褶長度\n")
+            for row in series:
+                rois_txt = ";".join(f"{n}={c}/{w}" for n, (c, w) in row.get("rois", {}).items())
+                f.write(f"{row['frame']},{row['defect_count']},{row['wrinkle']},{rois_txt},{row['total_length']}\n")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
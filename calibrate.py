@@ -0,0 +1,252 @@
+"""
+離線校正：用一段錄影掃過 邊緣強度 × Sobel 核心 × 最小區塊面積 的所有組合，
+找出誤判率（正常畫面被判為異常的比例）不超過目標值、又最靈敏的一組參數。
+
+  正常畫面的判定：區塊數 ≥ --trigger-count 即視為「異常」（與截圖基準相同）。
+  沒有 --labels：整段錄影都當作正常的膜，選誤判率達標中邊緣強度最低、面積最小的一組。
+  有 --labels：標註檔每行一個影格編號或範圍（例如 120-180），標註的影格是真的有皺褶，
+               選誤判率達標中偵測率最高的一組。
+
+計算方式：每張影格的 ROI 只裁切一次；同一個核心大小的 Sobel 只算一次，
+每個邊緣強度二值化與找區塊一次，各個最小面積直接由區塊面積過濾，不必重跑。
+影格邊讀邊切成一段段（--chunk 張）交給多個行程平行計算，核心數越多越快；
+同時在處理的段數有上限，記憶體用量只和段的大小有關，與錄影長度無關。
+
+  python calibrate.py --video good_film.mp4 --target-fp 0.01
+  python calibrate.py --video line3.mp4 --labels wrinkles.txt --edges 20:120:5 --ksizes 3,5 --min-areas 50,100,200,400
+  python calibrate.py --video good_film.mp4 --config wrinkle_config.json --profile A100   # 結果寫回型號參數
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import cv2
+import numpy as np
+
+from bench import image_frames, parse_pair, synthetic_frames, video_frames
+from blobs import BACKENDS as BLOB_BACKENDS, find_defects
+from gradient import BACKENDS, GradientBackend
+from wrinkle_detector import DetectorParams, RoiSpec, crop_roi
+
+
+def parse_values(text, cast=int):
+    """「20:120:5」（起:迄:間隔，含迄）或「3,5,7」"""
+    if ":" in text:
+        start, stop, step = (float(v) for v in text.split(":"))
+        return [cast(v) for v in np.arange(start, stop + step / 2, step)]
+    return [cast(v) for v in text.split(",")]
+
+
+def load_labels(path):
+    """標註檔 → 有皺褶的影格編號集合（每行 N 或 N-M，# 之後為註解）"""
+    frames = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if "-" in line:
+                a, b = (int(v) for v in line.split("-", 1))
+                frames.update(range(a, b + 1))
+            else:
+                frames.add(int(line))
+    return frames
+
+
+def sweep_chunk(crops, ksizes, edges, min_areas, gradient, blobs, area_scale):
+    """
+    子行程：一段影格的 ROI 灰階 → 各組合的區塊數 counts[影格, 核心, 邊緣, 面積]
+    與皺褶% wrinkle[影格, 核心, 邊緣]
+    """
+    counts = np.zeros((len(crops), len(ksizes), len(edges), len(min_areas)), np.int32)
+    wrinkle = np.zeros((len(crops), len(ksizes), len(edges)), np.float32)
+    backend = GradientBackend(gradient)
+    limits = np.asarray(min_areas, np.float64) * area_scale
+    floor = float(limits.min())
+    for i, gray in enumerate(crops):
+        for k, ksize in enumerate(ksizes):
+            sobel = backend.compute(gray, ksize)
+            for e, edge in enumerate(edges):
+                _, thresh = cv2.threshold(sobel, edge, 255, cv2.THRESH_BINARY)
+                wrinkle[i, k, e] = cv2.countNonZero(thresh) / thresh.size * 100
+                areas = find_defects(thresh, floor, blobs)["area"]
+                counts[i, k, e] = (areas[:, None] > limits[None, :]).sum(axis=0)
+    return counts, wrinkle
+
+
+def roi_chunks(frames, params, step=1, limit=None, chunk=64):
+    """
+    依偵測引擎相同的方式裁切 ROI 並轉灰階，每 chunk 張產生一次 (灰階 ROI 清單, 面積換算倍率)；
+    邊讀邊產生，不會把整段錄影留在記憶體裡
+    """
+    crops = []
+    area_scale = 1.0
+    for frame in islice(frames, 0, None if limit is None else limit * step, step):
+        crop, size, _ = crop_roi(frame, params)
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        scale = 1.0
+        if params.full_res:
+            fh, fw = frame.shape[:2]
+            scale = (fw * fh) / (params.frame_size[0] * params.frame_size[1])
+        if crops and (len(crops) >= chunk or scale != area_scale):
+            yield crops, area_scale
+            crops = []
+        crops.append(gray)
+        area_scale = scale
+    if crops:
+        yield crops, area_scale
+
+
+def sweep(chunks, ksizes, edges, min_areas, gradient="f64", blobs="contours", workers=None):
+    """
+    chunks：roi_chunks 產生的各段。平行掃過所有組合，回傳合併後的 (counts, wrinkle)，第一維依影格順序。
+    每讀好一段就交給行程池，同時在處理的段數上限為行程數的兩倍，讀取與計算重疊
+    """
+    workers = workers or os.cpu_count() or 1
+    args = (ksizes, edges, min_areas, gradient, blobs)
+    if workers <= 1:
+        parts = [sweep_chunk(crops, *args, scale) for crops, scale in chunks]
+    else:
+        parts, pending = [], deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for crops, scale in chunks:
+                if len(pending) >= workers * 2:
+                    parts.append(pending.popleft().result())
+                pending.append(pool.submit(sweep_chunk, crops, *args, scale))
+            parts.extend(f.result() for f in pending)
+    if not parts:
+        shape = (0, len(ksizes), len(edges))
+        return np.zeros(shape + (len(min_areas),), np.int32), np.zeros(shape, np.float32)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def evaluate(counts, wrinkle, ksizes, edges, min_areas, trigger_count, positives=None):
+    """每個組合的誤判率 / 偵測率與平均區塊數，依靈敏度排序（最靈敏的在前）"""
+    flagged = counts >= trigger_count                       # [影格, 核心, 邊緣, 面積]
+    n = len(counts)
+    is_pos = np.zeros(n, bool)
+    if positives:
+        is_pos[[i for i in positives if i < n]] = True
+    neg = ~is_pos
+    fp = flagged[neg].mean(axis=0) if neg.any() else np.zeros(flagged.shape[1:])
+    tp = flagged[is_pos].mean(axis=0) if is_pos.any() else None
+    rows = []
+    for k, ksize in enumerate(ksizes):
+        for e, edge in enumerate(edges):
+            for a, min_area in enumerate(min_areas):
+                rows.append({
+                    "edge": edge, "ksize": ksize, "min_area": min_area,
+                    "fp_rate": float(fp[k, e, a]),
+                    "tp_rate": float(tp[k, e, a]) if tp is not None else None,
+                    "mean_count": float(counts[neg, k, e, a].mean()) if neg.any() else 0.0,
+                    "mean_wrinkle": float(wrinkle[neg, k, e].mean()) if neg.any() else 0.0,
+                })
+    if tp is not None:
+        rows.sort(key=lambda r: (-r["tp_rate"], r["fp_rate"], r["edge"], r["min_area"]))
+    else:
+        rows.sort(key=lambda r: (r["edge"], r["min_area"], r["fp_rate"]))
+    return rows
+
+
+def pick(rows, target_fp):
+    """第一個誤判率不超過 target_fp 的組合（rows 已依靈敏度排序）；都不達標回傳 None"""
+    return next((r for r in rows if r["fp_rate"] <= target_fp), None)
+
+
+def write_profile(path, profile_name, best):
+    """最佳參數寫進設定檔中指定型號的每個 ROI（主程式會自動重新載入）"""
+    import config
+    profiles = config.load(path) if os.path.exists(path) else config.ProfileSet()
+    base = profiles.profiles.get(profile_name, config.Profile())
+    rois = tuple(RoiSpec(r.name, r.roi, best["edge"], best["min_area"], best["ksize"]) for r in base.rois)
+    config.save(path, profiles.with_profile(profile_name, base.updated(threshold_mode="fixed", rois=rois),
+                                            activate=profile_name == profiles.active))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RTR-TP 皺褶檢測 參數校正（以錄影掃描邊緣強度 / 核心 / 面積）")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--video", help="錄影檔路徑")
+    src.add_argument("--images", help="圖片資料夾（依檔名排序）")
+    src.add_argument("--synthetic", type=int, metavar="N", help="產生 N 張合成皺褶影像（測試用）")
+    ap.add_argument("--labels", help="有皺褶的影格標註檔（每行 N 或 N-M）")
+    ap.add_argument("--target-fp", type=float, default=0.01, help="可接受的誤判率（0.01 = 1%% 的正常影格）")
+    ap.add_argument("--trigger-count", type=int, default=20, help="區塊數 ≥ 此值視為異常")
+    ap.add_argument("--edges", default="10:150:5", help="邊緣強度（起:迄:間隔 或 逗號分隔）")
+    ap.add_argument("--ksizes", default="3,5,7", help="Sobel 核心大小")
+    ap.add_argument("--min-areas", default="50,100,200,300,400,600", help="最小區塊面積")
+    ap.add_argument("--roi", default="0.25,0.25,0.5,0.5", help="ROI（x,y,w,h 比例）")
+    ap.add_argument("--frame-size", default="320x240", help="縮放分析尺寸（與主程式相同）")
+    ap.add_argument("--full-res", action="store_true", help="ROI 以原始解析度分析")
+    ap.add_argument("--gradient", choices=BACKENDS, default="f64")
+    ap.add_argument("--blobs", choices=BLOB_BACKENDS, default="contours")
+    ap.add_argument("--step", type=int, default=1, help="每隔幾張取一張")
+    ap.add_argument("--limit", type=int, default=None, help="最多使用幾張")
+    ap.add_argument("--workers", type=int, default=None, help="平行行程數（預設為核心數）")
+    ap.add_argument("--chunk", type=int, default=64, help="每段交給行程計算的影格數（影響記憶體用量）")
+    ap.add_argument("--top", type=int, default=10, help="列出前幾個達標的組合")
+    ap.add_argument("--json", help="輸出所有組合的結果 JSON")
+    ap.add_argument("--config", help="把最佳參數寫入此設定檔（wrinkle_config.json）")
+    ap.add_argument("--profile", help="寫入的型號名稱（預設為使用中的型號）")
+    args = ap.parse_args(argv)
+
+    if args.video:
+        frames = video_frames(args.video)
+    elif args.images:
+        frames = image_frames(args.images)
+    else:
+        frames = synthetic_frames(args.synthetic)
+    ksizes = parse_values(args.ksizes)
+    edges = parse_values(args.edges)
+    min_areas = parse_values(args.min_areas)
+    params = DetectorParams(roi=parse_pair(args.roi), frame_size=parse_pair(args.frame_size, int, "x"),
+                            full_res=args.full_res)
+    positives = load_labels(args.labels) if args.labels else None
+
+    t0 = time.perf_counter()
+    # 標註的影格編號是原始影片的編號，step > 1 時換算
+    if positives and args.step > 1:
+        positives = {i // args.step for i in positives if i % args.step == 0}
+    chunks = roi_chunks(frames, params, args.step, args.limit, max(1, args.chunk))
+    counts, wrinkle = sweep(chunks, ksizes, edges, min_areas, args.gradient, args.blobs, args.workers)
+    t1 = time.perf_counter()
+    if not len(counts):
+        ap.error("讀不到任何影格")
+    rows = evaluate(counts, wrinkle, ksizes, edges, min_areas, args.trigger_count, positives)
+    best = pick(rows, args.target_fp)
+
+    combos = len(ksizes) * len(edges) * len(min_areas)
+    print(f"影格 {len(counts)} 張 × {combos} 組參數：讀取與掃描 {t1 - t0:.1f} 秒"
+          f"（{args.workers or os.cpu_count()} 個行程，每段 {args.chunk} 張）")
+    print(f"{'邊緣':>6}{'核心':>6}{'面積':>8}{'誤判率':>10}{'偵測率':>10}{'平均區塊':>10}{'平均皺褶%':>11}")
+    shown = [r for r in rows if r["fp_rate"] <= args.target_fp][:args.top]
+    for r in shown:
+        tp = f"{r['tp_rate'] * 100:9.1f}%" if r["tp_rate"] is not None else f"{'-':>10}"
+        print(f"{r['edge']:>6}{r['ksize']:>6}{r['min_area']:>8}{r['fp_rate'] * 100:9.2f}%{tp}"
+              f"{r['mean_count']:>10.1f}{r['mean_wrinkle']:>11.2f}")
+    if best is None:
+        print(f"⚠️ 沒有任何組合的誤判率 ≤ {args.target_fp * 100:g}%，請放寬範圍（調高邊緣強度或面積）")
+    else:
+        print(f"建議：邊緣強度 {best['edge']}，Sobel 核心 {best['ksize']}，最小區塊面積 {best['min_area']}"
+              f"（誤判率 {best['fp_rate'] * 100:.2f}%）")
+        if args.config:
+            import config
+            name = args.profile or (config.load(args.config).active if os.path.exists(args.config)
+                                    else config.DEFAULT_PROFILE)
+            write_profile(args.config, name, best)
+            print(f"已寫入 {args.config} 的型號「{name}」")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"frames": len(counts), "target_fp": args.target_fp, "trigger_count": args.trigger_count,
+                       "best": best, "results": rows}, f, ensure_ascii=False, indent=2)
+    return 0 if best is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
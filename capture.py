@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+
+import cv2
+
+from discovery import open_capture
+
+
+# ========= 最新影格環形緩衝 ==========
+class FrameRing:
+    """
+    只保留最近幾張影格的緩衝區，每張附帶序號與擷取時間。
+    讀取端永遠拿最新的一張，中間來不及處理的影格會記入 dropped。
+    """
+
+    def __init__(self, size=2):
+        self._buf = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.seq = 0          # 累計寫入張數
+        self.dropped = 0      # 讀取端跳過（沒處理到）的張數
+        self._last_read = 0
+
+    def put(self, frame, ts=None):
+        with self._cond:
+            self.seq += 1
+            self._buf.append((self.seq, time.time() if ts is None else ts, frame))
+            self._cond.notify_all()
+        return self.seq
+
+    def latest(self, after_seq=0, timeout=None):
+        """取得序號大於 after_seq 的最新影格 (seq, ts, frame)，逾時回傳 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+            item = self._buf[-1]
+            skipped = item[0] - max(self._last_read, after_seq) - 1
+            if skipped > 0:
+                self.dropped += skipped
+            self._last_read = item[0]
+            return item
+
+    def peek(self):
+        """不等待、不計丟幀，只看目前最新的一張"""
+        with self._cond:
+            return self._buf[-1] if self._buf else None
+
+
+# ========= 攝影機設定 ==========
+@dataclass(frozen=True)
+class CameraSettings:
+    """
+    開啟攝影機時套用的設定；0、空字串或 None 表示沿用驅動預設。
+    預設要求 MJPG：USB2 上未壓縮的 YUYV 在高解析度時通常只剩 5~10 fps。
+    buffersize=1：驅動內部只留一張，read() 拿到的就是最新畫面，不會排在舊影格後面。
+    """
+    width: int = 0
+    height: int = 0
+    fps: float = 0
+    fourcc: str = "MJPG"
+    buffersize: int = 1
+    exposure: float = None
+    gain: float = None
+
+    def apply(self, cap):
+        """套用到已開啟的 VideoCapture，回傳裝置實際接受的值（不支援的屬性驅動會直接忽略）"""
+        # FOURCC 要在解析度之前設定，部分驅動換格式時會重設解析度
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc[:4].ljust(4)))
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffersize:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffersize)
+        if self.exposure is not None:
+            # 手動曝光的值各 backend 不同：V4L2 為 1，DSHOW / MSMF 為 0.25
+            cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1 if cap.getBackendName() == "V4L2" else 0.25)
+            cap.set(cv2.CAP_PROP_EXPOSURE, self.exposure)
+        if self.gain is not None:
+            cap.set(cv2.CAP_PROP_GAIN, self.gain)
+        return readback(cap)
+
+    def as_config(self, prefix):
+        """save_config 用的 {prefix_欄位: 值}"""
+        return {f"{prefix}_{f.name}": "" if getattr(self, f.name) is None else getattr(self, f.name)
+                for f in fields(self)}
+
+    @classmethod
+    def from_config(cls, config, prefix):
+        """從 load_config 讀到的 dict 建立；沒有的欄位用預設值"""
+        values = {}
+        for f in fields(cls):
+            text = str(config.get(f"{prefix}_{f.name}", "")).strip()
+            if f.name == "fourcc":
+                values[f.name] = text if f"{prefix}_fourcc" in config else cls.fourcc
+            elif text:
+                values[f.name] = float(text) if f.name in ("fps", "exposure", "gain") else int(float(text))
+        return cls(**values)
+
+
+def readback(cap):
+    """裝置目前實際的設定值"""
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ")
+    return {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+        "fourcc": fourcc,
+        "buffersize": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        "exposure": cap.get(cv2.CAP_PROP_EXPOSURE),
+        "gain": cap.get(cv2.CAP_PROP_GAIN),
+    }
+
+
+def missed_frames(dt, nominal_fps):
+    """
+    兩次 read() 間隔 dt 秒、裝置標稱 nominal_fps 時，推估中間漏掉的張數（裝置掉幀或 read() 來不及）。
+    間隔未超過 1.5 個影格週期視為正常抖動；不知道標稱 fps 時回傳 0
+    """
+    if nominal_fps <= 0 or dt * nominal_fps < 1.5:
+        return 0
+    return int(round(dt * nominal_fps)) - 1
+
+
+# ========= 攝影機擷取執行緒 ==========
+class CameraGrabber(threading.Thread):
+    """
+    每台攝影機一條執行緒，不停 read() 並寫入 FrameRing。
+    VideoCapture 在執行緒內開啟與釋放，慢的 USB 攝影機不會卡住 UI。
+    after：換攝影機時傳入舊的擷取執行緒，等它釋放裝置後才開啟（同一台裝置不會被搶）。
+    settings：開啟後套用的 CameraSettings，裝置實際接受的值放在 actual。
+    """
+
+    def __init__(self, source, ring_size=2, name=None, after=None, settings=None):
+        super().__init__(name=name or f"grabber-{source}", daemon=True)
+        self.source = source
+        self.settings = settings
+        self.actual = {}
+        self.fps = 0.0         # 實際讀到影格的速度（指數平滑）
+        self.ring = FrameRing(ring_size)
+        self.read_failures = 0
+        self.missed = 0        # 擷取端漏掉的張數（依讀取間隔推估，見 missed_frames）
+        self.opened = threading.Event()
+        self._after = after
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        if self._after is not None and self._after.is_alive():
+            self._after.join(timeout=5)
+        self._after = None
+        cap = open_capture(self.source)
+        if cap.isOpened():
+            self.actual = self.settings.apply(cap) if self.settings is not None else readback(cap)
+        self.opened.set()
+        nominal = self.actual.get("fps") or 0.0
+        last = None
+        try:
+            while not self._stop_evt.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    self.read_failures += 1
+                    last = None  # 讀取失敗另外計數，等待的時間不算漏幀
+                    self._stop_evt.wait(0.2)
+                    continue
+                now = time.time()
+                if last is not None and now > last:
+                    self.fps += 0.05 * (1.0 / (now - last) - self.fps)
+                    self.missed += missed_frames(now - last, nominal)
+                last = now
+                self.ring.put(frame, now)
+        finally:
+            cap.release()
+
+    def stop(self):
+        self._stop_evt.set()
+
@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+# ========= 觸發前後影片片段 ==========
+class ClipRecorder(threading.Thread):
+    """
+    持續保留各串流（主攝影機標註畫面、夾具畫面）最近幾秒的影格，以 JPEG bytes 存放，
+    總大小受 max_bytes 限制。trigger() 之後等 post_seconds 秒，把觸發前後的影格
+    寫成每個串流一支 MJPG .avi。JPEG 編碼與寫影片都在背景執行緒，不影響檢測速度。
+    """
+
+    def __init__(self, pre_seconds=5.0, post_seconds=3.0, fps=10, quality=80,
+                 max_bytes=64 * 1024 * 1024, max_width=960):
+        super().__init__(name="clip-recorder", daemon=True)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.dropped = 0
+        self.clips_written = 0
+        self.last_error = None
+        self._rings = {}          # 串流名稱 -> deque[(ts, jpeg bytes)]
+        self._ring_bytes = {}
+        self._last_push = {}
+        self._inbox = queue.Queue(maxsize=64)
+        self._pending = []        # (寫出時間, 開始, 結束, 檔名前綴)
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-writer")
+        self._stop_evt = threading.Event()
+
+    # ---- 任何執行緒皆可呼叫 ----
+    def push(self, stream, ts, image):
+        """送入一張影格；超過設定 fps 的影格直接略過。送入後不可再修改 image"""
+        if ts - self._last_push.get(stream, 0) < 1.0 / self.fps:
+            return
+        self._last_push[stream] = ts
+        try:
+            self._inbox.put_nowait((stream, ts, image))
+        except queue.Full:
+            self.dropped += 1
+
+    def trigger(self, stem, ts=None):
+        """stem：輸出檔名前綴（不含副檔名），每個串流輸出 <stem>_<串流>.avi"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._pending.append((ts + self.post_seconds, ts - self.pre_seconds, ts + self.post_seconds, stem))
+
+    def buffered_bytes(self):
+        return sum(self._ring_bytes.values())
+
+    def stop(self):
+        self._stop_evt.set()
+        self._writer.shutdown(wait=False)
+
+    # ---- 背景執行緒 ----
+    def run(self):
+        while not self._stop_evt.is_set():
+            try:
+                stream, ts, image = self._inbox.get(timeout=0.2)
+                self._store(stream, ts, image)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                self.last_error = e
+            self._flush_due()
+
+    def _store(self, stream, ts, image):
+        if image.shape[1] > self.max_width:
+            scale = self.max_width / image.shape[1]
+            image = cv2.resize(image, (self.max_width, int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        data = buf.tobytes()
+        with self._lock:
+            ring = self._rings.setdefault(stream, deque())
+            ring.append((ts, data))
+            self._ring_bytes[stream] = self._ring_bytes.get(stream, 0) + len(data)
+            # 先依時間淘汰，超過總大小時再從所有串流中最舊的一張開始丟
+            keep_from = ts - (self.pre_seconds + self.post_seconds + 1.0)
+            while ring and ring[0][0] < keep_from:
+                self._ring_bytes[stream] -= len(ring.popleft()[1])
+            while self.buffered_bytes() > self.max_bytes:
+                oldest = min((r for r in self._rings.values() if r), key=lambda r: r[0][0])
+                name = next(k for k, r in self._rings.items() if r is oldest)
+                self._ring_bytes[name] -= len(oldest.popleft()[1])
+
+    def _flush_due(self):
+        now = time.time()
+        with self._lock:
+            due = [p for p in self._pending if p[0] <= now]
+            if not due:
+                return
+            self._pending = [p for p in self._pending if p[0] > now]
+            jobs = []
+            for _, start, end, stem in due:
+                for stream, ring in self._rings.items():
+                    frames = [(t, d) for t, d in ring if start <= t <= end]
+                    if frames:
+                        jobs.append((f"{stem}_{stream}.avi", frames))
+        for path, frames in jobs:
+            self._writer.submit(self._write_clip, path, frames)
+
+    def _write_clip(self, path, frames):
+        try:
+            span = frames[-1][0] - frames[0][0]
+            fps = max(1.0, (len(frames) - 1) / span) if span > 0 else float(self.fps)
+            first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+            h, w = first.shape[:2]
+            out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+            try:
+                for _, data in frames:
+                    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                    if img.shape[:2] != (h, w):
+                        img = cv2.resize(img, (w, h))
+                    out.write(img)
+            finally:
+                out.release()
+            self.clips_written += 1
+        except Exception as e:
+            self.last_error = e
+            print("影片片段寫入失敗：", os.path.basename(path), e)
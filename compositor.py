@@ -0,0 +1,100 @@
+"""
+顯示拼圖：把標註 / Sobel / 灰階 / 二值化等畫面拼進同一塊預先配置的 RGB 緩衝區，
+主畫面、多站總覽與 bench.py 的顯示量測共用。
+
+render() / put_text() 只用 OpenCV 與 numpy；PIL 只在 image() / show() 第一次呼叫時才載入，
+無畫面的產線電腦與 bench.py --no-display、calibrate.py 不需要安裝 Pillow。
+"""
+
+import cv2
+import numpy as np
+
+
+# ========= 顯示拼圖 ==========
+PANELS = ("annotated", "sobel", "gray", "thresh")   # annotated 固定在左上，ROI 拖曳座標才對得上
+PANEL_TITLES = {"annotated": "標註", "sobel": "Sobel", "gray": "灰階", "thresh": "二值化"}
+
+
+def _into(dst, fn):
+    """呼叫 fn(dst) 把結果直接寫進 dst；若 OpenCV 沒有原地寫入（回傳別的陣列）就複製進去"""
+    out = fn(dst)
+    if out is not dst:
+        dst[...] = out
+    return dst
+
+
+class DisplayCompositor:
+    """
+    把各畫面直接寫進一塊預先配置的 RGB 拼圖緩衝區，不再每張影格 hstack / vstack 產生新陣列。
+    PIL Image 與 Tk PhotoImage 都只建立一次（第一次顯示時）：每次顯示把緩衝區內容寫進同一個 PIL Image
+    （frombytes），再呼叫 PhotoImage.paste()。可隱藏不需要的畫面，省下縮放與色彩轉換。
+    render() 不需要 Tk，離線量測也用同一套；show() 必須在 Tk 執行緒呼叫。
+    """
+
+    def __init__(self, panel_size=(320, 240), panels=PANELS, columns=2):
+        self.panel_size = tuple(panel_size)
+        self.columns = columns
+        self.panels = ()
+        self.buffer = None
+        self._pil = None
+        self._photo = None
+        pw, ph = self.panel_size
+        self._tmp_gray = np.empty((ph, pw), np.uint8)
+        self._tmp_bgr = np.empty((ph, pw, 3), np.uint8)
+        self.set_visible(panels)
+
+    def set_visible(self, panels):
+        """設定要顯示的畫面（依 panels 順序由左到右、由上到下排列），版面改變時才重新配置緩衝區"""
+        panels = tuple(p for p in panels if p)
+        if panels == self.panels and self.buffer is not None:
+            return
+        self.panels = panels
+        pw, ph = self.panel_size
+        cols = max(1, min(self.columns, len(panels)))
+        rows = max(1, -(-len(panels) // cols))
+        self._slots = {name: ((i % cols) * pw, (i // cols) * ph) for i, name in enumerate(panels)}
+        self.buffer = np.zeros((rows * ph, cols * pw, 3), np.uint8)
+        self._pil = None
+        self._photo = None
+
+    def render(self, sources):
+        """sources：{畫面名稱: BGR 或灰階影像}，沒提供的畫面保留上一次內容。回傳 RGB 緩衝區"""
+        pw, ph = self.panel_size
+        for name, (x, y) in self._slots.items():
+            img = sources.get(name)
+            if img is None:
+                continue
+            if img.shape[0] != ph or img.shape[1] != pw:
+                tmp = self._tmp_gray if img.ndim == 2 else self._tmp_bgr
+                img = _into(tmp, lambda d, src=img: cv2.resize(src, (pw, ph), dst=d))
+            code = cv2.COLOR_GRAY2RGB if img.ndim == 2 else cv2.COLOR_BGR2RGB
+            _into(self.buffer[y:y + ph, x:x + pw], lambda d, src=img: cv2.cvtColor(src, code, dst=d))
+        return self.buffer
+
+    def put_text(self, name, text, color=(255, 255, 0), line=0):
+        """在畫面 name 左上角第 line 行寫字（直接畫在 RGB 緩衝區，render 之後呼叫；OpenCV 只能畫英數字）"""
+        x, y = self._slots[name]
+        cv2.putText(self.buffer, text, (x + 4, y + 16 + 18 * line), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1,
+                    cv2.LINE_AA)
+
+    def image(self):
+        """
+        回傳內容與緩衝區相同的 PIL Image（每次呼叫都重新複製一次）。
+        Image.frombuffer 的 "RGB" 模式會複製資料而不是共用記憶體，所以不能只在配置時建立一次
+        """
+        if self._pil is None:
+            from PIL import Image
+            self._pil = Image.new("RGB", (self.buffer.shape[1], self.buffer.shape[0]))
+        self._pil.frombytes(self.buffer)
+        return self._pil
+
+    def show(self, label):
+        """把緩衝區內容貼到 label 上（只在第一次或版面改變時建立 PhotoImage）"""
+        from PIL import ImageTk
+        self.image()
+        if self._photo is None:
+            self._photo = ImageTk.PhotoImage(image=self._pil)
+            label.configure(image=self._photo)
+            label.imgtk = self._photo  # 避免被垃圾回收
+        else:
+            self._photo.paste(self._pil)
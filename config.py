@@ -0,0 +1,485 @@
+"""
+參數設定檔：一個檔案放多個型號（產品）的參數組（Profile），換線時選型號即可，不必每次手動調。
+每組參數包含檢測、截圖觸發、主 / 副攝影機 index 與設定、截圖格式，以及各 ROI 的位置與參數。
+檔案為 JSON（wrinkle_config.json，與主程式同資料夾）；也可以讀 .toml（唯讀）與舊版 key=value 的 .txt。
+讀進來一律經過驗證，型別或範圍不對時丟出 ConfigError，並列出所有有問題的欄位。
+
+{
+  "active": "A100",
+  "profiles": {
+    "A100": {"gradient": "f64", "blobs": "contours", "full_res": false, "skip_diff": 0, "smoothing": "ema",
+             "threshold": {"mode": "percentile", "percentile": 99, "tiles": 0},
+             "density": {"cols": 8, "rows": 1, "half_life": 10},
+             "trigger": {"count": 20, "time": 5, "gap": 10},
+             "main_cam": 1, "jig_cam": 2,
+             "main_settings": {"width": 1280, "height": 720, "fps": 30, "fourcc": "MJPG", "buffersize": 1},
+             "evidence": {"format": "jpg", "quality": 90},
+             "rois": [{"name": "ROI1", "roi": [0.25, 0.25, 0.5, 0.5], "edge": 50, "min_area": 200, "ksize": 3}]}
+  }
+}
+
+rois 的格式與 stations.json 相同（roi 為 0~1 的比例）。ConfigWatcher 在背景看檔案修改時間，
+有變動就重新讀取並驗證，UI 執行緒用 take() 取走結果後再套用。
+"""
+
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field, fields, replace
+
+from blobs import BACKENDS as BLOB_BACKENDS
+from capture import CameraSettings
+from evidence import FORMATS as EVIDENCE_FORMATS
+from gradient import BACKENDS as GRADIENT_BACKENDS
+from thresholding import MODES as THRESHOLD_MODES
+from wrinkle_detector import RoiSpec
+
+SMOOTHING_MODES = ("off", "ema", "median")  # 同 stations.Smoother.MODES
+DEFAULT_PROFILE = "預設"
+
+
+class ConfigError(ValueError):
+    """設定檔格式或數值錯誤；errors 為各欄位的錯誤訊息"""
+
+    def __init__(self, errors, path=None):
+        self.errors = list(errors)
+        self.path = path
+        where = f"{os.path.basename(path)}：" if path else ""
+        super().__init__(where + "；".join(self.errors))
+
+
+# ========= 參數模型 ==========
+@dataclass(frozen=True)
+class TriggerConfig:
+    """框框數連續 time 秒 ≥ count 才截圖，兩次截圖至少間隔 gap 秒"""
+    count: int = 20
+    time: int = 5
+    gap: int = 10
+
+
+@dataclass(frozen=True)
+class Profile:
+    """一個型號的完整參數；不可變，比較是否相等就知道有沒有東西要推給引擎"""
+    gradient: str = "f64"
+    blobs: str = "contours"
+    full_res: bool = False
+    skip_diff: float = 0.0
+    smoothing: str = "ema"
+    threshold_mode: str = "fixed"       # 見 thresholding.py
+    auto_percentile: float = 99.0
+    adaptive_tiles: int = 0
+    density_cols: int = 0               # 分格密度熱度圖，見 density.py；0 = 不分格
+    density_rows: int = 1
+    density_half_life: float = 10.0
+    trigger: TriggerConfig = TriggerConfig()
+    main_cam: int = 1
+    jig_cam: int = 2                    # None：沒有夾具攝影機
+    main_settings: CameraSettings = CameraSettings()
+    jig_settings: CameraSettings = CameraSettings()
+    evidence_format: str = "jpg"
+    evidence_quality: int = 90
+    rois: tuple = (RoiSpec("ROI1", (0.25, 0.25, 0.5, 0.5)),)
+
+    def updated(self, **changes):
+        return replace(self, **changes)
+
+    def to_dict(self):
+        return {
+            "gradient": self.gradient, "blobs": self.blobs, "full_res": self.full_res,
+            "skip_diff": self.skip_diff, "smoothing": self.smoothing,
+            "threshold": {"mode": self.threshold_mode, "percentile": self.auto_percentile,
+                          "tiles": self.adaptive_tiles},
+            "density": {"cols": self.density_cols, "rows": self.density_rows,
+                        "half_life": self.density_half_life},
+            "trigger": {"count": self.trigger.count, "time": self.trigger.time, "gap": self.trigger.gap},
+            "main_cam": self.main_cam, "jig_cam": self.jig_cam,
+            "main_settings": _settings_dict(self.main_settings),
+            "jig_settings": _settings_dict(self.jig_settings),
+            "evidence": {"format": self.evidence_format, "quality": self.evidence_quality},
+            "rois": [{"name": r.name, "roi": [round(v, 5) for v in r.roi], "edge": r.edge_threshold,
+                      "min_area": r.min_area, "ksize": r.sobel_ksize} for r in self.rois],
+        }
+
+    @classmethod
+    def from_dict(cls, data, where=""):
+        """驗證並建立 Profile；沒寫的欄位用預設值，有錯一次列出全部"""
+        v = _Validator(data, where)
+        trig = _Validator(v.section("trigger"), f"{where}trigger.", v.errors)
+        th = _Validator(v.section("threshold"), f"{where}threshold.", v.errors)
+        de = _Validator(v.section("density"), f"{where}density.", v.errors)
+        ev = _Validator(v.section("evidence"), f"{where}evidence.", v.errors)
+        profile = cls(
+            gradient=v.choice("gradient", GRADIENT_BACKENDS, cls.gradient),
+            blobs=v.choice("blobs", BLOB_BACKENDS, cls.blobs),
+            full_res=v.boolean("full_res", cls.full_res),
+            skip_diff=v.number("skip_diff", cls.skip_diff, 0, 255),
+            smoothing=v.choice("smoothing", SMOOTHING_MODES, cls.smoothing),
+            threshold_mode=th.choice("mode", THRESHOLD_MODES, cls.threshold_mode),
+            auto_percentile=th.number("percentile", cls.auto_percentile, 50, 100),
+            adaptive_tiles=th.integer("tiles", cls.adaptive_tiles, 0, 16),
+            density_cols=de.integer("cols", cls.density_cols, 0, 64),
+            density_rows=de.integer("rows", cls.density_rows, 1, 64),
+            density_half_life=de.number("half_life", cls.density_half_life, 0, 3600),
+            trigger=TriggerConfig(trig.integer("count", TriggerConfig.count, 0),
+                                  trig.integer("time", TriggerConfig.time, 0),
+                                  trig.integer("gap", TriggerConfig.gap, 0)),
+            main_cam=v.integer("main_cam", cls.main_cam, 0),
+            jig_cam=v.integer("jig_cam", cls.jig_cam, 0, optional=True),
+            main_settings=v.camera("main_settings"),
+            jig_settings=v.camera("jig_settings"),
+            evidence_format=ev.choice("format", EVIDENCE_FORMATS, cls.evidence_format),
+            evidence_quality=ev.integer("quality", cls.evidence_quality, 0, 100),
+            rois=v.rois("rois", cls.rois),
+        )
+        trig.check_unknown(("count", "time", "gap"))
+        th.check_unknown(("mode", "percentile", "tiles"))
+        de.check_unknown(("cols", "rows", "half_life"))
+        ev.check_unknown(("format", "quality"))
+        v.check_unknown(_PROFILE_KEYS)
+        if v.errors:
+            raise ConfigError(v.errors)
+        return profile
+
+    def merge_legacy(self, config, frame_size):
+        """
+        舊版 save_config 的 key=value 內容（dict）套到這組參數上：只有一個 ROI 的檢測參數與寬高，
+        沒有的欄位維持原值。寬高以預覽畫面像素（frame_size）計。
+        """
+        v = _Validator(config, "")
+        first = self.rois[0]
+        fw, fh = frame_size
+        w = v.number("roi_width", first.roi[2] * fw, 10, fw)
+        h = v.number("roi_height", first.roi[3] * fh, 10, fh)
+        x = min(first.roi[0], 1 - w / fw)
+        y = min(first.roi[1], 1 - h / fh)
+        roi = RoiSpec(first.name, (x, y, w / fw, h / fh),
+                      v.integer("edge_threshold", first.edge_threshold, 0, 255),
+                      v.integer("min_area", first.min_area, 0),
+                      v.odd("sobel_ksize", first.sobel_ksize))
+        cams = {}
+        for key in ("main", "jig"):
+            if any(k.startswith(f"{key}_") for k in config):
+                try:
+                    cams[f"{key}_settings"] = CameraSettings.from_config(config, key)
+                except ValueError:
+                    v.errors.append(f"{key}_* 攝影機設定不是數字")
+        profile = self.updated(
+            gradient=v.choice("gradient", GRADIENT_BACKENDS, self.gradient),
+            blobs=v.choice("blobs", BLOB_BACKENDS, self.blobs),
+            full_res=v.boolean("full_res", self.full_res),
+            skip_diff=v.number("skip_diff", self.skip_diff, 0, 255),
+            smoothing=v.choice("smoothing", SMOOTHING_MODES, self.smoothing),
+            rois=(roi,) + self.rois[1:], **cams)
+        if v.errors:
+            raise ConfigError(v.errors)
+        return profile
+
+
+_PROFILE_KEYS = ("gradient", "blobs", "full_res", "skip_diff", "smoothing", "threshold", "density", "trigger", "main_cam", "jig_cam",
+                 "main_settings", "jig_settings", "evidence", "rois")
+
+
+def _settings_dict(settings):
+    return {f.name: getattr(settings, f.name) for f in fields(settings) if getattr(settings, f.name) is not None}
+
+
+@dataclass(frozen=True)
+class ProfileSet:
+    """設定檔的內容：所有型號與目前使用中的型號"""
+    profiles: dict = field(default_factory=lambda: {DEFAULT_PROFILE: Profile()})
+    active: str = DEFAULT_PROFILE
+
+    @property
+    def current(self):
+        return self.profiles[self.active]
+
+    def with_profile(self, name, profile, activate=True):
+        """新增或取代一個型號，回傳新的 ProfileSet"""
+        profiles = dict(self.profiles)
+        profiles[name] = profile
+        return ProfileSet(profiles, name if activate else self.active)
+
+    def activate(self, name):
+        if name not in self.profiles:
+            raise ConfigError([f"沒有型號「{name}」"])
+        return ProfileSet(self.profiles, name)
+
+    def to_dict(self):
+        return {"active": self.active, "profiles": {n: p.to_dict() for n, p in self.profiles.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or not isinstance(data.get("profiles"), dict) or not data["profiles"]:
+            raise ConfigError(["最上層需要 profiles（型號名稱 → 參數）"])
+        profiles, errors = {}, []
+        for name, item in data["profiles"].items():
+            try:
+                profiles[str(name)] = Profile.from_dict(item, f"{name}.")
+            except ConfigError as e:
+                errors.extend(e.errors)
+        active = str(data.get("active", next(iter(data["profiles"]))))
+        if active not in data["profiles"]:
+            errors.append(f"active：沒有型號「{active}」")
+        if errors:
+            raise ConfigError(errors)
+        return cls(profiles, active)
+
+
+# ========= 讀寫 ==========
+def load(path):
+    """讀取 .json / .toml 設定檔，回傳 ProfileSet；檔案讀不到丟 OSError，內容有誤丟 ConfigError"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        if path.lower().endswith(".toml"):
+            data = _toml_loads(raw.decode("utf-8"))
+        else:
+            data = json.loads(raw.decode("utf-8-sig"))
+    except (ValueError, UnicodeDecodeError) as e:  # JSONDecodeError / TOMLDecodeError 都是 ValueError
+        raise ConfigError([f"格式錯誤：{e}"], path) from None
+    try:
+        return ProfileSet.from_dict(data)
+    except ConfigError as e:
+        raise ConfigError(e.errors, path) from None
+
+
+def save(path, profile_set):
+    """
+    寫成 JSON（先寫暫存檔再取代，寫到一半不會被監看執行緒讀到）。
+    寫入前先用讀檔的同一套驗證檢查一遍，有錯丟 ConfigError、不寫檔，
+    存得進去的檔案下次一定讀得回來。回傳驗證後（與檔案內容相同）的 ProfileSet
+    """
+    data = profile_set.to_dict()
+    checked = ProfileSet.from_dict(data)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return checked
+
+
+def backup(path):
+    """把讀不進來的設定檔複製一份 檔名.bad-時間 再覆寫，手動修好還能找回原本的型號；回傳備份路徑"""
+    dest = f"{path}.bad-{time.strftime('%Y%m%d-%H%M%S')}"
+    shutil.copy2(path, dest)
+    return dest
+
+
+def load_legacy(path):
+    """舊版 save_config 的 key=value 文字檔 → dict"""
+    with open(path, "r", encoding="utf-8") as f:
+        return dict(line.strip().split("=", 1) for line in f if "=" in line)
+
+
+def _toml_loads(text):
+    try:
+        import tomllib  # Python 3.11+
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ConfigError(["讀取 .toml 需要 Python 3.11 以上或安裝 tomli"]) from None
+    return tomllib.loads(text)
+
+
+# ========= 驗證 ==========
+class _Validator:
+    """逐欄讀取並檢查，錯誤累積在 errors，欄位錯誤時回傳預設值讓其他欄位繼續檢查"""
+
+    def __init__(self, data, where, errors=None):
+        self.errors = [] if errors is None else errors
+        self.where = where
+        if not isinstance(data, dict):
+            self.errors.append(f"{where.rstrip('.') or '參數'} 應為物件")
+            data = {}
+        self.data = data
+
+    def _error(self, key, msg):
+        self.errors.append(f"{self.where}{key} {msg}")
+
+    def section(self, key):
+        return self.data.get(key, {})
+
+    def check_unknown(self, known):
+        for key in self.data:
+            if key not in known:
+                self._error(key, "不是可用的欄位")
+
+    def choice(self, key, options, default):
+        value = self.data.get(key, default)
+        if value not in options:
+            self._error(key, f"應為 {' / '.join(options)}，不是 {value!r}")
+            return default
+        return value
+
+    def boolean(self, key, default):
+        value = self.data.get(key, default)
+        if isinstance(value, str) and value in ("0", "1"):  # 舊版文字檔
+            return value == "1"
+        if not isinstance(value, bool):
+            self._error(key, f"應為 true / false，不是 {value!r}")
+            return default
+        return value
+
+    def number(self, key, default, lo=None, hi=None, optional=False):
+        value = self.data.get(key, default)
+        if optional and value in (None, ""):
+            return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError, OverflowError):
+            self._error(key, f"應為數字，不是 {value!r}")
+            return default
+        if not math.isfinite(value):  # JSON 的 NaN / Infinity、1e400 之類
+            self._error(key, f"應為有限的數字，不是 {value!r}")
+            return default
+        if (lo is not None and value < lo) or (hi is not None and value > hi):
+            self._error(key, f"應在 {lo if lo is not None else '-∞'} ~ {hi if hi is not None else '∞'} 之間，不是 {value:g}")
+            return default
+        return value
+
+    def integer(self, key, default, lo=None, hi=None, optional=False):
+        if optional and self.data.get(key, default) in (None, ""):
+            return None
+        value = self.number(key, default, lo, hi)
+        if value != int(value):
+            self._error(key, f"應為整數，不是 {value:g}")
+            return default
+        return int(value)
+
+    def odd(self, key, default):
+        value = self.integer(key, default, 1, 31)
+        if value % 2 == 0:
+            self._error(key, f"應為 1~31 的奇數，不是 {value}")
+            return default
+        return value
+
+    def source(self, key, optional=False):
+        """攝影機 index（非負整數）或影片檔 / 串流網址（字串）"""
+        value = self.data.get(key)
+        if value is None and optional:
+            return None
+        if isinstance(value, str) and value.strip():
+            return value
+        if value is None:
+            self._error(key, "為必填欄位")
+            return None
+        return self.integer(key, 0, 0)
+
+    def camera(self, key):
+        value = self.data.get(key, {})
+        if not isinstance(value, dict):
+            self._error(key, "應為物件")
+            return CameraSettings()
+        v = _Validator(value, f"{self.where}{key}.", self.errors)
+        d = CameraSettings()
+        fourcc = v.data.get("fourcc", d.fourcc)
+        if fourcc is None:
+            fourcc = ""
+        if not isinstance(fourcc, str) or len(fourcc) > 4 or not fourcc.isascii():
+            v._error("fourcc", f"應為最多 4 個英數字（例如 MJPG），不是 {fourcc!r}")
+            fourcc = d.fourcc
+        settings = CameraSettings(
+            width=v.integer("width", d.width, 0, 16384),
+            height=v.integer("height", d.height, 0, 16384),
+            fps=v.number("fps", d.fps, 0, 1000),
+            fourcc=fourcc,
+            buffersize=v.integer("buffersize", d.buffersize, 0, 64),
+            exposure=v.number("exposure", d.exposure, -100000, 100000, optional=True),
+            gain=v.number("gain", d.gain, -100000, 100000, optional=True),
+        )
+        v.check_unknown(tuple(f.name for f in fields(CameraSettings)))
+        return settings
+
+    def rois(self, key, default):
+        items = self.data.get(key)
+        if items is None:
+            return default
+        if not isinstance(items, list) or not items:
+            self._error(key, "應為至少一個 ROI 的清單")
+            return default
+        rois, names = [], set()
+        for j, item in enumerate(items):
+            v = _Validator(item, f"{self.where}{key}[{j}].", self.errors)
+            name = str(v.data.get("name", f"ROI{j + 1}"))
+            if name in names:
+                v._error("name", f"重複：{name}")
+            names.add(name)
+            roi = v.data.get("roi", (0.25, 0.25, 0.5, 0.5))
+            if (not isinstance(roi, (list, tuple)) or len(roi) != 4
+                    or not all(isinstance(n, (int, float)) and 0 <= n <= 1 for n in roi)
+                    or roi[0] + roi[2] > 1.0001 or roi[1] + roi[3] > 1.0001):
+                v._error("roi", f"應為 [x, y, w, h]，0~1 的比例且不超出畫面，不是 {roi!r}")
+                roi = (0.25, 0.25, 0.5, 0.5)
+            rois.append(RoiSpec(name, tuple(float(n) for n in roi), v.integer("edge", 50, 0, 255),
+                                v.integer("min_area", 200, 0), v.odd("ksize", 3)))
+            v.check_unknown(("name", "roi", "edge", "min_area", "ksize"))
+        return tuple(rois)
+
+
+# ========= 監看 ==========
+class ConfigWatcher(threading.Thread):
+    """
+    每 interval 秒檢查一次設定檔的修改時間，有變動、且下一次檢查時沒有再變（編輯器存檔可能分好幾次寫入）
+    就在背景讀取並驗證。
+    結果用 take() 在 UI 執行緒取走：(ProfileSet, None) 或 (None, 錯誤)；沒有變動時回傳 None。
+    自己存檔後呼叫 acknowledge()，不會把剛寫入的內容再當成外部修改。
+    """
+
+    def __init__(self, path, interval=1.0):
+        super().__init__(name="config-watcher", daemon=True)
+        self.path = path
+        self.interval = interval
+        self._stamp = _stamp(path)
+        self._pending = None
+        self._acks = 0  # acknowledge() 次數：讀檔期間被呼叫過就丟掉這次的結果
+        self._lock = threading.Lock()
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        seen = None
+        while not self._stop_evt.wait(self.interval):
+            stamp = _stamp(self.path)
+            with self._lock:
+                if stamp is None or stamp == self._stamp:
+                    continue
+                if stamp != seen:  # 剛變動：等下一輪確定寫完
+                    seen = stamp
+                    continue
+                self._stamp = stamp
+                acks = self._acks
+            try:
+                item = (load(self.path), None)
+            except (OSError, ConfigError) as e:
+                item = (None, e)
+            except Exception as e:  # 驗證沒擋到的意外錯誤也只回報，不讓監看執行緒結束
+                item = (None, ConfigError([f"讀取失敗：{e!r}"], self.path))
+            with self._lock:
+                # 讀檔期間自己存了檔（acknowledge）：讀到的可能就是自己寫的內容，不回報
+                if stamp == self._stamp and acks == self._acks:
+                    self._pending = item
+
+    def take(self):
+        with self._lock:
+            item, self._pending = self._pending, None
+        return item
+
+    def acknowledge(self):
+        with self._lock:
+            self._stamp = _stamp(self.path)
+            self._acks += 1
+            self._pending = None
+
+    def stop(self):
+        self._stop_evt.set()
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
@@ -0,0 +1,86 @@
+"""
+ROI 分格的皺褶密度：整個 ROI 只算一個皺褶 % 看不出皺褶在膜面的哪個位置、有沒有往左右飄移。
+
+每張影格對二值化結果做一次積分圖（cv2.integral），之後任一格的白點數只要查四個角，
+欄 × 列格子再多也不必重新掃描影像，比多開幾個 ROI 便宜很多。
+各格密度再以半衰期 half_life 秒做時間上的指數衰減累積成熱度圖：
+畫在預覽上（越紅越常出現皺褶），並以精簡的十六進位字串寫進 LOG（見 encode_tiles）。
+"""
+
+import cv2
+import numpy as np
+
+DEFAULT_FRAME_DT = 1.0 / 30  # 沒有時間戳（離線批次）時當作每張間隔
+MIN_OVERLAY_SCALE = 1.0      # 熱度圖顏色的滿格至少是 1%，全部都很低時不會整片發紅
+OVERLAY_ALPHA = 0.4
+
+
+def tile_density(thresh, cols, rows):
+    """
+    thresh：0 / 255 的二值化結果；回傳 (rows, cols) 的 float32 各格白點 %，與整體白點數。
+    格子邊界四捨五入到像素，格數超過 ROI 像素數時以像素數為上限。
+    """
+    h, w = thresh.shape[:2]
+    cols, rows = max(1, min(cols, w)), max(1, min(rows, h))
+    # 0/255 加總：整張超過 int32 範圍（約 8.4M 像素）才改用 float64
+    depth = cv2.CV_32S if thresh.size * 255 < 2 ** 31 else cv2.CV_64F
+    ii = cv2.integral(thresh, sdepth=depth)
+    xs = np.linspace(0, w, cols + 1).round().astype(np.intp)
+    ys = np.linspace(0, h, rows + 1).round().astype(np.intp)
+    corners = ii[np.ix_(ys, xs)].astype(np.float64)
+    sums = corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+    areas = np.outer(np.diff(ys), np.diff(xs))
+    return (sums / (255.0 * areas) * 100).astype(np.float32), float(corners[-1, -1]) / 255.0
+
+
+class DensityHeatmap:
+    """單一 ROI 的熱度圖狀態（一個 WrinkleDetector 一個）；格數改變時重新累積"""
+
+    def __init__(self):
+        self.heat = None
+        self._last_ts = None
+
+    def update(self, tiles, ts, half_life):
+        """加入一張影格的各格密度，回傳累積後的熱度圖（複本）"""
+        if self.heat is None or self.heat.shape != tiles.shape:
+            self.heat = tiles.astype(np.float32)
+        else:
+            dt = DEFAULT_FRAME_DT if ts is None or self._last_ts is None else max(0.0, ts - self._last_ts)
+            alpha = 1.0 - 0.5 ** (dt / half_life) if half_life > 0 else 1.0
+            self.heat += alpha * (tiles - self.heat)
+        self._last_ts = ts
+        return self.heat.copy()
+
+
+def draw_heatmap(img, heat, rect):
+    """把熱度圖以半透明色塊畫在 img 的 rect=(x0, y0, x1, y1) 區域（img 直接修改）"""
+    x0, y0, x1, y1 = rect
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = min(img.shape[1], x1), min(img.shape[0], y1)
+    if x1 <= x0 or y1 <= y0:
+        return img
+    scale = max(float(heat.max()), MIN_OVERLAY_SCALE)
+    levels = np.clip(heat * (255.0 / scale), 0, 255).astype(np.uint8)
+    colors = cv2.applyColorMap(cv2.resize(levels, (x1 - x0, y1 - y0), interpolation=cv2.INTER_NEAREST),
+                               cv2.COLORMAP_JET)
+    region = img[y0:y1, x0:x1]
+    cv2.addWeighted(colors, OVERLAY_ALPHA, region, 1 - OVERLAY_ALPHA, 0, dst=region)
+    return img
+
+
+# ========= LOG 格式 ==========
+def encode_tiles(heat):
+    """
+    熱度圖轉成「欄x列:十六進位」，每格 1 byte = 0.5% 一階（上限 127.5%，實際不會超過 100%），
+    例如 4 欄 1 列：「4x1:00061e02」。
+    """
+    rows, cols = heat.shape
+    levels = np.clip(np.round(heat * 2), 0, 255).astype(np.uint8)
+    return f"{cols}x{rows}:{levels.tobytes().hex()}"
+
+
+def decode_tiles(text):
+    """encode_tiles 的反向，回傳 (列, 欄) 的 float32 %"""
+    size, data = text.split(":")
+    cols, rows = (int(v) for v in size.split("x"))
+    return (np.frombuffer(bytes.fromhex(data), np.uint8).reshape(rows, cols) / 2.0).astype(np.float32)
@@ -0,0 +1,177 @@
+"""
+攝影機搜尋：各 index 同時探測（每個一條執行緒，整體有逾時），記下能用的 backend、解析度、fps，
+結果放在記憶體快取並可存成 camera_cache.json。之後開啟攝影機直接用快取的 backend，
+不必每次開程式都逐一 VideoCapture + read() 試過一輪（不存在的 index 在 Windows 上一個就要好幾秒）。
+"""
+
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+import cv2
+
+
+def _platform_backends():
+    names = {"win32": ("DSHOW", "MSMF"), "darwin": ("AVFOUNDATION",)}.get(sys.platform, ("V4L2",))
+    return {n: getattr(cv2, f"CAP_{n}") for n in names if hasattr(cv2, f"CAP_{n}")}
+
+
+# 依偏好順序排列；ANY 交給 OpenCV 自己挑，放最後
+BACKENDS = {**_platform_backends(), "ANY": cv2.CAP_ANY}
+COMMON_MODES = ((640, 480), (1280, 720), (1920, 1080))
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class CameraInfo:
+    index: int
+    backend: str
+    width: int
+    height: int
+    fps: float
+    modes: tuple = ()     # probe_modes 時實際測試可用的 (寬, 高)
+    open_ms: float = 0.0  # 開啟 + 第一張影格花的時間
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# ========= 探測 ==========
+def _try_mode(cap, width, height):
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if not cap.read()[0]:
+        return False
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == (width, height)
+
+
+def probe_camera(index, backends=None, probe_modes=False):
+    """
+    依序試各 backend，第一個能讀到影格的就回傳 CameraInfo；都不行回傳 None。
+    可能會卡好幾秒，請在背景執行緒呼叫。
+    """
+    for name in backends or BACKENDS:
+        t0 = time.perf_counter()
+        cap = cv2.VideoCapture(index, BACKENDS[name])
+        try:
+            if not cap.isOpened() or not cap.read()[0]:
+                continue
+            open_ms = (time.perf_counter() - t0) * 1000
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+            modes = tuple(m for m in COMMON_MODES if _try_mode(cap, *m)) if probe_modes else ()
+            return CameraInfo(index, name, width, height, fps, modes, round(open_ms, 1))
+        finally:
+            cap.release()
+    return None
+
+
+def discover_cameras(max_index=5, timeout=4.0, probe_modes=False, skip=()):
+    """
+    同時探測 0 ~ max_index-1，回傳 {index: CameraInfo}。
+    timeout 秒內沒回應的 index 當作沒有（探測執行緒留在背景自己結束）；
+    skip 為正在使用中的 index，不去搶裝置，保留原本的快取。
+    """
+    found = {}
+    done = set()
+    lock = threading.Lock()
+
+    def probe(i):
+        info = probe_camera(i, probe_modes=probe_modes)
+        with lock:
+            done.add(i)
+            if info is not None:
+                found[i] = info
+
+    threads = [threading.Thread(target=probe, args=(i,), name=f"probe-{i}", daemon=True)
+               for i in range(max_index) if i not in skip]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + timeout
+    for t in threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+
+    with lock:
+        found, done = dict(found), set(done)
+    with _cache_lock:
+        for i in done:
+            _cache.pop(i, None)
+        _cache.update(found)
+        return {i: info for i, info in _cache.items() if i in found or i in skip}
+
+
+# ========= 快取 ==========
+def cached(index):
+    with _cache_lock:
+        return _cache.get(index)
+
+
+def cached_cameras():
+    with _cache_lock:
+        return dict(sorted(_cache.items()))
+
+
+def forget(index):
+    with _cache_lock:
+        _cache.pop(index, None)
+
+
+def remember(info):
+    """放入一筆已知的攝影機資訊（例如子行程沿用主行程的搜尋結果）"""
+    with _cache_lock:
+        _cache[info.index] = info
+
+
+def load_cache(path, max_age=CACHE_MAX_AGE):
+    """讀取快取檔放進記憶體；檔案不存在、損毀或超過 max_age 秒回傳空 dict"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if time.time() - data["time"] > max_age:
+            return {}
+        infos = {}
+        for item in data["cameras"]:
+            if item["backend"] not in BACKENDS:  # 別的平台存的快取
+                continue
+            item["modes"] = tuple(tuple(m) for m in item.get("modes", ()))
+            infos[item["index"]] = CameraInfo(**item)
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+    with _cache_lock:
+        _cache.update(infos)
+    return infos
+
+
+def save_cache(path):
+    with _cache_lock:
+        cameras = [asdict(info) for info in _cache.values()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"time": time.time(), "cameras": cameras}, f, ensure_ascii=False, indent=2)
+
+
+# ========= 開啟 ==========
+def open_capture(source):
+    """
+    開啟攝影機。整數 index 有快取時直接用快取的 backend；開不起來就清掉快取，退回 OpenCV 預設。
+    """
+    info = cached(source) if isinstance(source, int) else None
+    if info is not None and info.backend != "ANY":
+        cap = cv2.VideoCapture(source, BACKENDS[info.backend])
+        if cap.isOpened():
+            return cap
+        cap.release()
+        forget(source)
+    return cv2.VideoCapture(source)
+
+
+def describe(infos):
+    """給 UI 顯示的一行一台摘要"""
+    if not infos:
+        return "（找不到攝影機）"
+    return "\n".join(f"#{i} {c.backend} {c.width}x{c.height} {c.fps:.0f}fps"
+                     + (f" 可用 {'/'.join(f'{w}x{h}' for w, h in c.modes)}" if c.modes else "")
+                     for i, c in sorted(infos.items()))
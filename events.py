@@ -0,0 +1,339 @@
+"""
+截圖事件資料庫：每次觸發截圖記一筆，連同當時的區塊數、皺褶%、達標的 ROI、觸發區間、
+使用中的檢測參數與截圖 / 影片檔路徑，之後可依時間、嚴重度（區塊數）、站別查詢，
+不必再翻 captures 資料夾。
+
+存放在 SQLite（預設 events.db，與主程式同資料夾），WAL 模式：寫入時仍可同時查詢。
+UI 只把事件丟進佇列，由背景執行緒每 flush_interval 秒（或滿 batch_rows 筆）一次交易寫入。
+檢測參數常常整天不變，另存在 configs 表以雜湊去重，事件只記編號。
+retention_days > 0 時背景執行緒定時刪除過期事件，連同截圖與影片檔一起刪；
+檔案刪不掉（例如正被開啟）的事件保留到下一次再試，資料庫與檔案不會對不起來。
+
+  python events.py --since 7d --station L3 --min-count 30
+  python events.py --start "2024-05-01" --end "2024-05-08" --csv week.csv
+  python events.py --prune-days 90
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,               -- 截圖時間（epoch 秒）
+    window_start REAL,              -- 這次連續達標的開始時間
+    station TEXT NOT NULL,
+    defect_count INTEGER NOT NULL,  -- 嚴重度：整張的區塊數
+    wrinkle REAL NOT NULL,
+    hit_rois TEXT,                  -- 達標的 ROI，逗號分隔
+    rois TEXT,                      -- JSON {名稱: [平滑後區塊數, 皺褶%]}
+    total_length REAL,
+    max_area REAL,
+    profile TEXT,                   -- 型號名稱
+    config_id INTEGER REFERENCES configs(id),
+    image_path TEXT,
+    clip_stem TEXT                  -- 影片片段檔名前綴（<前綴>_<串流>.avi）
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS events_station_ts ON events(station, ts);
+CREATE INDEX IF NOT EXISTS events_count_ts ON events(defect_count, ts);
+"""
+
+_CLOSE = object()
+
+
+@dataclass
+class Event:
+    ts: float
+    station: str
+    defect_count: int
+    wrinkle: float
+    window_start: float = None
+    hit_rois: tuple = ()
+    rois: dict = field(default_factory=dict)    # 名稱 -> (平滑後區塊數, 皺褶%)
+    total_length: float = 0.0
+    max_area: float = 0.0
+    profile: str = None
+    config: dict = None                         # 當時的檢測參數（可轉成 JSON 的 dict）
+    image_path: str = None
+    clip_stem: str = None
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下當機不會損毀，最多少最後一批
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+# ========= 背景寫入 ==========
+class EventStore(threading.Thread):
+    """
+    path：資料庫檔案；retention_days：保留天數（0 = 不自動清理），每 prune_interval 秒檢查一次。
+    record() 可在任何執行緒呼叫；查詢用 query()，另開連線，不經過寫入佇列。
+    """
+
+    def __init__(self, path, flush_interval=1.0, batch_rows=100, retention_days=0, prune_interval=3600,
+                 max_queue=10000):
+        super().__init__(name="event-store", daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.retention_days = retention_days
+        self.prune_interval = prune_interval
+        self.written = 0
+        self.pruned = 0
+        self.dropped = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._config_ids = {}
+
+    # ---- 任何執行緒呼叫 ----
+    def record(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def query(self, **filters):
+        return query_events(self.path, **filters)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5.0):
+        """寫完佇列中的事件後關閉"""
+        if self.is_alive():
+            self._queue.put(_CLOSE)
+            self.join(timeout)
+
+    # ---- 背景執行緒 ----
+    def run(self):
+        try:
+            conn = connect(self.path)
+        except sqlite3.Error as e:
+            self.last_error = e
+            print("事件資料庫開啟失敗：", e)
+            return
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        next_prune = time.monotonic() + 60  # 開程式一分鐘後第一次清理，不和開機搶 I/O
+        closing = False
+        try:
+            while not closing:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if item is _CLOSE:
+                        closing = True
+                    else:
+                        batch.append(item)
+                except queue.Empty:
+                    pass
+                if closing or len(batch) >= self.batch_rows or time.monotonic() >= deadline:
+                    if batch:
+                        try:
+                            self._insert(conn, batch)
+                            self.written += len(batch)
+                        except (sqlite3.Error, TypeError, ValueError) as e:
+                            self.last_error = e
+                            self._config_ids.clear()  # 交易已還原，快取的編號可能不存在
+                            print("事件寫入失敗：", e)
+                        batch = []
+                    deadline = time.monotonic() + self.flush_interval
+                if self.retention_days > 0 and time.monotonic() >= next_prune and not closing:
+                    try:
+                        self.pruned += prune(conn, time.time() - self.retention_days * 86400)
+                    except sqlite3.Error as e:
+                        self.last_error = e
+                    self._config_ids.clear()  # 沒有事件用到的參數組已被刪除
+                    next_prune = time.monotonic() + self.prune_interval
+        finally:
+            conn.close()
+
+    def _config_id(self, conn, config):
+        if config is None:
+            return None
+        data = json.dumps(config, sort_keys=True, ensure_ascii=False, default=list)
+        digest = hashlib.sha1(data.encode("utf-8")).hexdigest()
+        cid = self._config_ids.get(digest)
+        if cid is None:
+            conn.execute("INSERT OR IGNORE INTO configs (hash, data) VALUES (?, ?)", (digest, data))
+            cid = conn.execute("SELECT id FROM configs WHERE hash = ?", (digest,)).fetchone()[0]
+            self._config_ids[digest] = cid
+        return cid
+
+    def _insert(self, conn, batch):
+        with conn:
+            rows = [(e.ts, e.window_start, e.station, int(e.defect_count), float(e.wrinkle), ",".join(e.hit_rois),
+                     json.dumps({k: [float(x) for x in v] for k, v in e.rois.items()}, ensure_ascii=False),
+                     e.total_length, e.max_area, e.profile, self._config_id(conn, e.config),
+                     e.image_path, e.clip_stem) for e in batch]
+            conn.executemany(
+                "INSERT INTO events (ts, window_start, station, defect_count, wrinkle, hit_rois, rois, total_length, "
+                "max_area, profile, config_id, image_path, clip_stem) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+
+# ========= 查詢 / 清理 ==========
+def query_events(path, start=None, end=None, station=None, min_count=None, limit=1000, with_config=False):
+    """
+    依條件查詢事件（新的在前），回傳 dict 清單；資料庫不存在時回傳空清單。
+    start / end 為 epoch 秒（end 不含）；min_count：區塊數 ≥ 此值。
+    """
+    if not os.path.exists(path):
+        return []
+    where, args = [], []
+    for clause, value in (("ts >= ?", start), ("ts < ?", end), ("station = ?", station),
+                          ("defect_count >= ?", min_count)):
+        if value is not None:
+            where.append(clause)
+            args.append(value)
+    sql = "SELECT e.*" + (", c.data AS config" if with_config else "") + " FROM events e"
+    if with_config:
+        sql += " LEFT JOIN configs c ON c.id = e.config_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ts DESC LIMIT ?"
+    args.append(int(limit))
+    conn = connect(path)
+    try:
+        return [dict(row) for row in conn.execute(sql, args)]
+    finally:
+        conn.close()
+
+
+def _event_files(image_path, clip_stem):
+    files = [image_path] if image_path else []
+    if clip_stem:
+        files += glob.glob(glob.escape(clip_stem) + "_*.avi")
+    return files
+
+
+def prune(conn, before, chunk=500):
+    """
+    刪除 before（epoch 秒）以前的事件與它們的截圖 / 影片檔，回傳刪除筆數。
+    先刪檔案再刪資料列；檔案刪除失敗（不是不存在）的事件留著下次再刪。
+    """
+    removed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, image_path, clip_stem FROM events WHERE ts < ? AND id > ? "
+                            "ORDER BY id LIMIT ?", (before, last_id, chunk)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        done = []
+        for row in rows:
+            ok = True
+            for f in _event_files(row["image_path"], row["clip_stem"]):
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    ok = False
+            if ok:
+                done.append((row["id"],))
+        with conn:
+            conn.executemany("DELETE FROM events WHERE id = ?", done)
+        removed += len(done)
+    if removed:
+        with conn:
+            conn.execute("DELETE FROM configs WHERE id NOT IN "
+                         "(SELECT DISTINCT config_id FROM events WHERE config_id IS NOT NULL)")
+    return removed
+
+
+# ========= CLI ==========
+def _parse_time(text):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"時間格式應為 YYYY-mm-dd [HH:MM[:SS]]：{text}")
+
+
+def _parse_since(text):
+    """7d / 12h / 30m：往前推的時間，回傳 epoch 秒"""
+    units = {"d": 86400, "h": 3600, "m": 60}
+    try:
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"格式應為數字加 d / h / m，例如 7d：{text}") from None
+
+
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts is not None else "-"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RTR-TP 截圖事件查詢 / 清理")
+    ap.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "events.db"))
+    ap.add_argument("--since", type=_parse_since, help="最近一段時間，例如 7d、12h")
+    ap.add_argument("--start", type=_parse_time, help="開始時間，例如 \"2024-05-01 08:00\"")
+    ap.add_argument("--end", type=_parse_time, help="結束時間（不含）")
+    ap.add_argument("--station", help="站名，例如 L1")
+    ap.add_argument("--min-count", type=int, help="區塊數 ≥ 此值")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--config", action="store_true", help="一併列出當時的檢測參數")
+    ap.add_argument("--csv", help="輸出查詢結果 CSV")
+    ap.add_argument("--prune-days", type=float, help="刪除超過此天數的事件（連同截圖與影片檔）")
+    args = ap.parse_args(argv)
+
+    if args.prune_days is not None:
+        conn = connect(args.db)
+        try:
+            n = prune(conn, time.time() - args.prune_days * 86400)
+        finally:
+            conn.close()
+        print(f"已刪除 {n} 筆事件")
+        return 0
+
+    start = args.since if args.since is not None else args.start
+    events = query_events(args.db, start, args.end, args.station, args.min_count, args.limit,
+                          with_config=args.config)
+    for e in events:
+        print(f"{_fmt_ts(e['ts'])}  {e['station']:<6} 區塊 {e['defect_count']:>4}  皺褶 {e['wrinkle']:6.2f}%  "
+              f"達標 {e['hit_rois'] or '-'}（{e['ts'] - (e['window_start'] or e['ts']):.0f} 秒）  "
+              f"{e['image_path'] or '（無截圖）'}")
+        if args.config and e["config"]:
+            print(f"    型號 {e['profile'] or '-'}：{e['config']}")
+    print(f"共 {len(events)} 筆" + ("（已達上限，請縮小範圍或加大 --limit）" if len(events) >= args.limit else ""))
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f)
+            w.writerow(["時間", "站", "區塊數", "皺褶%", "達標ROI", "達標開始", "總皺褶長度", "最大缺陷面積",
+                        "型號", "截圖", "影片前綴"])
+            for e in events:
+                w.writerow([_fmt_ts(e["ts"]), e["station"], e["defect_count"], f"{e['wrinkle']:.2f}", e["hit_rois"],
+                            _fmt_ts(e["window_start"]), e["total_length"], e["max_area"], e["profile"],
+                            e["image_path"], e["clip_stem"]])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+# ========= 背景截圖寫入 ==========
+FORMATS = ("jpg", "webp", "png")
+
+
+def encode_params(fmt, quality=90, png_compression=3):
+    """cv2.imencode 的參數：jpg / webp 用品質 (0~100)，png 用壓縮等級 (0~9)"""
+    if fmt in ("jpg", "jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if fmt == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    if fmt == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    return []
+
+
+class EvidenceWriter:
+    """
+    固定數量的背景執行緒負責影像編碼與寫檔，UI 與分析執行緒只丟進佇列。
+    佇列有上限，滿了依 policy 處理："drop_oldest" 丟掉最舊的一張，"drop_new" 丟掉新來的。
+    """
+
+    def __init__(self, workers=2, max_queue=16, policy="drop_oldest", fmt="jpg", quality=90, png_compression=3):
+        self.policy = policy
+        self.fmt = fmt
+        self.quality = quality
+        self.png_compression = png_compression
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_error = None
+        self._queue = deque()
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = 0
+        self._encode_ms = deque(maxlen=200)
+        self._write_ms = deque(maxlen=200)
+        self._threads = [threading.Thread(target=self._run, name=f"evidence-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def configure(self, fmt=None, quality=None, png_compression=None):
+        if fmt is not None:
+            self.fmt = fmt
+        if quality is not None:
+            self.quality = quality
+        if png_compression is not None:
+            self.png_compression = png_compression
+
+    def submit(self, path, image, on_done=None):
+        """
+        排入一張影像，回傳實際檔名；被丟棄時回傳 None。
+        path 沒有副檔名時使用目前設定的格式。on_done(path, error) 在背景執行緒呼叫
+        （drop_oldest 把排隊中的工作擠掉時在呼叫 submit 的執行緒呼叫，error 說明被略過）。
+        送入後不可再修改 image。
+        """
+        if not os.path.splitext(path)[1]:
+            path = f"{path}.{self.fmt}"
+        job = (path, image, encode_params(os.path.splitext(path)[1][1:].lower(), self.quality,
+                                          self.png_compression), on_done)
+        evicted = None
+        with self._cond:
+            if self._closed:
+                return None
+            if len(self._queue) >= self._max_queue:
+                self.dropped += 1
+                if self.policy == "drop_new":
+                    return None
+                evicted = self._queue.popleft()
+            self._queue.append(job)
+            self.submitted += 1
+            self._cond.notify()
+        if evicted is not None and evicted[3] is not None:
+            evicted[3](evicted[0], RuntimeError("截圖佇列已滿，被較新的截圖取代"))
+        return path
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                path, image, params, on_done = self._queue.popleft()
+                self._busy += 1
+            error = None
+            try:
+                t0 = time.perf_counter()
+                ok, buf = cv2.imencode(os.path.splitext(path)[1], image, params)
+                t1 = time.perf_counter()
+                if not ok:
+                    raise ValueError(f"影像編碼失敗：{path}")
+                # 自己寫檔而不用 cv2.imwrite：Windows 上中文路徑也能存
+                with open(path, "wb") as f:
+                    f.write(buf.tobytes())
+                t2 = time.perf_counter()
+                self._encode_ms.append((t1 - t0) * 1000)
+                self._write_ms.append((t2 - t1) * 1000)
+                self.written += 1
+            except Exception as e:
+                error = e
+                self.failed += 1
+                self.last_error = e
+                print("截圖寫入失敗：", e)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+            if on_done is not None:
+                on_done(path, error)
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def metrics(self):
+        enc = sorted(self._encode_ms)
+        wr = list(self._write_ms)
+        return {
+            "queue_depth": len(self._queue),
+            "busy": self._busy,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "encode_ms_avg": sum(enc) / len(enc) if enc else 0.0,
+            "encode_ms_max": enc[-1] if enc else 0.0,
+            "write_ms_avg": sum(wr) / len(wr) if wr else 0.0,
+        }
+
+    def close(self, timeout=5.0):
+        """等佇列寫完（最多 timeout 秒）後結束背景執行緒"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.wait_for(lambda: not self._queue and not self._busy,
+                                max(0.0, deadline - time.monotonic()))
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,123 @@
+"""
+Sobel 梯度強度計算的幾種實作，可依產線需求在速度與精度之間取捨。
+
+與原本 float64 結果 (f64) 的差異（輸出皆為 0~255 的 uint8）：
+
+  f64     原本做法：CV_64F Sobel → magnitude → clip → uint8（截去小數）。作為基準。
+  f32_l2  CV_32F Sobel + magnitude，截到 255 後輸出四捨五入而非截斷。
+          每點差異只有 0 或 +1 灰階，門檻後只有梯度剛好落在 edge_threshold 附近的點會翻轉，
+          皺褶 % 的差異很小。浮點緩衝區大小是 f64 的一半。
+          ksize > 9 時 Sobel 的整數和超過 float32 能精確表示的 2^24，平坦區域互相抵消後
+          會留下上千的誤差（被截成 255），所以大核心的 dx / dy 改用 CV_64F 計算。
+  s16_l1  CV_16S Sobel + |gx|+|gy|（convertScaleAbs + 飽和相加），全程整數運算，最快。
+          L1 範數 >= L2：水平/垂直邊緣與 f64 相同，45° 斜向邊緣最多放大 √2 倍（約 +41%），
+          因此同一個 edge_threshold 下會判出較多白點；若要接近 f64 行為，門檻約需調高 0~40%。
+          int16 溢位會飽和到 32767，之後仍被截到 255，所以大 ksize 也不影響結果。
+
+實際差異可用 measure_backend_delta() 對自己的影像量測。
+除 f64 以外，中間緩衝區（dx、dy、magnitude）會預先配置並在下一張影格重複使用；
+輸出的 uint8 影像每張重新配置，因為結果可能被其他執行緒（顯示、記錄）繼續持有。
+"""
+
+import cv2
+import numpy as np
+
+BACKENDS = ("f64", "f32_l2", "s16_l1")
+F32_EXACT_MAX_KSIZE = 9  # 255 × 核心絕對值總和（約 2^(2k-3)）還在 2^24 以內
+
+
+class GradientBackend:
+    """單一執行緒使用的梯度計算器，持有可重複使用的中間緩衝區"""
+
+    def __init__(self, name="f64"):
+        if name not in BACKENDS:
+            raise ValueError(f"未知的梯度計算方式：{name}")
+        self.name = name
+        self._shape = None
+        self._dx = self._dy = self._mag = self._wide = None
+
+    def _ensure_buffers(self, shape):
+        if self._shape == shape:
+            return
+        self._shape = shape
+        if self.name == "f32_l2":
+            self._dx = np.empty(shape, np.float32)
+            self._dy = np.empty(shape, np.float32)
+            self._mag = np.empty(shape, np.float32)
+            self._wide = None  # 大核心用的 float64 緩衝區，用到才配置
+        elif self.name == "s16_l1":
+            self._dx = np.empty(shape, np.int16)
+            self._dy = np.empty(shape, np.int16)
+            self._mag = np.empty(shape, np.uint8)   # |gx| 暫存
+
+    def compute(self, gray, ksize, timer=None):
+        """gray：uint8 單通道影像，回傳同尺寸 uint8 梯度強度。timer 會記錄 sobel / magnitude 兩段"""
+        if self.name == "f64":
+            sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=ksize)
+            sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=ksize)
+            _mark(timer, "sobel")
+            sobel = cv2.magnitude(sobelx, sobely)
+            out = np.uint8(np.clip(sobel, 0, 255))
+            _mark(timer, "magnitude")
+            return out
+
+        self._ensure_buffers(gray.shape)
+        if self.name == "f32_l2":
+            if ksize > F32_EXACT_MAX_KSIZE:
+                if self._wide is None:
+                    self._wide = tuple(np.empty(gray.shape, np.float64) for _ in range(3))
+                dx, dy, mag = self._wide
+                cv2.Sobel(gray, cv2.CV_64F, 1, 0, dst=dx, ksize=ksize)
+                cv2.Sobel(gray, cv2.CV_64F, 0, 1, dst=dy, ksize=ksize)
+                _mark(timer, "sobel")
+                cv2.magnitude(dx, dy, magnitude=mag)
+                cv2.min(mag, 255.0, dst=mag)
+                out = cv2.convertScaleAbs(mag)
+                _mark(timer, "magnitude")
+                return out
+            cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=self._dx, ksize=ksize)
+            cv2.Sobel(gray, cv2.CV_32F, 0, 1, dst=self._dy, ksize=ksize)
+            _mark(timer, "sobel")
+            cv2.magnitude(self._dx, self._dy, magnitude=self._mag)
+            # 先截到 255：convertScaleAbs 把超過 INT_MAX 的浮點數變成 0（ksize ≥ 17 時很常見）
+            cv2.min(self._mag, 255.0, dst=self._mag)
+            out = cv2.convertScaleAbs(self._mag)
+            _mark(timer, "magnitude")
+            return out
+
+        cv2.Sobel(gray, cv2.CV_16S, 1, 0, dst=self._dx, ksize=ksize)
+        cv2.Sobel(gray, cv2.CV_16S, 0, 1, dst=self._dy, ksize=ksize)
+        _mark(timer, "sobel")
+        cv2.convertScaleAbs(self._dx, dst=self._mag)
+        out = cv2.convertScaleAbs(self._dy)
+        cv2.add(self._mag, out, dst=out)             # uint8 飽和相加 = min(|gx|+|gy|, 255)
+        _mark(timer, "magnitude")
+        return out
+
+
+def _mark(timer, stage):
+    if timer is not None:
+        timer.mark(stage)
+
+
+def measure_backend_delta(gray, ksize=3, edge_threshold=50):
+    """
+    以 f64 為基準量測各實作的差異。回傳 {name: {...}}：
+    mean_abs / max_abs 為梯度灰階差，mask_flip 為門檻後翻轉的像素比例 (%)，
+    wrinkle_delta 為皺褶 % 的差。
+    """
+    ref = GradientBackend("f64").compute(gray, ksize)
+    ref_mask = ref > edge_threshold
+    ref_wrinkle = ref_mask.mean() * 100
+    report = {}
+    for name in BACKENDS:
+        out = GradientBackend(name).compute(gray, ksize)
+        diff = np.abs(out.astype(np.int16) - ref.astype(np.int16))
+        mask = out > edge_threshold
+        report[name] = {
+            "mean_abs": float(diff.mean()),
+            "max_abs": int(diff.max()),
+            "mask_flip": float((mask != ref_mask).mean() * 100),
+            "wrinkle_delta": float(mask.mean() * 100 - ref_wrinkle),
+        }
+    return report
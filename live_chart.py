@@ -0,0 +1,163 @@
+from tkinter import Toplevel, Frame, Label, StringVar, OptionMenu, BOTH
+
+import numpy as np
+
+
+# ========= 歷史資料環形緩衝 ==========
+class HistoryRing:
+    """固定容量的 (時間戳, 區塊數, 皺褶%) 環形緩衝，滿了覆蓋最舊的；預設可放 24 小時（每秒一筆）"""
+
+    def __init__(self, capacity=24 * 3600):
+        self._data = np.zeros((capacity, 3))
+        self._n = 0
+        self._i = 0
+
+    def append(self, ts, defect_count, wrinkle):
+        self._data[self._i] = (ts, defect_count, wrinkle)
+        self._i = (self._i + 1) % len(self._data)
+        self._n = min(self._n + 1, len(self._data))
+
+    def clear(self):
+        self._n = 0
+        self._i = 0
+
+    def __len__(self):
+        return self._n
+
+    def arrays(self):
+        """依時間順序回傳 (ts, 區塊數, 皺褶%) 三個陣列"""
+        if self._n < len(self._data):
+            d = self._data[:self._n]
+        else:
+            d = np.concatenate((self._data[self._i:], self._data[:self._i]))
+        return d[:, 0], d[:, 1], d[:, 2]
+
+
+def minmax_downsample(x, y, buckets):
+    """
+    把 (x, y) 分成 buckets 段，每段只留最小值與最大值兩點。
+    點數遠多於螢幕像素時畫出來的外形不變（尖峰不會被平均掉），但繪圖量固定。
+    """
+    n = len(x)
+    if n <= buckets * 2:
+        return x, y
+    starts = np.linspace(0, n, buckets + 1).astype(np.intp)[:-1]
+    ends = np.append(starts[1:], n) - 1
+    xs = np.empty(buckets * 2)
+    ys = np.empty(buckets * 2)
+    xs[0::2] = x[starts]
+    xs[1::2] = x[ends]
+    ys[0::2] = np.minimum.reduceat(y, starts)
+    ys[1::2] = np.maximum.reduceat(y, starts)
+    return xs, ys
+
+
+# ========= 即時圖表 ==========
+SPANS = {"最近 30 筆": 30, "10 分鐘": 600, "1 小時": 3600, "整班（全部）": None}
+
+
+class LiveChart:
+    """
+    常駐的即時圖表視窗。兩條 Line2D 只建立一次，更新時用 set_data + blit 只重畫線條；
+    座標軸範圍不夠時才整張重畫。歷史資料可以很長，顯示前先依畫面寬度做 min/max 降取樣。
+    """
+
+    def __init__(self, master, history, interval_ms=1000):
+        self.history = history
+        self.interval_ms = interval_ms
+        self.closed = False
+        self._after = None
+        self._background = None
+        self._full_redraw = True
+
+        self.win = Toplevel(master)
+        self.win.title("📈 即時圖表")
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+        bar = Frame(self.win)
+        bar.pack(fill='x')
+        Label(bar, text="顯示範圍").pack(side='left')
+        self.span_var = StringVar(value="10 分鐘")
+        OptionMenu(bar, self.span_var, *SPANS, command=lambda v: self.invalidate()).pack(side='left')
+
+        # matplotlib 載入要半秒以上，等真的開圖表才 import（HistoryRing 記錄時用不到）
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.fig = Figure(figsize=(5, 2), dpi=100)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel("經過時間（分）")
+        # animated=True：整張重畫時不畫線，背景才能存起來重複使用
+        self.line_count, = self.ax.plot([], [], label="區塊數", color='blue', animated=True)
+        self.line_wrinkle, = self.ax.plot([], [], label="皺褶%", color='orange', animated=True)
+        self.ax.legend(loc="upper left")
+        self.canvas = FigureCanvasTkAgg(self.fig, self.win)
+        self.canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def start(self):
+        if self._after is None and not self.closed:
+            self._tick()
+
+    def stop(self):
+        """停止定時更新（停止記錄時呼叫），視窗保留最後的圖"""
+        if self._after is not None:
+            self.win.after_cancel(self._after)
+            self._after = None
+
+    def close(self):
+        self.stop()
+        self.closed = True
+        self.win.destroy()
+
+    def invalidate(self):
+        self._full_redraw = True
+        self.refresh()
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def _tick(self):
+        self.refresh()
+        self._after = self.win.after(self.interval_ms, self._tick)
+
+    def refresh(self):
+        if len(self.history) < 2:
+            return
+        ts, count, wrinkle = self.history.arrays()
+        span = SPANS.get(self.span_var.get())
+        if span == 30:
+            sel = slice(-30, None)
+        elif span:
+            sel = slice(int(np.searchsorted(ts, ts[-1] - span)), None)
+        else:
+            sel = slice(None)
+        x = (ts[sel] - ts[0]) / 60.0
+        count, wrinkle = count[sel], wrinkle[sel]
+
+        buckets = max(50, self.canvas.get_tk_widget().winfo_width() // 2)
+        xc, yc = minmax_downsample(x, count, buckets)
+        xw, yw = minmax_downsample(x, wrinkle, buckets)
+        self.line_count.set_data(xc, yc)
+        self.line_wrinkle.set_data(xw, yw)
+
+        self._update_limits(x[0], x[-1], max(yc.max(), yw.max()))
+        if self._full_redraw or self._background is None:
+            self._full_redraw = False
+            self.canvas.draw()
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line_count)
+        self.ax.draw_artist(self.line_wrinkle)
+        self.canvas.blit(self.ax.bbox)
+
+    def _update_limits(self, x0, x1, ymax):
+        """只有資料超出目前範圍（或顯示範圍改變）時才改座標軸，並預留空間減少整張重畫"""
+        lo, hi = self.ax.get_xlim()
+        if self._full_redraw or x0 < lo or x1 > hi:
+            pad = max(0.5, (x1 - x0) * 0.25)
+            self.ax.set_xlim(x0, x1 + pad)
+            self._full_redraw = True
+        top = self.ax.get_ylim()[1]
+        if self._full_redraw or ymax > top or ymax < top * 0.3:
+            self.ax.set_ylim(0, ymax * 1.2 + 1)
+            self._full_redraw = True
@@ -0,0 +1,576 @@
+"""
+LOG 分析：讀取記錄下來的 wrinkle_*.txt / .wrkl（可以一次很多檔、好幾天），算出
+  百分位數    區塊數與皺褶% 的 p50 / p90 / p95 / p99
+  超標事件    區塊數連續 ≥ trigger_count 的區間（開始、結束、持續秒數、峰值）與總超標時間
+  每小時摘要  筆數、平均 / 最大 / p95 區塊數、平均 / 最大皺褶%、超標秒數、平均總皺褶長度
+  滾動統計    每分鐘彙總後算 N 分鐘滾動平均 / 標準差
+並畫出長時間的趨勢圖（點數固定，幾個月的資料也不會卡）。
+檔案分塊串流讀取，統計只保留每分鐘 / 每小時的彙總與固定大小的直方圖，
+記憶體用量與 LOG 筆數無關，只與涵蓋的時間長度有關（一個月約數 MB）。
+超標事件依「系列」分開追蹤：同一個檔名去掉輪替編號 _001、_002 … 為一個系列，
+同時記錄的各站 LOG（wrinkle_x.txt 與 wrinkle_x_L2.txt）時間互相重疊，不會被接成同一段。
+
+支援的格式：
+  舊版 csv  區塊數,皺褶%,HH:MM:SS。沒有日期：由檔名 wrinkle_YYYYmmdd_HHMMSS 推算，
+            檔名沒有日期時用檔案修改日期；時間倒退超過 12 小時視為跨過午夜。
+  新版 csv  見 log_writer.py（含時間戳與缺陷特徵；特徵欄留空時為 NaN）
+  .wrkl     log_writer 的精簡二進位格式（memmap 分塊讀取，沒有缺陷特徵）
+
+  python log_analytics.py logs/wrinkle_*.txt --trigger-count 20
+  python log_analytics.py logs/*.wrkl --start "2024-05-01 08:00" --end "2024-05-02 08:00" --hourly hourly.csv --chart shift.png
+"""
+
+import argparse
+import csv
+import glob
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from log_writer import BIN_DTYPE, BIN_MAGIC, format_for_path
+
+LOG_DTYPE = [("ts", "<f8"), ("count", "<u4"), ("wrinkle", "<f4"),
+             ("length", "<f4"), ("max_area", "<f4"), ("aspect", "<f4"), ("angle", "<f4")]
+FEATURES = ("length", "max_area", "aspect", "angle")
+CHUNK_ROWS = 65536
+COUNT_BINS = 1024       # 區塊數直方圖格數；超過 1023 的算在最後一格
+WRINKLE_STEP = 0.01     # 皺褶% 直方圖解析度
+QUANTILES = (50, 90, 95, 99)
+MAX_EVENTS = 100000     # 保留明細的超標事件數上限（次數與總秒數不受限）
+_NAME_TIME = re.compile(r"(\d{8})_(\d{6})")
+_ROTATION = re.compile(r"_\d{3}$")     # LogWriter 輪替檔名的編號
+
+
+# ========= 讀取 ==========
+class _OldClock:
+    """舊版 LOG 的 HH:MM:SS 換成 epoch 秒"""
+
+    def __init__(self, path, first_text):
+        m = _NAME_TIME.search(os.path.basename(path))
+        if m:
+            self.day = datetime.strptime(m.group(1), "%Y%m%d")
+        else:
+            # 只知道最後修改時間：第一筆的時刻比它晚，表示是前一天開始記錄的
+            mtime = datetime.fromtimestamp(os.path.getmtime(path))
+            self.day = mtime.replace(hour=0, minute=0, second=0, microsecond=0)
+            if _seconds(first_text) > mtime.hour * 3600 + mtime.minute * 60 + mtime.second:
+                self.day -= timedelta(days=1)
+        self.base = self.day.timestamp()
+        self.prev = None
+
+    def ts(self, text):
+        sec = _seconds(text)
+        if self.prev is not None and sec < self.prev - 12 * 3600:
+            self.day += timedelta(days=1)
+            self.base = self.day.timestamp()
+        self.prev = sec
+        return self.base + sec
+
+
+def _seconds(text):
+    h, m, s = text.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def iter_log(path, chunk_rows=CHUNK_ROWS):
+    """逐塊讀一個 LOG 檔，每塊是最多 chunk_rows 筆的 LOG_DTYPE 陣列"""
+    if format_for_path(path) == "bin":
+        yield from _iter_bin(path, chunk_rows)
+    else:
+        yield from _iter_csv(path, chunk_rows)
+
+
+def _iter_bin(path, chunk_rows):
+    with open(path, "rb") as f:
+        if f.read(len(BIN_MAGIC)) != BIN_MAGIC:
+            raise ValueError(f"{path} 不是 .wrkl LOG 檔")
+    itemsize = np.dtype(BIN_DTYPE).itemsize
+    n = (os.path.getsize(path) - len(BIN_MAGIC)) // itemsize  # 當機時最後一筆可能不完整，捨去
+    if n <= 0:
+        return
+    data = np.memmap(path, dtype=BIN_DTYPE, mode="r", offset=len(BIN_MAGIC), shape=(n,))
+    try:
+        for i in range(0, n, chunk_rows):
+            part = data[i:i + chunk_rows]
+            out = np.empty(len(part), LOG_DTYPE)
+            for name in ("ts", "count", "wrinkle"):
+                out[name] = part[name]
+            for name in FEATURES:
+                out[name] = np.nan
+            yield out
+    finally:
+        del data  # 釋放對應，Windows 上檔案才能被移動或刪除
+
+
+def _iter_csv(path, chunk_rows):
+    nan = float("nan")
+    no_features = (nan, nan, nan, nan)
+    clock = None
+    rows = []
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            parts = line.rstrip("\r\n").split(",")
+            if len(parts) < 3:
+                continue
+            try:
+                count = int(parts[0])
+                wrinkle = float(parts[1])
+                if len(parts) >= 4 and parts[3]:
+                    ts = float(parts[3])
+                else:
+                    if clock is None:
+                        clock = _OldClock(path, parts[2])
+                    ts = clock.ts(parts[2])
+                feats = (tuple(float(x) if x else nan for x in parts[5:9])
+                         if len(parts) >= 9 else no_features)
+            except ValueError:
+                continue  # 標題列或寫到一半的行
+            rows.append((ts, count, wrinkle) + feats)
+            if len(rows) >= chunk_rows:
+                yield np.array(rows, LOG_DTYPE)
+                rows = []
+    if rows:
+        yield np.array(rows, LOG_DTYPE)
+
+
+def _first_ts(path):
+    for chunk in iter_log(path, chunk_rows=1):
+        return float(chunk["ts"][0])
+    return math.inf
+
+
+def log_series(path):
+    """LOG 檔所屬的系列（一站一次記錄）：檔名去掉副檔名與輪替編號"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return _ROTATION.sub("", stem)
+
+
+def iter_logs(paths, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """多個檔案依第一筆時間排序後逐塊讀取；start / end 為 epoch 秒（含 start、不含 end）"""
+    for _, chunk in iter_series(paths, start, end, chunk_rows):
+        yield chunk
+
+
+def iter_series(paths, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """同 iter_logs，但每塊附上所屬系列：(系列, 塊)。不同系列的時間可能重疊"""
+    for path in sorted(paths, key=_first_ts):
+        series = log_series(path)
+        for chunk in iter_log(path, chunk_rows):
+            if start is not None or end is not None:
+                ts = chunk["ts"]
+                keep = np.ones(len(chunk), bool)
+                if start is not None:
+                    keep &= ts >= start
+                if end is not None:
+                    keep &= ts < end
+                chunk = chunk[keep]
+            if len(chunk):
+                yield series, chunk
+
+
+def load_logs(paths, start=None, end=None):
+    """整段讀進一個 LOG_DTYPE 陣列（依時間排序）；長時間的統計請改用 LogAnalyzer 串流處理"""
+    chunks = list(iter_logs(paths, start, end))
+    if not chunks:
+        return np.empty(0, LOG_DTYPE)
+    data = np.concatenate(chunks)
+    return data[np.argsort(data["ts"], kind="stable")]
+
+
+# ========= 統計 ==========
+# 每分鐘彙總的欄位
+N, SUM_C, SUMSQ_C, MAX_C, SUM_W, MAX_W, HIT, N_LEN, SUM_LEN = range(9)
+_SUM_COLS = [N, SUM_C, SUMSQ_C, SUM_W, HIT, N_LEN, SUM_LEN]
+_MAX_COLS = [MAX_C, MAX_W]
+
+
+def _hist_quantile(hist, q, step=1.0):
+    total = hist.sum()
+    if not total:
+        return float("nan")
+    i = int(np.searchsorted(np.cumsum(hist), q / 100 * total))
+    return min(i, len(hist) - 1) * step
+
+
+class LogAnalyzer:
+    """
+    feed() 逐塊餵入 LOG_DTYPE 陣列，finish() 後讀取結果。
+    trigger_count：超標門檻（區塊數 ≥ 此值）；min_event_s：短於此秒數的超標不列入事件
+    max_gap：相鄰兩筆間隔超過此秒數（或時間倒退）視為斷開（停止記錄、換檔）；period：每筆代表的秒數（LOG 每秒一筆）
+    feed() 的 series 用來分開追蹤超標區間（見 log_series），不給時全部當同一系列
+    """
+
+    def __init__(self, trigger_count=20, min_event_s=0.0, max_gap=5.0, period=1.0):
+        self.trigger_count = trigger_count
+        self.min_event_s = min_event_s
+        self.max_gap = max_gap
+        self.period = period
+        self.rows = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.count_hist = np.zeros(COUNT_BINS, np.int64)
+        self.wrinkle_hist = np.zeros(int(round(100 / WRINKLE_STEP)) + 1, np.int64)
+        self.events = []        # (開始, 結束, 持續秒數, 峰值區塊數)
+        self.event_count = 0
+        self.event_seconds = 0.0
+        self.longest_event = None
+        self._minutes = {}      # epoch 分鐘 -> 彙總（見上方欄位）
+        self._hour_hist = {}    # 當地整點 epoch -> 區塊數直方圖（每小時 p95 用）
+        self._hour_of = {}      # epoch 分鐘 -> 當地整點 epoch
+        self._tracks = {}       # 系列 -> [進行中的超標區間 [開始, 最後一筆, 峰值] 或 None, 上一筆時間]
+
+    def feed(self, chunk, series=None):
+        if not len(chunk):
+            return
+        ts = chunk["ts"]
+        count = chunk["count"].astype(np.int64)
+        wrinkle = chunk["wrinkle"].astype(np.float64)
+        self.rows += len(chunk)
+        lo, hi = float(ts.min()), float(ts.max())
+        self.first_ts = lo if self.first_ts is None else min(self.first_ts, lo)
+        self.last_ts = hi if self.last_ts is None else max(self.last_ts, hi)
+
+        clipped = np.minimum(count, COUNT_BINS - 1)
+        self.count_hist += np.bincount(clipped, minlength=COUNT_BINS)
+        wi = np.clip(np.rint(wrinkle / WRINKLE_STEP), 0, len(self.wrinkle_hist) - 1).astype(np.intp)
+        self.wrinkle_hist += np.bincount(wi, minlength=len(self.wrinkle_hist))
+
+        self._feed_minutes(ts, count, wrinkle, chunk["length"].astype(np.float64), clipped)
+        self._track_events(ts, count, self._tracks.setdefault(series, [None, None]))
+
+    def _feed_minutes(self, ts, count, wrinkle, length, clipped):
+        keys, inv = np.unique(np.floor(ts / 60).astype(np.int64), return_inverse=True)
+        k = len(keys)
+        has_len = ~np.isnan(length)
+        agg = np.zeros((k, 9))
+        agg[:, N] = np.bincount(inv, minlength=k)
+        agg[:, SUM_C] = np.bincount(inv, count, k)
+        agg[:, SUMSQ_C] = np.bincount(inv, count * count, k)
+        agg[:, SUM_W] = np.bincount(inv, wrinkle, k)
+        agg[:, HIT] = np.bincount(inv, count >= self.trigger_count, k)
+        agg[:, N_LEN] = np.bincount(inv, has_len, k)
+        agg[:, SUM_LEN] = np.bincount(inv, np.where(has_len, length, 0.0), k)
+        agg[:, MAX_C] = agg[:, MAX_W] = -np.inf
+        np.maximum.at(agg[:, MAX_C], inv, count)
+        np.maximum.at(agg[:, MAX_W], inv, wrinkle)
+        for key, row in zip(keys.tolist(), agg):
+            old = self._minutes.get(key)
+            if old is None:
+                self._minutes[key] = row
+            else:
+                old[_SUM_COLS] += row[_SUM_COLS]
+                old[_MAX_COLS] = np.maximum(old[_MAX_COLS], row[_MAX_COLS])
+
+        hours = np.array([self._hour(key) for key in keys.tolist()], np.int64)
+        row_hours = hours[inv]
+        for h in np.unique(hours).tolist():
+            hist = self._hour_hist.get(h)
+            if hist is None:
+                hist = self._hour_hist[h] = np.zeros(COUNT_BINS, np.int64)
+            hist += np.bincount(clipped[row_hours == h], minlength=COUNT_BINS)
+
+    def _hour(self, minute):
+        h = self._hour_of.get(minute)
+        if h is None:
+            local = datetime.fromtimestamp(minute * 60).replace(minute=0, second=0, microsecond=0)
+            h = self._hour_of[minute] = int(local.timestamp())
+        return h
+
+    def _track_events(self, ts, count, track):
+        """向量化找出連續超標的區間；跨塊（同一系列的下一塊、下一個輪替檔）的區間由 track 接續"""
+        hit = count >= self.trigger_count
+        prev_ts = ts[0] if track[1] is None else track[1]
+        track[1] = float(ts[-1])
+        step = np.diff(ts, prepend=prev_ts)
+        gap = (step > self.max_gap) | (step < 0)  # 時間倒退（檔案重疊、時鐘調整）也算斷開
+        continuing = track[0] is not None and bool(hit[0]) and not bool(gap[0])
+        if track[0] is not None and not continuing:
+            self._finish_run(track)
+        prev_hit = np.concatenate(([continuing], hit[:-1]))
+        starts = np.flatnonzero(hit & (~prev_hit | gap))
+        # 最後一筆之後還不知道，不算結束
+        ends = np.flatnonzero(hit & np.concatenate((~hit[1:] | gap[1:], [False])))
+        seg_starts = np.concatenate(([0], starts)) if continuing else starts
+        if not len(seg_starts):
+            return
+        peaks = np.maximum.reduceat(count, seg_starts)
+        for i, s in enumerate(seg_starts.tolist()):
+            if i == 0 and continuing:
+                run = track[0]
+                run[2] = max(run[2], int(peaks[0]))
+            else:
+                run = [float(ts[s]), float(ts[s]), int(peaks[i])]
+            track[0] = run
+            if i < len(ends):
+                run[1] = float(ts[ends[i]])
+                self._finish_run(track)
+            else:
+                run[1] = float(ts[-1])
+
+    def _finish_run(self, track):
+        start, last, peak = track[0]
+        track[0] = None
+        duration = last - start + self.period
+        if duration < self.min_event_s:
+            return
+        self.event_count += 1
+        self.event_seconds += duration
+        event = (start, last + self.period, duration, peak)
+        if self.longest_event is None or duration > self.longest_event[2]:
+            self.longest_event = event
+        if len(self.events) < MAX_EVENTS:
+            self.events.append(event)
+
+    def finish(self):
+        """收尾：檔案最後還在超標的區間也算一次事件；各系列的事件合併後依開始時間排序"""
+        for track in self._tracks.values():
+            if track[0] is not None:
+                self._finish_run(track)
+        self.events.sort()
+        return self
+
+    # ---- 結果 ----
+    def percentiles(self, qs=QUANTILES):
+        return {
+            "count": {q: _hist_quantile(self.count_hist, q) for q in qs},
+            "wrinkle": {q: _hist_quantile(self.wrinkle_hist, q, WRINKLE_STEP) for q in qs},
+        }
+
+    def minute_series(self):
+        """依時間排序的每分鐘彙總：(分鐘起始 epoch 陣列, 彙總 (n, 9) 陣列)"""
+        if not self._minutes:
+            return np.empty(0), np.empty((0, 9))
+        keys = np.array(sorted(self._minutes))
+        return keys * 60.0, np.array([self._minutes[k] for k in keys.tolist()])
+
+    def rolling(self, window_min=10):
+        """
+        每分鐘一點的 window_min 分鐘滾動平均 / 標準差（區塊數），沒有資料的分鐘不納入。
+        回傳 (分鐘起始 epoch, 平均, 標準差)，只包含有資料的分鐘。
+        """
+        x, agg = self.minute_series()
+        if not len(x):
+            return x, np.empty(0), np.empty(0)
+        idx = ((x - x[0]) / 60).astype(np.int64)
+        dense = np.zeros((idx[-1] + 1, 3))
+        dense[idx] = agg[:, [N, SUM_C, SUMSQ_C]]
+        cum = np.vstack((np.zeros(3), np.cumsum(dense, axis=0)))
+        lo = np.maximum(idx + 1 - window_min, 0)
+        win = cum[idx + 1] - cum[lo]
+        n = np.maximum(win[:, 0], 1)
+        mean = win[:, 1] / n
+        std = np.sqrt(np.maximum(win[:, 2] / n - mean * mean, 0))
+        return x, mean, std
+
+    def hourly(self):
+        """每小時（當地時間）摘要的 dict 清單"""
+        x, agg = self.minute_series()
+        if not len(x):
+            return []
+        hours = np.array([self._hour(int(m // 60)) for m in x.tolist()])
+        rows = []
+        for h in np.unique(hours).tolist():
+            a = agg[hours == h]
+            n = a[:, N].sum()
+            n_len = a[:, N_LEN].sum()
+            rows.append({
+                "hour": datetime.fromtimestamp(h).strftime("%Y-%m-%d %H:00"),
+                "rows": int(n),
+                "count_mean": float(a[:, SUM_C].sum() / n),
+                "count_max": int(a[:, MAX_C].max()),
+                "count_p95": _hist_quantile(self._hour_hist[h], 95),
+                "wrinkle_mean": float(a[:, SUM_W].sum() / n),
+                "wrinkle_max": float(a[:, MAX_W].max()),
+                "exceed_seconds": float(a[:, HIT].sum() * self.period),
+                "length_mean": float(a[:, SUM_LEN].sum() / n_len) if n_len else float("nan"),
+            })
+        return rows
+
+    def summary(self):
+        span = (self.last_ts - self.first_ts + self.period) if self.rows else 0.0
+        return {
+            "rows": self.rows,
+            "start": self.first_ts,
+            "end": self.last_ts,
+            "span_seconds": span,
+            "trigger_count": self.trigger_count,
+            "count_max": int(np.flatnonzero(self.count_hist)[-1]) if self.rows else 0,
+            "wrinkle_max": float(np.flatnonzero(self.wrinkle_hist)[-1] * WRINKLE_STEP) if self.rows else 0.0,
+            "percentiles": self.percentiles(),
+            "exceed_seconds": float(sum(row[HIT] for row in self._minutes.values()) * self.period),
+            "event_count": self.event_count,
+            "event_seconds": self.event_seconds,
+            "longest_event": self.longest_event,
+        }
+
+
+def analyze(paths, trigger_count=20, start=None, end=None, **kwargs):
+    """讀取 paths 的所有 LOG 並回傳 finish() 過的 LogAnalyzer"""
+    analyzer = LogAnalyzer(trigger_count, **kwargs)
+    for series, chunk in iter_series(paths, start, end):
+        analyzer.feed(chunk, series)
+    return analyzer.finish()
+
+
+# ========= 圖表 ==========
+def _coarsen(x, agg, points):
+    """每分鐘彙總再合併成最多 points 段：平均用總和重算、最大值取各段最大，尖峰不會被平均掉"""
+    if len(x) <= points:
+        return x, agg[:, SUM_C] / agg[:, N], agg[:, MAX_C], agg[:, SUM_W] / agg[:, N], agg[:, MAX_W]
+    starts = np.linspace(0, len(x), points + 1).astype(np.intp)[:-1]
+    n = np.add.reduceat(agg[:, N], starts)
+    return (x[starts], np.add.reduceat(agg[:, SUM_C], starts) / n, np.maximum.reduceat(agg[:, MAX_C], starts),
+            np.add.reduceat(agg[:, SUM_W], starts) / n, np.maximum.reduceat(agg[:, MAX_W], starts))
+
+
+def render_chart(analyzer, path, points=2000, window_min=10, title=None):
+    """長時間趨勢圖存成圖片（不需要 Tk）：區塊數最大值 / 滾動平均與超標基準線、皺褶% 平均 / 最大值"""
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fonts = matplotlib.rcParams["font.sans-serif"]
+    if "Microsoft JhengHei" not in fonts:
+        fonts.insert(0, "Microsoft JhengHei")
+    x, agg = analyzer.minute_series()
+    if not len(x):
+        raise ValueError("沒有資料可以畫圖")
+    tx, c_mean, c_max, w_mean, w_max = _coarsen(x, agg, points)
+    rx, r_mean, _ = analyzer.rolling(window_min)
+    if len(rx) > points:
+        pick = np.linspace(0, len(rx) - 1, points).astype(np.intp)
+        rx, r_mean = rx[pick], r_mean[pick]
+    to_dt = np.vectorize(datetime.fromtimestamp, otypes=[object])
+
+    fig = Figure(figsize=(14, 7))
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(2, 1, sharex=True)
+    ax1.plot(to_dt(tx), c_max, color="tab:blue", alpha=0.35, lw=0.8, label="區塊數（最大）")
+    ax1.plot(to_dt(rx), r_mean, color="tab:blue", lw=1.2, label=f"區塊數（{window_min} 分鐘平均）")
+    ax1.axhline(analyzer.trigger_count, color="tab:red", ls="--", lw=1, label=f"截圖基準 {analyzer.trigger_count}")
+    ax1.set_ylabel("區塊數")
+    ax1.legend(loc="upper right")
+    ax2.plot(to_dt(tx), w_max, color="tab:orange", alpha=0.35, lw=0.8, label="皺褶%（最大）")
+    ax2.plot(to_dt(tx), w_mean, color="tab:orange", lw=1.2, label="皺褶%（平均）")
+    ax2.set_ylabel("皺褶 %")
+    ax2.legend(loc="upper right")
+    fig.suptitle(title or f"{_fmt_ts(analyzer.first_ts)} ~ {_fmt_ts(analyzer.last_ts)}")
+    fig.autofmt_xdate()
+    fig.savefig(path, dpi=120)
+
+
+# ========= CLI ==========
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts is not None else "-"
+
+
+def _parse_time(text):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"時間格式應為 YYYY-mm-dd [HH:MM[:SS]]：{text}")
+
+
+def _expand(patterns):
+    """Windows 的命令列不會展開萬用字元，這裡自己展開"""
+    paths = []
+    for p in patterns:
+        matched = sorted(glob.glob(p))
+        paths.extend(matched or [p])
+    return paths
+
+
+def report_text(analyzer, files=0, elapsed=0.0):
+    s = analyzer.summary()
+    if not s["rows"]:
+        return "（沒有資料）"
+    pct = s["percentiles"]
+    qs = "/".join(f"p{q}" for q in QUANTILES)
+    lines = [
+        f"期間 {_fmt_ts(s['start'])} ~ {_fmt_ts(s['end'])}（{s['span_seconds'] / 3600:.1f} 小時，{s['rows']} 筆，"
+        f"{files} 個檔案，讀取 {elapsed:.1f} 秒）",
+        f"區塊數 {qs}：" + " / ".join(f"{v:g}" for v in pct["count"].values()) + f"   最大 {s['count_max']}",
+        f"皺褶%  {qs}：" + " / ".join(f"{v:.2f}" for v in pct["wrinkle"].values()) + f"   最大 {s['wrinkle_max']:.2f}",
+        f"超標（區塊數 ≥ {s['trigger_count']}）：共 {s['exceed_seconds']:.0f} 秒"
+        f"（{s['exceed_seconds'] / max(s['span_seconds'], 1) * 100:.1f}%），連續區間 {s['event_count']} 次",
+    ]
+    if s["longest_event"] is not None:
+        start, _, duration, peak = s["longest_event"]
+        lines.append(f"最長超標 {duration:.0f} 秒，開始於 {_fmt_ts(start)}，峰值 {peak}")
+    lines.append("")
+    lines.append("時段               筆數   平均  最大  p95   平均皺褶%  最大皺褶%  超標秒數")
+    for r in analyzer.hourly():
+        lines.append(f"{r['hour']}  {r['rows']:5d}  {r['count_mean']:5.1f}  {r['count_max']:4d}  {r['count_p95']:4.0f}"
+                     f"   {r['wrinkle_mean']:8.2f}  {r['wrinkle_max']:9.2f}  {r['exceed_seconds']:8.0f}")
+    return "\n".join(lines)
+
+
+def write_hourly_csv(analyzer, path):
+    fields = [("hour", "時段"), ("rows", "筆數"), ("count_mean", "平均區塊數"), ("count_max", "最大區塊數"),
+              ("count_p95", "p95區塊數"), ("wrinkle_mean", "平均皺褶%"), ("wrinkle_max", "最大皺褶%"),
+              ("exceed_seconds", "超標秒數"), ("length_mean", "平均總皺褶長度")]
+    # utf-8-sig：Excel 直接開啟中文標題不會亂碼
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow([title for _, title in fields])
+        for r in analyzer.hourly():
+            w.writerow([f"{r[k]:.2f}" if isinstance(r[k], float) else r[k] for k, _ in fields])
+
+
+def write_events_csv(analyzer, path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["開始", "結束", "持續秒數", "峰值區塊數"])
+        for start, end, duration, peak in analyzer.events:
+            w.writerow([_fmt_ts(start), _fmt_ts(end), f"{duration:.0f}", peak])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RTR-TP 皺褶 LOG 分析（.txt / .wrkl，可多檔、跨日）")
+    ap.add_argument("logs", nargs="+", help="LOG 檔（可用萬用字元，例如 logs/wrinkle_*.txt）")
+    ap.add_argument("--trigger-count", type=int, default=20, help="超標門檻（區塊數 ≥ 此值）")
+    ap.add_argument("--min-event", type=float, default=0.0, help="短於此秒數的超標不列入事件")
+    ap.add_argument("--max-gap", type=float, default=5.0, help="相鄰兩筆超過此秒數視為中斷")
+    ap.add_argument("--start", type=_parse_time, help="開始時間，例如 \"2024-05-01 08:00\"")
+    ap.add_argument("--end", type=_parse_time, help="結束時間（不含）")
+    ap.add_argument("--rolling", type=int, default=10, help="滾動平均的分鐘數")
+    ap.add_argument("--hourly", help="輸出每小時摘要 CSV")
+    ap.add_argument("--events", help="輸出超標事件 CSV")
+    ap.add_argument("--chart", help="輸出趨勢圖（.png / .svg / .pdf）")
+    ap.add_argument("--chart-points", type=int, default=2000, help="趨勢圖最多幾個點")
+    ap.add_argument("--json", help="輸出統計結果 JSON")
+    args = ap.parse_args(argv)
+
+    paths = _expand(args.logs)
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        ap.error("找不到檔案：" + "、".join(missing))
+    t0 = time.perf_counter()
+    analyzer = analyze(paths, args.trigger_count, args.start, args.end,
+                       min_event_s=args.min_event, max_gap=args.max_gap)
+    elapsed = time.perf_counter() - t0
+    print(report_text(analyzer, len(paths), elapsed))
+
+    if args.hourly:
+        write_hourly_csv(analyzer, args.hourly)
+    if args.events:
+        write_events_csv(analyzer, args.events)
+    if args.chart and analyzer.rows:
+        render_chart(analyzer, args.chart, args.chart_points, args.rolling)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"files": paths, "summary": analyzer.summary(), "hourly": analyzer.hourly(),
+                       "events": analyzer.events}, f, ensure_ascii=False, indent=2, default=float)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
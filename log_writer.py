@@ -0,0 +1,184 @@
+"""
+背景 LOG 寫入器：UI 只把資料丟進佇列，由背景執行緒批次寫檔。
+
+格式：
+  csv  文字檔，欄位「區塊數,皺褶%,時間,時間戳,各ROI,總皺褶長度,最大缺陷面積,長寬比,角度,各格密度」。
+       前兩欄與舊檔相同，時間改為含日期的完整時間，時間戳為 epoch 秒（小數 3 位）。
+       總皺褶長度～角度四欄為缺陷特徵摘要（見 blobs.summarize），沒有提供時留空。
+       各格密度為分格模式的熱度圖，「ROI1=8x1:0006...;ROI2=...」（見 density.encode_tiles），沒有分格時留空。
+  bin  精簡二進位（副檔名 .wrkl）：8 bytes 檔頭 BIN_MAGIC，之後每筆固定 16 bytes
+       little-endian 的 (epoch float64, 區塊數 uint32, 皺褶% float32)，
+       可直接用 numpy.fromfile(dtype=BIN_DTYPE, offset=len(BIN_MAGIC)) 讀入。不含各 ROI 明細與缺陷特徵。
+
+fsync="batch" 時每批寫完都會 fsync，當機最多損失一批（flush_interval 秒或 flush_rows 筆）。
+"""
+
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+from density import encode_tiles
+
+CSV_HEADER = "區塊數,皺褶%,時間,時間戳,各ROI(名稱=區塊數/皺褶%),總皺褶長度,最大缺陷面積,長寬比,角度,各格密度\n"
+BIN_MAGIC = b"WRKL\x01\x00\x00\x00"
+BIN_RECORD = struct.Struct("<dIf")
+BIN_DTYPE = [("ts", "<f8"), ("count", "<u4"), ("wrinkle", "<f4")]
+
+MAX_ROTATIONS = 999  # 輪替編號固定 3 位數
+
+_CLOSE = object()
+
+
+def format_for_path(path):
+    return "bin" if os.path.splitext(path)[1].lower() == ".wrkl" else "csv"
+
+
+class LogWriter(threading.Thread):
+    """
+    path：第一個檔案路徑，輪替後的檔名為 <原檔名>_001、_002 ...（log_analytics 依此把它們當成同一組）。
+        已存在的檔案一律不覆寫，跳到下一個沒用過的編號；overwrite=True 時只有 path 本身可以覆寫
+        （使用者在存檔對話框確認過取代）
+    max_bytes：單檔超過此大小就換檔（0 = 不限）
+    shift_hours：換班整點，例如 (8, 20)，跨過時換檔
+    fsync："batch" 每批 fsync；"none" 交給作業系統
+    """
+
+    def __init__(self, path, fmt=None, flush_interval=5.0, flush_rows=200,
+                 max_bytes=0, shift_hours=(), fsync="batch", max_queue=100000, overwrite=False):
+        super().__init__(name="log-writer", daemon=True)
+        self.base_path = path
+        self.fmt = fmt or format_for_path(path)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_bytes = max_bytes
+        self.shift_hours = sorted(shift_hours)
+        self.fsync = fsync
+        self.overwrite = overwrite
+        self.paths = []
+        self.rows_written = 0
+        self.dropped = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._file = None
+        self._size = 0
+        self._rotate_at = None
+        self._index = 0     # 下一個要試的輪替編號（0 = path 本身）
+
+    # ---- UI 執行緒呼叫 ----
+    def write(self, ts, defect_count, wrinkle, per_roi=None, features=None, tiles=None):
+        """
+        per_roi：{名稱: (區塊數, 皺褶%)}；features：(總皺褶長度, 最大缺陷面積, 長寬比, 角度)；
+        tiles：{名稱: 熱度圖陣列}。三者都只寫入 csv
+        """
+        try:
+            self._queue.put_nowait((ts, defect_count, wrinkle, per_roi, features, tiles))
+        except queue.Full:
+            self.dropped += 1
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5.0):
+        """送出剩下的資料並關檔"""
+        self._queue.put(_CLOSE)
+        self.join(timeout)
+
+    # ---- 背景執行緒 ----
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _CLOSE:
+                    closing = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if closing or len(batch) >= self.flush_rows or time.monotonic() >= deadline:
+                if batch:
+                    try:
+                        self._write_batch(batch)
+                    except Exception as e:
+                        self.last_error = e
+                        print("LOG 寫入失敗：", e)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+        if self._file is not None:
+            self._close_file()
+
+    def _write_batch(self, batch):
+        for ts, defect_count, wrinkle, per_roi, features, tiles in batch:
+            if self._file is None or self._need_rotate(ts):
+                self._open_next(ts)
+            data = self._encode(ts, defect_count, wrinkle, per_roi, features, tiles)
+            self._file.write(data)
+            self._size += len(data)
+            self.rows_written += 1
+        self._sync()
+
+    def _encode(self, ts, defect_count, wrinkle, per_roi, features, tiles):
+        if self.fmt == "bin":
+            return BIN_RECORD.pack(ts, defect_count, wrinkle)
+        stamp = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        rois = ";".join(f"{name}={c}/{w:.2f}" for name, (c, w) in (per_roi or {}).items())
+        if features is not None:
+            length, area, aspect, angle = features
+            feats = f"{length:.1f},{area:.0f},{aspect:.2f},{angle:.1f}"
+        else:
+            feats = ",,,"
+        heat = ";".join(f"{name}={encode_tiles(h)}" for name, h in (tiles or {}).items())
+        return f"{defect_count},{wrinkle:.2f},{stamp},{ts:.3f},{rois},{feats},{heat}\n".encode("utf-8")
+
+    def _need_rotate(self, ts):
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        return self._rotate_at is not None and ts >= self._rotate_at
+
+    def _open_next(self, ts):
+        if self._file is not None:
+            self._close_file()
+        stem, ext = os.path.splitext(self.base_path)
+        while True:
+            if self._index > MAX_ROTATIONS:
+                raise FileExistsError(f"{stem}_001{ext} ~ _{MAX_ROTATIONS:03d}{ext} 都已存在，請換一個檔名")
+            path = self.base_path if self._index == 0 else f"{stem}_{self._index:03d}{ext}"
+            mode = "wb" if self._index == 0 and self.overwrite else "xb"
+            self._index += 1
+            try:
+                self._file = open(path, mode)
+                break
+            except FileExistsError:
+                continue
+        header = BIN_MAGIC if self.fmt == "bin" else CSV_HEADER.encode("utf-8")
+        self._file.write(header)
+        self._size = len(header)
+        self._rotate_at = self._next_shift_boundary(ts)
+        self.paths.append(path)
+
+    def _next_shift_boundary(self, ts):
+        if not self.shift_hours:
+            return None
+        now = datetime.fromtimestamp(ts)
+        for day in (0, 1):
+            for h in self.shift_hours:
+                b = now.replace(hour=h, minute=0, second=0, microsecond=0) + timedelta(days=day)
+                if b > now:
+                    return b.timestamp()
+        return None
+
+    def _sync(self):
+        self._file.flush()
+        if self.fsync == "batch":
+            os.fsync(self._file.fileno())
+
+    def _close_file(self):
+        self._sync()
+        self._file.close()
+        self._file = None
@@ -1,23 +1,16 @@
-import cv2
-import numpy as np
+import multiprocessing
+multiprocessing.freeze_support()  # 打包成 exe 時，多行程模式的子行程從這裡直接進入，不會建立 UI
+import sys
+from startup import StartupProfiler
+# main.py --startup-profile：記錄每個 import 與初始化步驟的耗時，第一張畫面分析完時印出並寫入 startup_profile.txt
+profiler = StartupProfiler(enabled="--startup-profile" in sys.argv)
 import os
 import time
-import matplotlib.pyplot as plt
-import sys
-plt.rcParams['font.family'] = 'Microsoft JhengHei'
 from tkinter import *
 from PIL import Image, ImageTk, ImageDraw, ImageFont
-from tkinter import filedialog
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from threading import Timer
+from tkinter import filedialog, simpledialog
 import threading
-import gc
-import psutil, os
-try:
-    p = psutil.Process(os.getpid())
-    p.nice(psutil.HIGH_PRIORITY_CLASS)
-except:
-    pass
+from dataclasses import asdict
 
 def get_base_dir():
     # PyInstaller 執行時會有 _MEIPASS，否則是原始程式路徑
@@ -25,22 +18,6 @@ def get_base_dir():
         return os.path.dirname(sys.executable)
     return os.path.dirname(__file__)
 
-def periodic_memory_cleanup():
-    gc.collect()  # 觸發 Python 垃圾回收
-    root.after(10000, periodic_memory_cleanup)  # 每 10 秒執行一次
-
-def find_camera_index(max_index=5):
-    available = []
-    for i in range(max_index):
-        cap = cv2.VideoCapture(i)
-        if cap.read()[0]:
-            available.append(i)
-        cap.release()
-    return available
-    
-def save_image_async(path, frame):
-    threading.Thread(target=cv2.imwrite, args=(path, frame)).start()
-
 # ========= 工具函數：打包後找資源的路徑 ==========
 def resource_path(filename):
     """
@@ -50,24 +27,204 @@ def resource_path(filename):
         return os.path.join(sys._MEIPASS, filename)
     return os.path.join(os.path.dirname(__file__), filename)
 
+# ========= UI 初始化 ==========
+root = Tk()
+root.withdraw()
+
+# ========= 顯示開場 LOGO ==========
+# 只需要 tkinter 與 PIL：先把 LOGO 畫出來，較慢的 import（numpy、cv2…）、開攝影機與建立 UI 都在 LOGO 顯示期間進行
+def show_splash():
+    splash = Toplevel()
+    splash.overrideredirect(True)
+    splash.geometry("400x400+500+200")
+
+    try:
+        logo_path = resource_path("logo.png")
+        img = Image.open(logo_path).resize((400, 400))
+        logo_img = ImageTk.PhotoImage(img)
+        label = Label(splash, image=logo_img)
+        label.image = logo_img
+        label.pack()
+    except Exception as e:
+        Label(splash, text="⚠ 無法載入 LOGO", font=("Arial", 20)).pack(expand=True)
+        print("載入 LOGO 錯誤：", e)
+    return splash
+
+splash = show_splash()
+root.update()
+profiler.mark("tkinter / PIL、顯示 LOGO")
+
+from stations import Station, StationScheduler, Smoother, load_station_configs
+from multiproc import ProcessStation, RemoteDetector
+import discovery
+from capture import CameraSettings
+import config
+from config import ConfigError, ConfigWatcher, Profile, ProfileSet, TriggerConfig
+from wrinkle_detector import MultiRoiDetector, DetectorParams, RoiSpec, pixels_to_roi, roi_to_pixels
+from compositor import DisplayCompositor, PANELS, PANEL_TITLES
+from gradient import BACKENDS as GRADIENT_BACKENDS
+from blobs import BACKENDS as BLOB_BACKENDS, summarize
+from thresholding import MODES as THRESHOLD_MODES
+from log_writer import LogWriter
+from evidence import EvidenceWriter, FORMATS as EVIDENCE_FORMATS
+from clip_recorder import ClipRecorder
+from events import Event, EventStore
+from stream_server import StreamServer
+from live_chart import LiveChart, HistoryRing  # matplotlib 在第一次開圖表時才載入
+from metrics import HistogramTimer, RateMeter, GcMonitor, MetricsRegistry, MetricsExporter, process_stats
+profiler.mark("檢測模組 import")
+
+def raise_priority():
+    """提高行程優先權；在開攝影機的背景執行緒呼叫，psutil 的載入不佔開機時間"""
+    try:
+        import psutil
+        p = psutil.Process(os.getpid())
+        p.nice(psutil.HIGH_PRIORITY_CLASS)
+    except:
+        pass
+
+CAMERA_MAX_INDEX = 5
+CAMERA_PROBE_TIMEOUT = 4.0  # 秒；整體逾時，各 index 同時探測
+CAMERA_CACHE = os.path.join(get_base_dir(), "camera_cache.json")  # 搜尋結果快取，開程式不必每次重新探測
+
+def find_camera_index(max_index=CAMERA_MAX_INDEX):
+    return sorted(discovery.discover_cameras(max_index, timeout=CAMERA_PROBE_TIMEOUT))
+
 # ========= 全域變數 ==========
-cap = None
-cap2 = None
+station = None    # 主站：UI 參數區操作的這一組檢測 / 夾具攝影機
+scheduler = None  # 所有站共用的分析排程（主站 + stations.json 設定的其他站）
+camera_error = None  # 背景開攝影機失敗的例外；UI 照常開啟，改 index 後按「更新攝影機」重試
+cameras_listed = threading.Event()  # 開場的攝影機搜尋已結束（或不需要搜尋）
+cameras_listed.set()
+ANALYSIS_FPS = 30 # 主站分析頻率上限
+# main.py --processes：擷取與分析改在子行程（影格走共享記憶體），高解析度或多站時用
+USE_PROCESSES = "--processes" in sys.argv
+StationClass, DetectorClass = (ProcessStation, RemoteDetector) if USE_PROCESSES else (Station, MultiRoiDetector)
+camera_settings = {"main": CameraSettings(), "jig": CameraSettings()}  # 主 / 副攝影機開啟時套用的設定
+opened_cameras = None  # 主站目前開啟的 (主 index, 副 index, 主設定, 副設定)，套用參數組時比對是否要重開
+# 各型號參數組；檔案被外部修改（或另一台電腦同步過來）時自動重新載入
+CONFIG_FILE = os.path.join(get_base_dir(), "wrinkle_config.json")
+profile_set = ProfileSet()
+applied_profile = None  # 最後套用到 widget 與引擎的參數組
+config_invalid = False  # 磁碟上的參數檔讀取失敗（內容不是 profile_set），存檔前要先備份
+config_watcher = None
+trigger = TriggerConfig()  # 截圖觸發設定；欄位修改時才解析，不在每張影格讀 widget
+SPLASH_MAX_S = 8.0 # 攝影機遲遲開不起來也進主畫面（畫面會是黑的，之後可按更新攝影機）
 edge_threshold = 50
 min_area = 200
 sobel_ksize = 3
 recording = False
-record_log = []
-display_log = []
-MAX_DISPLAY = 30
+history = HistoryRing(24 * 3600)  # 記錄中每秒一筆 (時間, 區塊數, 皺褶%)，圖表顯示用，最多 24 小時
+live_chart = None                 # 即時圖表視窗，只開一個
 frame_to_save = None
 output_dir = os.path.join(os.path.dirname(__file__), "captures")
 os.makedirs(output_dir, exist_ok=True)
 screenshot_dir = None  # 截圖儲存資料夾（與 log_file_path 同位置）
 
-roi_x, roi_y, roi_w, roi_h = 80, 60, 160, 120
+PREVIEW_W, PREVIEW_H = 320, 240  # 預覽畫面大小；ROI 拖曳以預覽座標操作，送給引擎時換成比例
+# 多個具名 ROI（預覽座標），各自有檢測參數；active_roi 是參數區目前正在編輯的那一個
+rois = [{"name": "ROI1", "x": 80, "y": 60, "w": 160, "h": 120,
+         "edge": edge_threshold, "min_area": min_area, "ksize": sobel_ksize}]
+active_roi = 0
+active_roi_name = "ROI1"  # 給分析執行緒挑選顯示哪個 ROI 的 Sobel / 二值化畫面
 drag_start = None
 log_file_path = None  # 記錄檔案路徑
+log_writer = None     # 背景 LOG 寫入器（記錄中才有）
+LOG_FLUSH_INTERVAL = 5        # 秒；當機最多損失這段時間的 LOG
+LOG_MAX_BYTES = 50 * 1024 * 1024  # 單檔上限，超過就換檔
+LOG_SHIFT_HOURS = (8, 20)     # 換班整點，跨班自動換檔
+# 截圖由固定的背景執行緒編碼寫檔，佇列滿了丟最舊的，UI 不會卡在存檔
+evidence_writer = EvidenceWriter(workers=2, max_queue=16, policy="drop_oldest", fmt="jpg", quality=90)
+# 保留兩台攝影機最近幾秒的畫面（JPEG 壓縮存在記憶體），觸發截圖時一併輸出前後的影片片段
+clip_recorder = ClipRecorder(pre_seconds=5, post_seconds=3, fps=10, max_bytes=64 * 1024 * 1024)
+# 每次觸發截圖記一筆事件（數值、參數、檔案路徑），可依時間 / 區塊數 / 站別查詢；過期事件連同檔案自動刪除
+EVENT_DB = os.path.join(get_base_dir(), "events.db")
+EVENT_RETENTION_DAYS = 90
+event_store = EventStore(EVENT_DB, retention_days=EVENT_RETENTION_DAYS)
+# 執行狀態指標：診斷視窗顯示，並定時寫 metrics.json、在 localhost 提供 Prometheus 格式
+METRICS_PORT = 9109   # http://127.0.0.1:9109/metrics；0 = 不開
+METRICS_FILE = os.path.join(get_base_dir(), "metrics.json")
+display_rate = RateMeter()
+gc_monitor = GcMonitor().install()
+metrics_registry = MetricsRegistry()
+metrics_exporter = None
+# 遠端觀看：瀏覽器開 http://<這台電腦>:8090/ 看標註畫面（MJPEG）與即時數值（SSE）；0 = 不開
+# 預設只給本機看，以 main.py --stream-lan 啟動時同網段的電腦也能連
+STREAM_PORT = 8090
+STREAM_HOST = "0.0.0.0" if "--stream-lan" in sys.argv else "127.0.0.1"
+stream_server = StreamServer(STREAM_HOST, STREAM_PORT, fps=10)
+
+def roi_specs():
+    return [RoiSpec(r["name"], pixels_to_roi(r["x"], r["y"], r["w"], r["h"], (PREVIEW_W, PREVIEW_H)),
+                    r["edge"], r["min_area"], r["ksize"]) for r in rois]
+
+# 檢測引擎；參數只在 widget 變動時整包推送，不在每張影格讀 widget
+detector = DetectorClass(DetectorParams(frame_size=(PREVIEW_W, PREVIEW_H)), roi_specs())
+
+# ========= 開攝影機（與建立 UI 同時進行） ==========
+def read_profiles():
+    """讀參數檔（不碰 widget，建立 UI 前就能呼叫）；回傳錯誤訊息，沒有錯誤時回傳 None"""
+    global profile_set, config_invalid
+    if not os.path.exists(CONFIG_FILE):
+        return None
+    try:
+        profile_set = config.load(CONFIG_FILE)
+    except (OSError, ConfigError) as e:
+        config_invalid = True
+        return f"⚠️ 參數檔讀取失敗，使用預設值（存檔時會先備份原檔）：{e}"
+    return None
+
+def open_cameras(main_idx, sub_idx):
+    """背景執行緒：開啟失敗時記在 camera_error（不讓 LOGO 一直等下去）"""
+    global camera_error
+    try:
+        open_station(main_idx, sub_idx)
+    except Exception as e:
+        camera_error = e
+        print(f"開啟攝影機失敗：{e!r}")
+
+def open_station(main_idx, sub_idx):
+    """
+    開啟主站攝影機（與 LOGO、建立 UI 同時進行）；有快取時用快取的 backend 開。
+    快取過期時等主攝影機開好才搜尋，並跳過主 / 副攝影機，探測逾時的執行緒不會佔住它們
+    """
+    global station
+    raise_priority()
+    with profiler.step("讀取攝影機快取"):
+        cache_ok = bool(discovery.load_cache(CAMERA_CACHE))
+    with profiler.step("開啟主攝影機"):
+        st = StationClass("L1", main_idx, sub_idx, detector, target_fps=ANALYSIS_FPS,
+                          main_settings=camera_settings["main"], jig_settings=camera_settings["jig"])
+        st.start()
+        station = st
+        deadline = time.monotonic() + SPLASH_MAX_S
+        while not st.grabber.opened.is_set() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    if not cache_ok:
+        cameras_listed.clear()
+        try:
+            with profiler.step("搜尋攝影機"):
+                discovery.discover_cameras(CAMERA_MAX_INDEX, timeout=CAMERA_PROBE_TIMEOUT,
+                                           skip={i for i in (main_idx, sub_idx) if i is not None})
+                try:
+                    discovery.save_cache(CAMERA_CACHE)
+                except OSError:
+                    pass
+        finally:
+            cameras_listed.set()
+
+# 使用中型號的攝影機 index 與設定直接從參數檔取得，不必等 UI 建好；其餘參數在 begin() 套用到 widget
+profile_error = read_profiles()
+camera_settings.update(main=profile_set.current.main_settings, jig=profile_set.current.jig_settings)
+opened_cameras = (profile_set.current.main_cam, profile_set.current.jig_cam,
+                  camera_settings["main"], camera_settings["jig"])
+def start_open_cameras(main_idx, sub_idx):
+    global camera_error
+    camera_error = None
+    threading.Thread(target=open_cameras, args=(main_idx, sub_idx), name="camera-open", daemon=True).start()
+
+start_open_cameras(*opened_cameras[:2])
+profiler.mark("讀取參數檔、開始開攝影機")
 
 # ========= 字體與畫中文 ==========
 def get_chinese_font(size=20):
@@ -76,38 +233,91 @@ def get_chinese_font(size=20):
     except:
         return ImageFont.truetype("/usr/share/fonts/truetype/arphic/ukai.ttc", size)
 
-# ========= UI 初始化 ==========
-root = Tk()
-root.withdraw()
+# ========= 開場：等第一張分析畫面 ==========
+def start_main_ui():
+    t0 = time.time()
 
-# ========= 顯示開場 LOGO ==========
-def show_logo_then_start_main_ui():
-    splash = Toplevel()
-    splash.overrideredirect(True)
-    splash.geometry("400x400+500+200")
-
-    try:
-        logo_path = resource_path("logo.png")
-        img = Image.open(logo_path).resize((400, 400))
-        logo_img = ImageTk.PhotoImage(img)
-        label = Label(splash, image=logo_img)
-        label.image = logo_img
-        label.pack()
-    except Exception as e:
-        Label(splash, text="⚠ 無法載入 LOGO", font=("Arial", 20)).pack(expand=True)
-        print("載入 LOGO 錯誤：", e)
+    def start_analysis():
+        """主站攝影機建立後立刻開始分析（LOGO 還在），其他站一起排程"""
+        global scheduler
+        try:
+            extra = load_station_configs(os.path.join(get_base_dir(), "stations.json"), (PREVIEW_W, PREVIEW_H),
+                                         StationClass, DetectorClass)
+        except Exception as e:
+            extra = []
+            status_var.set(f"⚠️ stations.json 讀取失敗：{e}")
+        scheduler = StationScheduler([station] + extra)
+        update_smoothing()
+        for st in scheduler.stations:
+            st.detector.timer = HistogramTimer()
+        scheduler.start()
+
+    def wait_first_frame():
+        elapsed = time.time() - t0
+        if station is not None and scheduler is None:
+            start_analysis()
+        # 第一張分析完成就進主畫面；攝影機開不起來或遲遲沒有畫面時最多等 SPLASH_MAX_S
+        if station is not None and station.latest() is not None:
+            launch_main("等待第一張分析畫面")
+        elif camera_error is not None:
+            launch_main("開啟攝影機（失敗）")
+        elif elapsed >= SPLASH_MAX_S:
+            launch_main("等待第一張分析畫面（逾時）")
+        else:
+            splash.after(10, wait_first_frame)
 
-    def launch_main():
-        global cap, cap2
+    def wait_station():
+        """主畫面出現時攝影機還沒開好（或開啟失敗後重試）：開好後才開始分析"""
+        if station is None:
+            root.after(100, wait_station)
+            return
+        if scheduler is None:
+            start_analysis()
+        if len(scheduler.stations) > 1:
+            show_station_grid()
+
+    def begin():
+        # after(0) 在 mainloop 開始後才執行，這時整個 UI 已建立好
+        load_profiles()
+        push_params()
+        profiler.mark("套用參數組")
+        wait_first_frame()
+
+    def show_camera_list():
+        """開場搜尋攝影機可能還沒結束（主攝影機開好才開始搜尋），結束後再更新一次"""
+        camera_info_var.set(discovery.describe(discovery.cached_cameras()))
+        if not cameras_listed.is_set():
+            root.after(500, show_camera_list)
+
+    def launch_main(waited):
+        global metrics_exporter, config_watcher
+        profiler.mark(waited)
         splash.destroy()
         root.deiconify()
-        cap = cv2.VideoCapture(int(entry_main_cam.get()))
-        cap2 = cv2.VideoCapture(int(entry_sub_cam.get()))
+        show_camera_list()
+        clip_recorder.start()
+        event_store.start()
+        metrics_exporter = MetricsExporter(metrics_registry, METRICS_FILE, METRICS_PORT)
+        metrics_exporter.start()
+        if STREAM_PORT:
+            stream_server.start()
+        config_watcher = ConfigWatcher(CONFIG_FILE)
+        config_watcher.start()
+        check_config()
+        wait_station()
         update_frame()
+        root.update_idletasks()
+        profiler.mark("顯示主畫面")
+        report = profiler.finish(get_base_dir())
+        if camera_error is not None:
+            status_var.set(f"⚠️ 攝影機開啟失敗：{camera_error}（確認 index 後按「更新攝影機」重試）")
+        elif status_var.get() == "準備就緒":
+            status_var.set(f"準備就緒（開機 {profiler.elapsed():.1f} 秒）"
+                           + (f"，耗時報告：{os.path.basename(report)}" if report else ""))
 
-    splash.after(5000, launch_main)
+    splash.after(0, begin)
 
-show_logo_then_start_main_ui()
+start_main_ui()
 
 root.title("RTR-TP 皺褶檢測系統")
 main_frame = Frame(root)
@@ -149,6 +359,12 @@ video_label.pack()
 video_label2 = Label(right_panel)
 video_label2.pack()
 
+# 顯示拼圖：預先配置的緩衝區 + 常駐的 PhotoImage，顯示頻率與分析頻率分開
+DISPLAY_FPS = 15
+compositor = DisplayCompositor((PREVIEW_W, PREVIEW_H), PANELS)
+compositor2 = DisplayCompositor((PREVIEW_W, PREVIEW_H), ("jig",), columns=1)
+last_display_time = 0
+
 
 # --- 外層容器 ---
 info_container = Frame(left_panel)
@@ -207,18 +423,33 @@ def show_help():# 參數說明OPL
 本軟體目的 : 本軟體為宜蘭生產處開發，用於監測RTR(特別是TP)的皺褶程度。
 軟體功能 : 
 1.連續監控皺褶程度、數量。
-2.即時圖表顯示
-3.LOG檔匯出
+2.即時圖表顯示（可切換最近 30 筆 / 10 分鐘 / 1 小時 / 整班）
+3.LOG檔匯出（背景批次寫入，超過 50MB 或換班 08:00 / 20:00 自動換檔；存成 .wrkl 為精簡二進位格式）
 4.各項參數可自行調整
 5.可調整要識別的區域大小
-6.可將調整好的參數存下
+6.可將調整好的參數存下：依型號存成多組（wrinkle_config.json，含觸發條件、攝影機與 ROI），換線時選型號即可；直接修改檔案也會自動套用
 7.可設定條件進行截圖(拍夾具編號)
-8.請詳閱使用說明~感謝
+8.搜尋攝影機：列出各攝影機 index、解析度與 fps（結果會記住，下次開程式更快）
+9.多站監看：同資料夾放 stations.json 可同時監看多條產線（多站總覽視窗）
+10.診斷視窗：各站擷取 / 分析 / 顯示 fps、各階段延遲、丟幀、佇列、CPU 與記憶體（同時寫 metrics.json，並可由 http://127.0.0.1:9109/metrics 讀取）
+11.多行程模式：以 main.py --processes 啟動，攝影機擷取與分析改在獨立行程（影格走共享記憶體），高解析度或多站時可用滿多核心；此模式只顯示標註畫面
+12.LOG 分析：python log_analytics.py logs/wrinkle_*.txt 可一次分析多天的 LOG（百分位數、超標時間、每小時摘要、趨勢圖）
+13.皺褶密度熱度圖：ROI 分成 欄×列 格，預覽上以顏色標出皺褶常出現的位置（越紅越多），記錄時各格密度一併寫入 LOG
+14.事件查詢：每次截圖的時間、站別、區塊數、皺褶%、當時參數與截圖路徑記在 events.db，可依站別 / 天數 / 區塊數查詢（也可用 python events.py），超過 90 天的事件連同截圖自動刪除
+15.遠端觀看：瀏覽器開 http://127.0.0.1:8090/ 可看標註畫面與各站即時數值；以 main.py --stream-lan 啟動時同網段電腦用這台的 IP 連線
+16.開機耗時：以 main.py --startup-profile 啟動，第一張畫面分析完後把各 import 與初始化步驟的耗時寫入 startup_profile.txt
+17.請詳閱使用說明~感謝
 
  參數說明 :    
 【邊緣強度】
 控制影像邊緣的二值化門檻，數值越高，檢測越嚴格。也就是會偵測到越多皺褶，可以自行調整容許值。
 
+【二值化門檻】
+fixed：使用上面的邊緣強度。otsu / percentile：依畫面梯度分布自動決定門檻並隨時間緩慢調整，
+光線或膜材改變時不必一直重調；percentile 填 99 表示梯度最強的 1% 才可能判為皺褶。
+分格填 4 表示 ROI 切成 4×4 格各自算門檻（照明不均勻時用）。
+最佳的邊緣強度 / 核心 / 面積可用 calibrate.py 以錄影自動找出。
+
 【最小區塊面積】
 過濾太小的雜訊，設定一個區塊大小下限。也就是顯示框的密集程度。
 
@@ -227,11 +458,43 @@ def show_help():# 參數說明OPL
 如果板面影像有些雜點 → 試試 ksize = 5 或 7
 如果想要微調皺褶精度 → 5~9 是合理範圍，TP用3應該可行。
 
+【梯度計算方式】
+f64 : 原本的算法，最準確，也最吃效能。
+f32_l2 : 結果與 f64 幾乎相同（差 1 灰階以內），速度較快。
+s16_l1 : 整數運算最快，但斜向皺褶的強度會偏高，同樣門檻下會抓到較多白點，邊緣強度可酌量調高。
+
+【區塊分析方式】
+contours : 原本的輪廓做法，面積以輪廓多邊形計算。
+components : 連通區塊統計，雜訊很多（框框上千個）時快很多；面積以像素數計，同樣的最小面積會多抓到一些小區塊。
+兩種方式都會算出每個缺陷的面積、長寬比、方向與長度，LOG 會記錄總皺褶長度與最大缺陷的特徵。
+
 【ROI 寬度/高度】
 調整分析區塊的範圍，設定分析目標的寬高。
 
+【全解析度分析】
+勾選後 ROI 直接在攝影機原始解析度上分析（例如 1080p），細小皺褶比較不會因縮圖而消失。
+預覽畫面仍是縮小顯示，最小區塊面積會自動依解析度換算，不需重新調整。
+
 可拖曳 ROI 框來移動分析位置。
 
+【ROI 清單】
+可新增多個 ROI（例如板邊左右各一個），每個 ROI 有自己的邊緣強度、最小區塊面積、Sobel 核心大小。
+點選或拖曳某個 ROI 後，參數區調整的就是那個 ROI。
+LOG 會額外記錄每個 ROI 的區塊數與皺褶%，任一 ROI 達到截圖基準就會觸發截圖。
+
+【攝影機設定】
+可設定主 / 副攝影機的寬高、FPS、格式（FOURCC，USB 攝影機建議 MJPG 才跑得到高 fps）、
+緩衝張數（1 = 永遠拿最新畫面，延遲最低）、曝光與增益；空白表示用驅動預設。
+視窗下方會顯示攝影機實際接受的值與實際 fps，設定會跟著儲存參數一起存檔。
+
+
+【畫面不變就略過分析】
+產線停機或膜面沒有移動時，ROI 縮圖與上次分析的畫面平均灰階差不超過此值就沿用上次結果，省下 CPU。
+建議 1~3（攝影機雜訊大小）；0 表示每張都分析。
+
+【截圖判斷平滑】
+區塊數先平滑再跟截圖基準比，單張影格的雜訊不會誤觸截圖。
+ema : 指數平滑（預設）；median : 最近 5 張取中位數；off : 不平滑（原本的行為）。
 
 【框框數量截圖基準】
 當出現多少框框，就準備進行夾具(第二攝影機)截圖存檔
@@ -247,7 +510,11 @@ def show_help():# 參數說明OPL
 
 【截圖最短間隔（秒）】
 當截圖一次後，經過多少秒，再次截圖
-注意 : 截圖的參數會影響系統效能，建議使用SSD，或是pcie。
+截圖在背景存檔，不會卡住畫面；若硬碟太慢來不及寫，會略過最舊的待存截圖。
+截圖同時會輸出觸發前 5 秒、後 3 秒的影片片段（clip_時間_main.avi 為標註畫面，clip_時間_jig.avi 為夾具畫面）。
+
+【截圖格式 / 品質】
+jpg / webp 檔案小、存得快，品質 90 已足夠辨識夾具編號；png 無失真但檔案大。
 
 
 
@@ -268,18 +535,27 @@ def show_help():# 參數說明OPL
 param_frame = LabelFrame(left_panel, text="🛠️ 參數調整區", padx=5, pady=5)
 param_frame.pack(pady=5, fill='x')
 Label(param_frame, text="邊緣強度").pack(anchor='w')
-scale_edge = Scale(param_frame, from_=0, to=255, orient=HORIZONTAL)
+scale_edge = Scale(param_frame, from_=0, to=255, orient=HORIZONTAL, command=lambda v: push_params())
 scale_edge.set(edge_threshold)
 scale_edge.pack(fill='x')
 Label(param_frame, text="最小區塊面積").pack(anchor='w')
 entry_area = Entry(param_frame, width=10)
 entry_area.insert(0, str(min_area))
 entry_area.pack(fill='x', pady=2)
+entry_area.bind("<KeyRelease>", lambda e: push_params())
 Label(param_frame, text="Sobel 核心大小（奇數）").pack(anchor='w')
-scale_ksize = Scale(param_frame, from_=1, to=31, resolution=2, orient=HORIZONTAL)
+scale_ksize = Scale(param_frame, from_=1, to=31, resolution=2, orient=HORIZONTAL, command=lambda v: push_params())
 scale_ksize.set(sobel_ksize)
 scale_ksize.pack(fill='x')
 
+Label(param_frame, text="梯度計算方式（f64 最準 / s16_l1 最快）").pack(anchor='w')
+gradient_var = StringVar(value="f64")
+OptionMenu(param_frame, gradient_var, *GRADIENT_BACKENDS, command=lambda v: push_params()).pack(fill='x')
+
+Label(param_frame, text="區塊分析方式").pack(anchor='w')
+blobs_var = StringVar(value="contours")
+OptionMenu(param_frame, blobs_var, *BLOB_BACKENDS, command=lambda v: push_params()).pack(fill='x')
+
 
 Label(param_frame, text="框框數量截圖基準").pack(anchor='w')
 entry_trigger_count = Entry(param_frame, width=5)
@@ -296,16 +572,111 @@ entry_capture_gap = Entry(param_frame, width=5)
 entry_capture_gap.insert(0, "10")  # 預設 10 秒
 entry_capture_gap.pack(fill='x')
 
+def update_trigger(event=None):
+    """觸發欄位修改時解析一次；輸入到一半不是數字時維持原本的設定"""
+    global trigger
+    try:
+        trigger = TriggerConfig(max(0, int(entry_trigger_count.get())), max(0, int(entry_trigger_time.get())),
+                                max(0, int(entry_capture_gap.get())))
+    except ValueError:
+        status_var.set("⚠️ 截圖基準 / 秒數 / 間隔請輸入整數（維持原設定）")
+
+for e in (entry_trigger_count, entry_trigger_time, entry_capture_gap):
+    e.bind("<KeyRelease>", update_trigger)
+
+def update_smoothing(*args):
+    """截圖判斷前的區塊數 / 皺褶% 平滑方式，所有站共用"""
+    if scheduler is not None:
+        for st in scheduler.stations:
+            st.smoother.configure(mode=smoothing_var.get())
+
+Label(param_frame, text="截圖判斷平滑（ema / median / off）").pack(anchor='w')
+smoothing_var = StringVar(value="ema")
+OptionMenu(param_frame, smoothing_var, *Smoother.MODES, command=update_smoothing).pack(fill='x')
+
+def update_evidence_format(*args):
+    try:
+        quality = max(0, min(int(entry_evidence_quality.get()), 100))
+    except:
+        quality = 90
+    # png 的壓縮等級 0~9，由品質換算：品質越高壓縮越輕、存檔越快
+    evidence_writer.configure(fmt=evidence_format_var.get(), quality=quality,
+                              png_compression=max(0, min(9, (100 - quality) // 10)))
+
+Label(param_frame, text="截圖格式 / 品質（0~100）").pack(anchor='w')
+evidence_frame = Frame(param_frame)
+evidence_frame.pack(fill='x')
+evidence_format_var = StringVar(value="jpg")
+OptionMenu(evidence_frame, evidence_format_var, *EVIDENCE_FORMATS, command=update_evidence_format).pack(side='left')
+entry_evidence_quality = Entry(evidence_frame, width=5)
+entry_evidence_quality.insert(0, "90")
+entry_evidence_quality.pack(side='left', padx=(5, 0))
+entry_evidence_quality.bind("<KeyRelease>", update_evidence_format)
+
 def update_roi():
-    global roi_w, roi_h, roi_x, roi_y
+    r = rois[active_roi]
     try:
-        roi_w = max(10, min(int(entry_w.get()), 320))
-        roi_h = max(10, min(int(entry_h.get()), 240))
-        roi_x = min(roi_x, 320 - roi_w)
-        roi_y = min(roi_y, 240 - roi_h)
+        r["w"] = max(10, min(int(entry_w.get()), PREVIEW_W))
+        r["h"] = max(10, min(int(entry_h.get()), PREVIEW_H))
+        r["x"] = min(r["x"], PREVIEW_W - r["w"])
+        r["y"] = min(r["y"], PREVIEW_H - r["h"])
+        push_params()
     except:
         pass
 
+def select_roi(index):
+    """切換參數區正在編輯的 ROI，並把它的參數載入 widget"""
+    global active_roi, active_roi_name
+    active_roi = index
+    r = rois[index]
+    active_roi_name = r["name"]
+    roi_var.set(r["name"])
+    scale_edge.set(r["edge"])
+    scale_ksize.set(r["ksize"])
+    entry_area.delete(0, END)
+    entry_area.insert(0, str(r["min_area"]))
+    entry_w.delete(0, END)
+    entry_h.delete(0, END)
+    entry_w.insert(0, str(r["w"]))
+    entry_h.insert(0, str(r["h"]))
+    push_params()
+
+def refresh_roi_menu():
+    menu = roi_menu["menu"]
+    menu.delete(0, END)
+    for i, r in enumerate(rois):
+        menu.add_command(label=r["name"], command=lambda i=i: select_roi(i))
+
+def add_roi():
+    names = {r["name"] for r in rois}
+    n = len(rois) + 1
+    while f"ROI{n}" in names:
+        n += 1
+    base = rois[active_roi]
+    new = dict(base, name=f"ROI{n}")
+    new["x"] = min(base["x"] + 20, PREVIEW_W - new["w"])
+    new["y"] = min(base["y"] + 20, PREVIEW_H - new["h"])
+    rois.append(new)
+    refresh_roi_menu()
+    select_roi(len(rois) - 1)
+
+def remove_roi():
+    if len(rois) <= 1:
+        status_var.set("⚠️ 至少需要保留一個 ROI")
+        return
+    rois.pop(active_roi)
+    refresh_roi_menu()
+    select_roi(min(active_roi, len(rois) - 1))
+
+Label(param_frame, text="📐 ROI 清單（可拖曳；參數區編輯的是選取的 ROI）").pack(anchor='w')
+roi_select_frame = Frame(param_frame)
+roi_select_frame.pack(fill='x', pady=(0, 5))
+roi_var = StringVar(value=rois[0]["name"])
+roi_menu = OptionMenu(roi_select_frame, roi_var, rois[0]["name"])
+roi_menu.pack(side='left', fill='x', expand=True)
+Button(roi_select_frame, text="＋ 新增", command=add_roi).pack(side='left', padx=(5, 0))
+Button(roi_select_frame, text="－ 刪除", command=remove_roi).pack(side='left', padx=(5, 0))
+
 Label(param_frame, text="⚙ 識別框 寬度 / 高度").pack(anchor='w')
 
 roi_frame = Frame(param_frame)
@@ -320,10 +691,83 @@ entry_h.pack(side='left', padx=(0, 5))
 
 Button(roi_frame, text="更新 識別框 大小", command=update_roi).pack(side='left', padx=(5, 0))
 
+full_res_var = BooleanVar(value=False)
+Checkbutton(param_frame, text="全解析度分析（只裁切 ROI，不縮小整張）", variable=full_res_var,
+            command=lambda: push_params()).pack(anchor='w')
+
+Label(param_frame, text="畫面不變就略過分析（灰階差門檻，0 = 每張都分析）").pack(anchor='w')
+entry_skip_diff = Entry(param_frame, width=5)
+entry_skip_diff.insert(0, "0")
+entry_skip_diff.pack(fill='x')
+entry_skip_diff.bind("<KeyRelease>", lambda e: push_params())
+
+Label(param_frame, text="二值化門檻（fixed 用邊緣強度 / otsu、percentile 自動）").pack(anchor='w')
+threshold_frame = Frame(param_frame)
+threshold_frame.pack(fill='x')
+threshold_mode_var = StringVar(value="fixed")
+OptionMenu(threshold_frame, threshold_mode_var, *THRESHOLD_MODES, command=lambda v: push_params()).pack(side='left')
+Label(threshold_frame, text="百分位").pack(side='left', padx=(5, 0))
+entry_percentile = Entry(threshold_frame, width=5)
+entry_percentile.insert(0, "99")
+entry_percentile.pack(side='left')
+entry_percentile.bind("<KeyRelease>", lambda e: push_params())
+Label(threshold_frame, text="分格").pack(side='left', padx=(5, 0))
+entry_tiles = Entry(threshold_frame, width=3)
+entry_tiles.insert(0, "0")
+entry_tiles.pack(side='left')
+entry_tiles.bind("<KeyRelease>", lambda e: push_params())
+
+Label(param_frame, text="皺褶密度熱度圖（ROI 分 欄×列 格，0 欄 = 不分格；半衰期秒）").pack(anchor='w')
+density_frame = Frame(param_frame)
+density_frame.pack(fill='x')
+entry_density_cols = Entry(density_frame, width=3)
+entry_density_cols.insert(0, "0")
+entry_density_cols.pack(side='left')
+Label(density_frame, text="×").pack(side='left')
+entry_density_rows = Entry(density_frame, width=3)
+entry_density_rows.insert(0, "1")
+entry_density_rows.pack(side='left')
+Label(density_frame, text="半衰期").pack(side='left', padx=(5, 0))
+entry_half_life = Entry(density_frame, width=5)
+entry_half_life.insert(0, "10")
+entry_half_life.pack(side='left')
+for e in (entry_density_cols, entry_density_rows, entry_half_life):
+    e.bind("<KeyRelease>", lambda e: push_params())
+refresh_roi_menu()
+
+
+
+
+
+
+# ===== 顯示設定 =====
+display_frame = LabelFrame(left_panel, text="🖥️ 顯示設定", padx=5, pady=5)
+display_frame.pack(pady=5, fill='x')
+panel_vars = {}
+
+def update_panels():
+    compositor.set_visible([name for name in PANELS if panel_vars[name].get()])
+    if not compositor.panels:
+        video_label.configure(image="")
+
+def update_display_fps(event=None):
+    global DISPLAY_FPS
+    try:
+        DISPLAY_FPS = max(1, min(int(entry_display_fps.get()), 60))
+    except:
+        pass
 
-
-
-
+panel_row = Frame(display_frame)
+panel_row.pack(fill='x')
+for name in PANELS:
+    panel_vars[name] = BooleanVar(value=True)
+    Checkbutton(panel_row, text=PANEL_TITLES[name], variable=panel_vars[name],
+                command=update_panels).pack(side='left')
+Label(display_frame, text="畫面更新頻率（fps，不影響分析速度）").pack(anchor='w')
+entry_display_fps = Entry(display_frame, width=5)
+entry_display_fps.insert(0, str(DISPLAY_FPS))
+entry_display_fps.pack(fill='x')
+entry_display_fps.bind("<KeyRelease>", update_display_fps)
 
 # ===== 功能按鈕區 =====
 action_frame = LabelFrame(left_panel, text="🚀 功能區", padx=5, pady=5)
@@ -339,8 +783,21 @@ def save_image():
             title="儲存擷取畫面"
         )
         if filename:
-            cv2.imwrite(filename, frame_to_save)
-            status_var.set(f"✅ 已儲存：{filename}")
+            done = []  # 寫檔執行緒放入 (檔名, 錯誤)，Tk 執行緒輪詢後更新狀態列
+            path = evidence_writer.submit(filename, frame_to_save, on_done=lambda p, e: done.append((p, e)))
+            if path is None:
+                status_var.set("⚠️ 儲存失敗：截圖佇列已滿或寫檔程式已關閉")
+                return
+            status_var.set(f"💾 儲存中：{path}")
+
+            def check_saved():
+                if not done:
+                    root.after(100, check_saved)
+                elif done[0][1] is not None:
+                    status_var.set(f"⚠️ 儲存失敗：{done[0][1]}")
+                else:
+                    status_var.set(f"✅ 已儲存：{path}")
+            check_saved()
         else:
             status_var.set("❌ 取消儲存")
 
@@ -364,83 +821,283 @@ entry_sub_cam = Entry(camera_frame, width=5)
 entry_sub_cam.insert(0, "2")  # 預設值
 entry_sub_cam.pack(fill='x')
 
+def read_camera_indices():
+    """(主 index, 副 index)；副攝影機欄位空白表示沒有夾具攝影機"""
+    sub = entry_sub_cam.get().strip()
+    return int(entry_main_cam.get()), int(sub) if sub else None
+
 def update_cameras():
-    global cap, cap2
+    global opened_cameras
     try:
-        new_main = int(entry_main_cam.get())
-        new_sub = int(entry_sub_cam.get())
-        cap.release()
-        cap2.release()
-        cap = cv2.VideoCapture(new_main)
-        cap2 = cv2.VideoCapture(new_sub)
-        status_var.set(f"🎥 攝影機已切換為 {new_main} 與 {new_sub}")
+        new_main, new_sub = read_camera_indices()
+        if station is None:  # 開程式時沒開成功：重新在背景開啟，開好後 wait_station 開始分析
+            opened_cameras = (new_main, new_sub, camera_settings["main"], camera_settings["jig"])
+            start_open_cameras(new_main, new_sub)
+            status_var.set(f"🎥 重新開啟攝影機 {new_main} 與 {new_sub if new_sub is not None else '（無）'}")
+            return
+        # 舊的擷取執行緒自行在背景釋放攝影機，不卡 UI
+        station.set_sources(new_main, new_sub, camera_settings["main"], camera_settings["jig"])
+        opened_cameras = (new_main, new_sub, camera_settings["main"], camera_settings["jig"])
+        status_var.set(f"🎥 攝影機已切換為 {new_main} 與 {new_sub if new_sub is not None else '（無）'}")
     except Exception as e:
         status_var.set(f"⚠️ 攝影機切換失敗: {e}")
 
 Button(camera_frame, text="更新攝影機", command=update_cameras).pack(fill='x', pady=3)
 
-def save_config():
-    filename = filedialog.asksaveasfilename(
-        defaultextension=".txt",
-        filetypes=[("Text files", "*.txt")],
-        initialfile="config.txt",
-        title="儲存參數設定為..."
-    )
-    if filename:
-        config = {
-            "edge_threshold": scale_edge.get(),
-            "min_area": entry_area.get(),
-            "sobel_ksize": scale_ksize.get(),
-            "roi_width": entry_w.get(),
-            "roi_height": entry_h.get()
-        }
+def search_cameras():
+    """背景搜尋攝影機（含常見解析度），使用中的攝影機不去搶，保留原本資訊"""
+    in_use = {g.source for st in (scheduler.stations if scheduler is not None else ())
+              for g in (st.grabber, st.jig) if g is not None}
+    camera_info_var.set("🔍 搜尋中...")
+
+    def job():
+        discovery.discover_cameras(CAMERA_MAX_INDEX, timeout=CAMERA_PROBE_TIMEOUT, probe_modes=True, skip=in_use)
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                for k, v in config.items():
-                    f.write(f"{k}={v}\n")
-            status_var.set(f"✅ 參數已儲存：{filename}")
-        except Exception as e:
-            status_var.set("⚠️ 儲存失敗")
-            print("儲存失敗：", e)
+            discovery.save_cache(CAMERA_CACHE)
+        except OSError:
+            pass
+
+    t = threading.Thread(target=job, name="camera-search", daemon=True)
+    t.start()
+
+    def poll():
+        if t.is_alive():
+            root.after(200, poll)
+        else:
+            camera_info_var.set(discovery.describe(discovery.cached_cameras()))
+    poll()
+
+Button(camera_frame, text="🔍 搜尋攝影機", command=search_cameras).pack(fill='x', pady=3)
+
+CAMERA_FIELDS = [("width", "寬"), ("height", "高"), ("fps", "FPS"), ("fourcc", "FOURCC"),
+                 ("buffersize", "緩衝張數"), ("exposure", "曝光"), ("gain", "增益")]
+
+def show_camera_settings():
+    """主 / 副攝影機的解析度、FPS、格式等設定；空白表示沿用驅動預設。下方顯示裝置實際接受的值"""
+    win = Toplevel(root)
+    win.title("⚙ 攝影機設定")
+    entries = {}
+    for col, (key, title) in enumerate((("main", "主攝影機"), ("jig", "副攝影機")), start=1):
+        Label(win, text=title).grid(row=0, column=col)
+        current = camera_settings[key].as_config(key)
+        for row, (field, label) in enumerate(CAMERA_FIELDS, start=1):
+            if col == 1:
+                Label(win, text=label).grid(row=row, column=0, sticky='w')
+            e = Entry(win, width=8)
+            value = current[f"{key}_{field}"]
+            e.insert(0, "" if value in (0, "") else str(value))
+            e.grid(row=row, column=col, padx=2)
+            entries[f"{key}_{field}"] = e
+    actual_var = StringVar()
+    Label(win, textvariable=actual_var, justify='left', fg='gray').grid(row=len(CAMERA_FIELDS) + 2, column=0,
+                                                                         columnspan=3, sticky='w')
+
+    def apply():
+        values = {k: e.get() for k, e in entries.items()}
+        try:
+            for key in camera_settings:
+                camera_settings[key] = CameraSettings.from_config(values, key)
+        except ValueError:
+            status_var.set("⚠️ 攝影機設定請輸入數字")
+            return
+        update_cameras()
+
+    def refresh():
+        if not win.winfo_exists():
+            return
+        lines = []
+        for title, g in ((("主", station.grabber), ("副", station.jig)) if station is not None else ()):
+            if g is not None and g.actual:
+                a = g.actual
+                lines.append(f"{title}：{a['width']}x{a['height']} {a['fourcc']} 設定 {a['fps']:.0f}fps "
+                             f"實際 {g.fps:.1f}fps 緩衝 {a['buffersize']} 曝光 {a['exposure']:g} 增益 {a['gain']:g}")
+        actual_var.set("\n".join(lines) or "（攝影機尚未開啟）")
+        win.after(500, refresh)
+
+    Button(win, text="套用（重新開啟攝影機）", command=apply).grid(row=len(CAMERA_FIELDS) + 1, column=0,
+                                                            columnspan=3, sticky='we', pady=3)
+    refresh()
+
+Button(camera_frame, text="⚙ 攝影機設定", command=show_camera_settings).pack(fill='x', pady=3)
+camera_info_var = StringVar(value="")
+Label(camera_frame, textvariable=camera_info_var, justify='left', fg='gray').pack(anchor='w')
+
+# ========= 型號參數組 ==========
+def set_entry(entry, value):
+    entry.delete(0, END)
+    entry.insert(0, str(value))
+
+def current_profile():
+    """目前畫面上的設定整理成 Profile（檢測參數取已推給引擎的值）"""
+    base = detector.base_params
+    try:
+        main_cam, jig_cam = read_camera_indices()
+    except ValueError:
+        raise ConfigError(["攝影機 index 請輸入整數"]) from None
+    return Profile(gradient=base.gradient, blobs=base.blobs, full_res=base.full_res, skip_diff=base.skip_diff,
+                   smoothing=smoothing_var.get(), threshold_mode=base.threshold_mode,
+                   auto_percentile=base.auto_percentile, adaptive_tiles=base.adaptive_tiles,
+                   density_cols=base.density_cols, density_rows=base.density_rows,
+                   density_half_life=base.density_half_life, trigger=trigger, main_cam=main_cam, jig_cam=jig_cam,
+                   main_settings=camera_settings["main"], jig_settings=camera_settings["jig"],
+                   evidence_format=evidence_writer.fmt, evidence_quality=evidence_writer.quality,
+                   rois=tuple(roi_specs()))
+
+def apply_profile(profile):
+    """參數組套到 widget 並整包推給引擎；攝影機 index 或設定與目前開啟的不同才重開攝影機"""
+    global trigger, applied_profile
+    applied_profile = profile
+    gradient_var.set(profile.gradient)
+    blobs_var.set(profile.blobs)
+    full_res_var.set(profile.full_res)
+    set_entry(entry_skip_diff, f"{profile.skip_diff:g}")
+    threshold_mode_var.set(profile.threshold_mode)
+    set_entry(entry_percentile, f"{profile.auto_percentile:g}")
+    set_entry(entry_tiles, profile.adaptive_tiles)
+    set_entry(entry_density_cols, profile.density_cols)
+    set_entry(entry_density_rows, profile.density_rows)
+    set_entry(entry_half_life, f"{profile.density_half_life:g}")
+    smoothing_var.set(profile.smoothing)
+    update_smoothing()
+    trigger = profile.trigger
+    set_entry(entry_trigger_count, trigger.count)
+    set_entry(entry_trigger_time, trigger.time)
+    set_entry(entry_capture_gap, trigger.gap)
+    evidence_format_var.set(profile.evidence_format)
+    set_entry(entry_evidence_quality, profile.evidence_quality)
+    update_evidence_format()
+    rois[:] = [dict(zip(("x", "y", "w", "h"), roi_to_pixels(r.roi, (PREVIEW_W, PREVIEW_H))), name=r.name,
+                    edge=r.edge_threshold, min_area=r.min_area, ksize=r.sobel_ksize) for r in profile.rois]
+    refresh_roi_menu()
+    select_roi(0)  # 載入 ROI 參數到 widget 並 push_params
+    set_entry(entry_main_cam, profile.main_cam)
+    set_entry(entry_sub_cam, "" if profile.jig_cam is None else profile.jig_cam)
+    camera_settings.update(main=profile.main_settings, jig=profile.jig_settings)
+    cams = (profile.main_cam, profile.jig_cam, profile.main_settings, profile.jig_settings)
+    if station is not None and cams != opened_cameras:
+        update_cameras()
+
+def refresh_profile_menu():
+    menu = profile_menu["menu"]
+    menu.delete(0, END)
+    for name in profile_set.profiles:
+        menu.add_command(label=name, command=lambda n=name: switch_profile(n))
+    profile_var.set(profile_set.active)
+
+def write_profiles(new_set):
+    """
+    存檔並更新選單；自己寫的檔案不觸發重新載入。
+    參數檔讀取失敗過時先備份再覆寫（不然檔案裡其他型號會被預設值蓋掉），回傳備份路徑或 None
+    """
+    global profile_set, config_invalid
+    backup = None
+    if config_invalid and os.path.exists(CONFIG_FILE):
+        ProfileSet.from_dict(new_set.to_dict())  # 先驗證：存不進去就不必備份
+        backup = config.backup(CONFIG_FILE)
+    profile_set = config.save(CONFIG_FILE, new_set)
+    config_invalid = False
+    if config_watcher is not None:
+        config_watcher.acknowledge()
+    refresh_profile_menu()
+    return backup
+
+def backup_note(backup):
+    return f"（原參數檔讀取失敗，已備份為 {os.path.basename(backup)}）" if backup else ""
+
+def load_profiles():
+    """開程式時套用使用中的型號（檔案在開攝影機前已由 read_profiles 讀好）；沒有設定檔時沿用畫面預設值"""
+    refresh_profile_menu()
+    if profile_error:
+        status_var.set(profile_error)
+    elif os.path.exists(CONFIG_FILE):
+        apply_profile(profile_set.current)
+
+def switch_profile(name):
+    try:
+        backup = write_profiles(profile_set.activate(name))
+    except (OSError, ConfigError) as e:
+        status_var.set(f"⚠️ 切換型號失敗：{e}")
+        return
+    apply_profile(profile_set.current)
+    status_var.set(f"✅ 已切換型號：{name}{backup_note(backup)}")
+
+def save_config(name=None):
+    """目前的設定存進使用中的型號（或 name 指定的新型號）"""
+    global applied_profile
+    name = name or profile_set.active
+    try:
+        backup = write_profiles(profile_set.with_profile(name, current_profile()))
+    except (OSError, ConfigError) as e:
+        status_var.set(f"⚠️ 儲存失敗：{e}")
+        return
+    applied_profile = profile_set.current
+    status_var.set(f"✅ 參數已儲存至型號「{name}」：{os.path.basename(CONFIG_FILE)}{backup_note(backup)}")
+
+def save_config_as():
+    name = simpledialog.askstring("另存新型號", "型號名稱：", parent=root)
+    if name and name.strip():
+        save_config(name.strip())
     else:
         status_var.set("❌ 取消儲存")
 
 def load_config():
-    global roi_w, roi_h, roi_x, roi_y
+    """匯入參數檔：.json / .toml 的型號併入設定檔；舊版 .txt 套到目前的型號"""
     filename = filedialog.askopenfilename(
-        filetypes=[("Text files", "*.txt")],
-        title="選擇要載入的參數設定"
+        filetypes=[("參數檔", "*.json *.toml *.txt"), ("All Files", "*.*")],
+        title="選擇要匯入的參數設定"
     )
-    if filename:
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            config = dict(line.strip().split("=") for line in lines)
-            scale_edge.set(int(config["edge_threshold"]))
-            entry_area.delete(0, END)
-            entry_area.insert(0, config["min_area"])
-            scale_ksize.set(int(config["sobel_ksize"]))
-            entry_w.delete(0, END)
-            entry_h.delete(0, END)
-            entry_w.insert(0, config["roi_width"])
-            entry_h.insert(0, config["roi_height"])
-            update_roi()
-            status_var.set(f"✅ 已載入參數：{os.path.basename(filename)}")
-        except Exception as e:
-            status_var.set("⚠️ 載入失敗")
-            print("載入失敗：", e)
-    else:
+    if not filename:
         status_var.set("❌ 取消載入")
-
+        return
+    try:
+        if filename.lower().endswith(".txt"):
+            profile = current_profile().merge_legacy(config.load_legacy(filename), (PREVIEW_W, PREVIEW_H))
+            new_set = profile_set.with_profile(profile_set.active, profile)
+        else:
+            imported = config.load(filename)
+            new_set = profile_set
+            for name, profile in imported.profiles.items():
+                new_set = new_set.with_profile(name, profile, activate=False)
+            new_set = new_set.activate(imported.active)
+        backup = write_profiles(new_set)
+    except (OSError, ConfigError) as e:
+        status_var.set(f"⚠️ 載入失敗：{e}")
+        return
+    apply_profile(profile_set.current)
+    status_var.set(f"✅ 已載入參數：{os.path.basename(filename)}（型號「{profile_set.active}」）{backup_note(backup)}")
+
+def check_config():
+    """設定檔被外部修改：驗證通過且使用中的型號有變才套用，格式錯誤只提示、維持目前設定"""
+    global profile_set, config_invalid
+    item = config_watcher.take() if config_watcher is not None else None
+    if item is not None:
+        new_set, error = item
+        if error is not None:
+            config_invalid = True
+            status_var.set(f"⚠️ 參數檔有誤，未套用：{error}")
+        else:
+            config_invalid = False
+            profile_set = new_set
+            refresh_profile_menu()
+            if profile_set.current != applied_profile:
+                apply_profile(profile_set.current)
+                status_var.set(f"🔄 參數檔已更新，套用型號「{profile_set.active}」")
+    root.after(1000, check_config)
+
+Label(action_frame, text="型號（參數組）").pack(anchor='w')
+profile_var = StringVar(value=profile_set.active)
+profile_menu = OptionMenu(action_frame, profile_var, profile_set.active)
+profile_menu.pack(fill='x')
 Button(action_frame, text="💾 儲存參數", command=save_config).pack(fill='x', pady=2)
-Button(action_frame, text="📂 載入參數", command=load_config).pack(fill='x', pady=2)
+Button(action_frame, text="🆕 另存新型號", command=save_config_as).pack(fill='x', pady=2)
+Button(action_frame, text="📂 匯入參數檔", command=load_config).pack(fill='x', pady=2)
 
 def toggle_record():
-    global recording, record_log, display_log, log_file_path, screenshot_dir
+    global recording, log_file_path, screenshot_dir, log_writer
     if not recording:
         log_file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt")],
+            filetypes=[("Text files", "*.txt"), ("精簡二進位 LOG", "*.wrkl")],
             initialfile=f"wrinkle_{time.strftime('%Y%m%d_%H%M%S')}.txt",
             title="儲存 LOG 至..."
         )
@@ -452,24 +1109,41 @@ def toggle_record():
         screenshot_dir = os.path.join(get_base_dir(), "captures")
         os.makedirs(screenshot_dir, exist_ok=True)
 
-        # 初始化 LOG 檔案
-        with open(log_file_path, "w", encoding="utf-8") as f:
-            f.write("區塊數,皺褶%,時間\n")
-
-        record_log.clear()
-        display_log.clear()
+        # LOG 交給背景執行緒批次寫入，依大小與換班時間自動換檔
+        log_writer = LogWriter(log_file_path, flush_interval=LOG_FLUSH_INTERVAL,
+                               max_bytes=LOG_MAX_BYTES, shift_hours=LOG_SHIFT_HOURS, overwrite=True)
+        log_writer.start()
+        # 其他站各自一個 LOG 檔：檔名加上站名（已存在時不覆寫，改用 _001 ... 接著寫）
+        stem, ext = os.path.splitext(log_file_path)
+        for st in (scheduler.stations[1:] if scheduler is not None else ()):
+            station_logs[st.name] = LogWriter(f"{stem}_{st.name}{ext}", flush_interval=LOG_FLUSH_INTERVAL,
+                                              max_bytes=LOG_MAX_BYTES, shift_hours=LOG_SHIFT_HOURS)
+            station_logs[st.name].start()
+
+        history.clear()
         recording = True
         record_btn.config(text="■ 停止記錄")
         show_chart()
         status_var.set(f"📈 開始記錄中... 檔案：{os.path.basename(log_file_path)}")
     else:
         recording = False
+        if live_chart is not None and not live_chart.closed:
+            live_chart.stop()
+        if log_writer is not None:
+            log_writer.close()
+            log_writer = None
+        for writer in station_logs.values():
+            writer.close()
+        station_logs.clear()
         status_var.set("🛑 停止記錄")
         record_btn.config(text="▶ 開始記錄")
 
 # 替換原本的按鈕
 record_btn = Button(action_frame, text="▶ 開始記錄", command=toggle_record)
 record_btn.pack(fill='x')
+Button(action_frame, text="🏭 多站總覽", command=lambda: show_station_grid()).pack(fill='x', pady=2)
+Button(action_frame, text="🩺 診斷", command=lambda: show_diagnostics()).pack(fill='x', pady=2)
+Button(action_frame, text="🗂 事件查詢", command=lambda: show_events()).pack(fill='x', pady=2)
 
 #Label(action_frame, textvariable=status_var, fg="green").pack(pady=5),不用喔，會影響UI
 
@@ -477,40 +1151,40 @@ record_btn.pack(fill='x')
 
 # ========= 圖表 ==========
 def show_chart():
-    chart_win = Toplevel(root)
-    chart_win.title("📈 即時圖表")
-    fig = plt.Figure(figsize=(5, 2), dpi=100)
-    ax = fig.add_subplot(111)
-    canvas = FigureCanvasTkAgg(fig, chart_win)
-    canvas.get_tk_widget().pack(fill=BOTH, expand=True)
-
-    def update_chart():
-        if len(display_log) > 1:
-            ax.clear()
-            x_vals = list(range(1, len(display_log) + 1))  # 用 1, 2, 3... 表示第幾筆
-            ax.plot(x_vals, [v[0] for v in display_log], label="區塊數", color='blue')
-            ax.plot(x_vals, [v[1] for v in display_log], label="皺褶%", color='orange')
-            ax.set_xlabel("資料筆數")  # 如果你想加一個 X 軸標題
-            ax.legend()
-            canvas.draw()
-        chart_win.after(2000, update_chart)
-
-    update_chart()
+    """開啟（或叫回）即時圖表視窗並開始定時更新"""
+    global live_chart
+    if live_chart is None or live_chart.closed:
+        import matplotlib  # 第一次開圖表才載入，不佔開機時間
+        matplotlib.rcParams['font.family'] = 'Microsoft JhengHei'
+        live_chart = LiveChart(root, history, interval_ms=1000)
+    else:
+        live_chart.win.deiconify()
+        live_chart.win.lift()
+        live_chart.invalidate()
+    live_chart.start()
 
 # ========= ROI 拖曳 ==========
 def start_drag(event):
     global drag_start
-    if roi_x <= event.x <= roi_x + roi_w and roi_y <= event.y <= roi_y + roi_h:
-        drag_start = (event.x, event.y)
+    # 由後往前找，重疊時抓到畫在最上面的那一個
+    for i in reversed(range(len(rois))):
+        r = rois[i]
+        if r["x"] <= event.x <= r["x"] + r["w"] and r["y"] <= event.y <= r["y"] + r["h"]:
+            if i != active_roi:
+                select_roi(i)
+            drag_start = (event.x, event.y)
+            return
 
 def drag_roi(event):
-    global roi_x, roi_y, drag_start
+    global drag_start
     if drag_start:
+        r = rois[active_roi]
         dx = event.x - drag_start[0]
         dy = event.y - drag_start[1]
-        roi_x = max(0, min(roi_x + dx, 320 - roi_w))
-        roi_y = max(0, min(roi_y + dy, 240 - roi_h))
+        r["x"] = max(0, min(r["x"] + dx, PREVIEW_W - r["w"]))
+        r["y"] = max(0, min(r["y"] + dy, PREVIEW_H - r["h"]))
         drag_start = (event.x, event.y)
+        push_params()
 
 def end_drag(event):
     global drag_start
@@ -524,121 +1198,416 @@ video_label.bind("<ButtonRelease-1>", end_drag)
 #cap = cv2.VideoCapture(1)
 #cap2 = cv2.VideoCapture(2)
 
-def update_frame():
-    global frame_to_save
-
-
-    
-    ret, frame = cap.read()
-    if not ret:
-        root.after(200, update_frame)
-        return
-    
-
-    frame = cv2.resize(frame, (320, 240))
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    roi_gray = gray[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w]
-
-    ksize = scale_ksize.get()
-    sobelx = cv2.Sobel(roi_gray, cv2.CV_64F, 1, 0, ksize=ksize)
-    sobely = cv2.Sobel(roi_gray, cv2.CV_64F, 0, 1, ksize=ksize)
-    sobel = cv2.magnitude(sobelx, sobely)
-    sobel = np.uint8(np.clip(sobel, 0, 255))
-    _, sobel_thresh = cv2.threshold(sobel, scale_edge.get(), 255, cv2.THRESH_BINARY)
-
-    contours, _ = cv2.findContours(sobel_thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    defect_count = 0
-    annotated = frame.copy()
+last_result_seq = 0  # Tk 執行緒最後顯示的分析結果序號
 
+def push_params():
+    """widget 或 ROI 變動時才呼叫：讀一次 widget 寫回選取的 ROI，整包替換檢測參數"""
+    r = rois[active_roi]
     try:
-        min_area_val = max(0, int(entry_area.get()))
+        r["min_area"] = max(0, int(entry_area.get()))
     except:
-        min_area_val = 0  # 若輸入錯誤，預設為 0
-
-    for cnt in contours:
-        if cv2.contourArea(cnt) > min_area_val:
-            x, y, w, h = cv2.boundingRect(cnt)
-            cv2.rectangle(annotated, (roi_x + x, roi_y + y), (roi_x + x + w, roi_y + y + h), (0, 0, 255), 2)
-            defect_count += 1
+        r["min_area"] = 0  # 若輸入錯誤，預設為 0
+    r["edge"] = scale_edge.get()
+    r["ksize"] = scale_ksize.get()
+    try:
+        skip_diff = max(0.0, min(float(entry_skip_diff.get()), 255.0))
+    except:
+        skip_diff = 0.0
+    base = detector.base_params
+    try:
+        percentile = max(50.0, min(float(entry_percentile.get()), 100.0))
+    except ValueError:
+        percentile = base.auto_percentile  # 輸入到一半：維持原值
+    try:
+        tiles = max(0, min(int(entry_tiles.get()), 16))
+    except ValueError:
+        tiles = base.adaptive_tiles
+    try:
+        density = (max(0, min(int(entry_density_cols.get()), 64)), max(1, min(int(entry_density_rows.get()), 64)),
+                   max(0.0, min(float(entry_half_life.get()), 3600.0)))
+    except ValueError:
+        density = (base.density_cols, base.density_rows, base.density_half_life)
+    detector.set_rois(roi_specs(), base.updated(
+        gradient=gradient_var.get(), blobs=blobs_var.get(), full_res=full_res_var.get(), skip_diff=skip_diff,
+        threshold_mode=threshold_mode_var.get(), auto_percentile=percentile, adaptive_tiles=tiles,
+        density_cols=density[0], density_rows=density[1], density_half_life=density[2]))
+
+# ========= 診斷 ==========
+def collect_metrics():
+    """匯出用的指標（在匯出執行緒呼叫，只讀屬性）"""
+    for st in (scheduler.stations if scheduler is not None else ()):
+        yield "analysis_fps", {"station": st.name}, st.fps
+        yield "analyzed_frames_total", {"station": st.name}, st.analyzed
+        yield from st.latency.samples("frame_latency_seconds", {"station": st.name})
+        for role, g in (("main", st.grabber), ("jig", st.jig)):
+            if g is not None:
+                labels = {"station": st.name, "camera": role}
+                yield "capture_fps", labels, g.fps
+                yield "captured_frames_total", labels, g.ring.seq
+                yield "missed_frames_total", labels, g.missed
+                if role == "main":  # 夾具攝影機只在截圖時 peek，沒有「未分析跳過」可言
+                    yield "dropped_frames_total", labels, g.ring.dropped
+                yield "read_failures_total", labels, g.read_failures
+        timer = st.detector.timer
+        if timer is not None:
+            for stage, hist in list(timer.stages.items()):
+                yield from hist.samples("stage_latency_seconds", {"station": st.name, "stage": stage})
+    yield "display_fps", {}, display_rate.rate()
+    writer = log_writer
+    yield "log_queue_depth", {}, writer.queue_depth if writer is not None else 0
+    yield "log_dropped_total", {}, writer.dropped if writer is not None else 0
+    yield "screenshot_queue_depth", {}, evidence_writer.queue_depth
+    yield "screenshot_dropped_total", {}, evidence_writer.dropped
+    ev = evidence_writer.metrics()
+    yield "screenshot_written_total", {}, ev["written"]
+    yield "screenshot_failed_total", {}, ev["failed"]
+    yield "screenshot_encode_seconds_avg", {}, ev["encode_ms_avg"] / 1000
+    yield "screenshot_encode_seconds_max", {}, ev["encode_ms_max"] / 1000
+    yield "screenshot_write_seconds_avg", {}, ev["write_ms_avg"] / 1000
+    yield "clip_buffer_bytes", {}, clip_recorder.buffered_bytes()
+    yield "event_queue_depth", {}, event_store.queue_depth
+    yield "events_written_total", {}, event_store.written
+    yield "events_dropped_total", {}, event_store.dropped
+    for gen, n in enumerate(gc_monitor.collections):
+        yield "gc_collections_total", {"generation": gen}, n
+    yield from gc_monitor.pauses.samples("gc_pause_seconds")
+    for key, value in process_stats().items():
+        yield f"process_{key}", {}, value
+
+metrics_registry.register(collect_metrics)
+
+def diagnostics_text():
+    lines = []
+    for st in (scheduler.stations if scheduler is not None else ()):
+        lines.append(f"[{st.name}] 分析 {st.fps:.1f} fps  擷取→結果 p50 {st.latency.quantile(0.5):.0f} ms"
+                     f" / p99 {st.latency.quantile(0.99):.0f} ms")
+        for title, g in (("主攝影機", st.grabber), ("副攝影機", st.jig)):
+            if g is not None:
+                skipped = f"  未分析跳過 {g.ring.dropped}" if g is st.grabber else ""
+                lines.append(f"  {title} {g.fps:.1f} fps  擷取漏幀 {g.missed}{skipped}  讀取失敗 {g.read_failures}")
+        timer = st.detector.timer
+        if timer is not None and timer.stages:
+            lines.append("  各階段 p50/p99 (ms)：" + "  ".join(
+                f"{stage} {h.quantile(0.5):g}/{h.quantile(0.99):g}" for stage, h in list(timer.stages.items())))
+        if st.last_error is not None:
+            lines.append(f"  ⚠️ 分析錯誤：{type(st.last_error).__name__}: {st.last_error}")
+    lines.append(f"顯示 {display_rate.rate():.1f} fps")
+    writer = log_writer
+    ev = evidence_writer.metrics()
+    lines.append(f"LOG 佇列 {writer.queue_depth if writer else 0}（丟棄 {writer.dropped if writer else 0}）  "
+                 f"截圖佇列 {evidence_writer.queue_depth}（丟棄 {evidence_writer.dropped}，"
+                 f"編碼 {ev['encode_ms_avg']:.0f} ms / 寫檔 {ev['write_ms_avg']:.0f} ms）  "
+                 f"片段緩衝 {clip_recorder.buffered_bytes() / 1024 / 1024:.1f} MB")
+    proc = process_stats()
+    if proc:
+        lines.append(f"CPU {proc['cpu_percent']:.0f}%  RSS {proc['rss_mb']:.0f} MB  執行緒 {proc['threads']}")
+    gens = "/".join(str(n) for n in gc_monitor.collections)
+    lines.append(f"GC 次數（0/1/2 代）{gens}  暫停 p99 {gc_monitor.pauses.quantile(0.99):g} ms"
+                 f"  最長 {gc_monitor.pauses.max_ms:.1f} ms")
+    if metrics_exporter is not None:
+        http = f"http://127.0.0.1:{METRICS_PORT}/metrics、" if METRICS_PORT else ""
+        lines.append(f"匯出：{http}{os.path.basename(METRICS_FILE)}")
+        if metrics_exporter.last_error is not None:
+            lines.append(f"⚠️ 匯出錯誤：{metrics_exporter.last_error}")
+    if STREAM_PORT:
+        lines.append(f"遠端觀看 http://{STREAM_HOST}:{STREAM_PORT}/  畫面 {stream_server.mjpeg_clients} 人、"
+                     f"數值 {stream_server.sse_clients} 人  編碼 {stream_server.frames_encoded} 張  "
+                     f"慢連線略過 {stream_server.frames_dropped} 張"
+                     + (f"  ⚠️ {stream_server.last_error}" if stream_server.last_error is not None else ""))
+    return "\n".join(lines)
+
+def show_diagnostics():
+    """每秒更新的診斷視窗：各站 fps、延遲、丟幀、佇列、CPU / 記憶體、GC"""
+    win = Toplevel(root)
+    win.title("🩺 診斷")
+    txt = Text(win, width=90, height=18, wrap=WORD)
+    txt.pack(fill=BOTH, expand=True)
+
+    def refresh():
+        if not win.winfo_exists():
+            return
+        txt.delete("1.0", END)
+        txt.insert(END, diagnostics_text())
+        win.after(1000, refresh)
+    refresh()
+
+# ========= 事件查詢 ==========
+def show_events():
+    """依站別、最近天數、區塊數查詢截圖事件；查詢在背景執行緒，雙擊開啟截圖"""
+    win = Toplevel(root)
+    win.title("🗂 事件查詢")
+    bar = Frame(win)
+    bar.pack(fill='x')
+    filters = {}
+    for key, label, default in (("station", "站別（空白 = 全部）", ""), ("days", "最近天數", "7"),
+                                ("min_count", "區塊數 ≥", "")):
+        Label(bar, text=label).pack(side='left', padx=(5, 0))
+        e = Entry(bar, width=6)
+        e.insert(0, default)
+        e.pack(side='left')
+        filters[key] = e
+    listbox = Listbox(win, width=110, height=20)
+    listbox.pack(fill=BOTH, expand=True)
+    info_var = StringVar()
+    Label(win, textvariable=info_var, anchor='w').pack(fill='x')
+    found = []
+
+    def run_query():
+        try:
+            days = float(filters["days"].get() or 0)
+            min_count = int(filters["min_count"].get()) if filters["min_count"].get().strip() else None
+        except ValueError:
+            info_var.set("⚠️ 天數與區塊數請輸入數字")
+            return
+        station_name = filters["station"].get().strip() or None
+        start = time.time() - days * 86400 if days > 0 else None
+        box = {}
+
+        def job():
+            try:
+                box["rows"] = event_store.query(start=start, station=station_name, min_count=min_count, limit=500)
+            except Exception as e:
+                box["error"] = e
+
+        t = threading.Thread(target=job, name="event-query", daemon=True)
+        t.start()
+        info_var.set("🔍 查詢中...")
+
+        def poll():
+            if t.is_alive():
+                win.after(50, poll)
+                return
+            if not win.winfo_exists():
+                return
+            if "error" in box:
+                info_var.set(f"⚠️ 查詢失敗：{box['error']}")
+                return
+            found[:] = box["rows"]
+            listbox.delete(0, END)
+            for e in found:
+                listbox.insert(END, f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e['ts']))}  "
+                                    f"{e['station']:<6} 區塊 {e['defect_count']:>4}  皺褶 {e['wrinkle']:6.2f}%  "
+                                    f"{e['hit_rois'] or '-'}  {os.path.basename(e['image_path'] or '（無截圖）')}")
+            info_var.set(f"共 {len(found)} 筆" + ("（只列前 500 筆）" if len(found) >= 500 else ""))
+        poll()
+
+    def open_image(event):
+        sel = listbox.curselection()
+        path = found[sel[0]]["image_path"] if sel else None
+        if not path or not os.path.exists(path):
+            info_var.set("⚠️ 截圖檔不存在")
+        elif hasattr(os, "startfile"):
+            os.startfile(path)
+        else:
+            info_var.set(path)
+
+    Button(bar, text="查詢", command=run_query).pack(side='left', padx=5)
+    listbox.bind("<Double-Button-1>", open_image)
+    run_query()
+
+# ========= 多站總覽 ==========
+GRID_PANEL_SIZE = (240, 180)
+grid_win = None
+grid_label = None
+grid_compositor = None
+station_seq = {}     # 站名 -> 最後處理過的結果序號（主站以外）
+station_results = {} # 站名 -> 最新結果
+station_logs = {}    # 站名 -> LogWriter（記錄中且有其他站時）
+station_record_time = {}  # 站名 -> 上次寫 LOG 的時間（每秒一筆）
+
+def show_station_grid():
+    """所有站的縮圖總覽；站名與數值用 OpenCV 畫字，站名請用英數字"""
+    global grid_win, grid_label, grid_compositor
+    if grid_win is not None and grid_win.winfo_exists():
+        grid_win.deiconify()
+        grid_win.lift()
+        return
+    names = [st.name for st in scheduler.stations]
+    grid_win = Toplevel(root)
+    grid_win.title("🏭 多站總覽")
+    grid_label = Label(grid_win)
+    grid_label.pack()
+    grid_compositor = DisplayCompositor(GRID_PANEL_SIZE, names, columns=2 if len(names) <= 4 else 4)
+
+def render_grid():
+    if grid_win is None or not grid_win.winfo_exists():
+        return
+    sources = {name: r.annotated for name, r in station_results.items()}
+    grid_compositor.render(sources)
+    for st in scheduler.stations:
+        r = station_results.get(st.name)
+        if r is not None:
+            grid_compositor.put_text(st.name, f"{st.name} n={r.defect_count} w={r.wrinkle:.1f}% {st.fps:.0f}fps")
+        else:
+            grid_compositor.put_text(st.name, st.name)
+        if st.last_error is not None:
+            # 分析失敗時結果停在最後一張（或一直沒有），畫出錯誤才看得出來；OpenCV 只能畫英數字
+            text = " ".join(f"ERROR {type(st.last_error).__name__}: {st.last_error}".split())
+            text = text.encode("ascii", "replace").decode()
+            grid_compositor.put_text(st.name, text[:60], color=(255, 64, 64), line=1)
+    grid_compositor.show(grid_label)
+
+def poll_extra_stations(now, trig):
+    """主站以外的站：記錄 LOG、判斷截圖（設定與主站共用），結果留給總覽畫面"""
+    for st in scheduler.stations[1:]:
+        latest = st.latest(station_seq.get(st.name, 0))
+        if latest is None:
+            continue
+        station_seq[st.name], result = latest
+        station_results[st.name] = result
+        writer = station_logs.get(st.name)
+        if writer is not None and int(now) != int(station_record_time.get(st.name, 0)):
+            writer.write(now, result.defect_count, result.wrinkle,
+                         {name: (r.defect_count, r.wrinkle) for name, r in result.rois.items()},
+                         summarize(result.defects), result.heatmaps)
+            station_record_time[st.name] = now
+        smoothed = st.smoother.smooth(result)
+        hit_rois = [name for name, (count, _) in smoothed.items() if count >= trig.count]
+        jig = st.jig_frame()
+        if st.trigger.update(recording and bool(hit_rois), now, trig.time, trig.gap):
+            # 每次觸發都寫事件；沒有夾具攝影機時 image_path 為 None
+            path = None
+            if screenshot_dir and jig is not None:
+                stamp = time.strftime('%Y%m%d_%H%M%S')
+                path = evidence_writer.submit(os.path.join(screenshot_dir, f"jig_{st.name}_{stamp}"), jig[1])
+                status_var.set(f"📸 {st.name} 已截圖夾具畫面（{'、'.join(hit_rois)}）")
+            else:
+                status_var.set(f"⚠️ {st.name} 達到截圖條件（{'、'.join(hit_rois)}），沒有夾具畫面可截圖")
+            record_event(st, result, smoothed, hit_rois, now, trig, path)
+
+def render_display(result, frame2):
+    """依 DISPLAY_FPS 呼叫：更新資訊標籤並把畫面寫進常駐的拼圖緩衝區"""
+    # Sobel / 二值化畫面顯示選取的 ROI
+    shown = result.rois.get(active_roi_name) or next(iter(result.rois.values()))
+    if shown.params.threshold_mode == "fixed":
+        label_edge.config(text=f"邊緣強度：{shown.params.edge_threshold}")
+    else:
+        label_edge.config(text=f"邊緣強度：自動 {shown.threshold:.0f}（{shown.params.threshold_mode}）")
+    if len(result.rois) > 1:
+        per_roi = " ".join(f"{name}:{r.defect_count}" for name, r in result.rois.items())
+        label_defects.config(text=f"偵測區塊數：{result.defect_count}（{per_roi}），總長 {result.total_length:.0f}px")
+    else:
+        label_defects.config(text=f"偵測區塊數：{result.defect_count}，總長 {result.total_length:.0f}px")
+    label_wrinkle.config(text=f"皺褶程度：{result.wrinkle:.2f}%" + ("（畫面未變，沿用）" if result.reused else ""))
+
+    display_rate.tick()
+    if compositor.panels:
+        compositor.render({"annotated": result.annotated, "sobel": shown.sobel,
+                           "gray": result.gray, "thresh": shown.thresh})
+        compositor.show(video_label)
+    if frame2 is not None:
+        compositor2.render({"jig": frame2})
+        compositor2.show(video_label2)
+
+def publish_stream(result):
+    """遠端觀看：有人在看才複製拼圖畫面（編碼在串流伺服器的執行緒）；數值含所有站"""
+    if stream_server.wants_frame():
+        if compositor.panels:
+            stream_server.publish_frame(compositor.buffer.copy(), rgb=True)
+        elif result.annotated is not None:
+            stream_server.publish_frame(result.annotated)
+    stations = {}
+    for st in scheduler.stations:
+        r = station_results.get(st.name)
+        if r is not None:
+            stations[st.name] = {"defect_count": r.defect_count, "wrinkle": r.wrinkle, "fps": st.fps,
+                                 "rois": {name: [x.defect_count, x.wrinkle] for name, x in r.rois.items()}}
+    stream_server.publish_metrics({"time": result.ts, "recording": recording, "stations": stations})
 
-    white = cv2.countNonZero(sobel_thresh)
-    wrinkle = (white / (sobel_thresh.shape[0] * sobel_thresh.shape[1])) * 100
+def update_frame():
+    """Tk 執行緒：只負責顯示最新分析結果、記錄與截圖判斷"""
+    global last_result_seq
 
-    cv2.rectangle(annotated, (roi_x, roi_y), (roi_x + roi_w, roi_y + roi_h), (0, 255, 255), 2)
-    frame_to_save = annotated.copy()
+    now = time.time()
+    trig = trigger
+    if scheduler is not None:  # 攝影機還沒開好時只排下一次
+        poll_extra_stations(now, trig)
+        latest = station.latest(last_result_seq)
+        if latest is not None:
+            last_result_seq, result = latest
+            station_results[station.name] = result
+            handle_result(result, now, trig)
+    # 顯示只取最新結果，頻率與分析速度、攝影機速度無關
+    root.after(15, update_frame)
+
+def handle_result(result, now, trig):
+    """主站的新結果：記錄、顯示與截圖判斷"""
+    global frame_to_save, last_display_time
+
+    defect_count = result.defect_count
+    wrinkle = result.wrinkle
+    frame_to_save = result.annotated
+    clip_recorder.push("main", result.ts, result.annotated)
 
-    label_edge.config(text=f"邊緣強度：{scale_edge.get()}")
-    label_defects.config(text=f"偵測區塊數：{defect_count}")
-    label_wrinkle.config(text=f"皺褶程度：{wrinkle:.2f}%")
-    
     if recording:
         ts = time.time()
         if not hasattr(update_frame, "last_record_time") or int(ts) != int(update_frame.last_record_time):
-            record_log.append((defect_count, wrinkle, ts))
-            display_log.append((defect_count, wrinkle, ts))
-            if log_file_path:
-                 with open(log_file_path, "a", encoding="utf-8") as f:
-                   f.write(f"{defect_count},{wrinkle:.2f},{time.strftime('%H:%M:%S', time.localtime(ts))}\n")
+            history.append(ts, defect_count, wrinkle)
+            if log_writer is not None:
+                log_writer.write(ts, defect_count, wrinkle,
+                                 {name: (r.defect_count, r.wrinkle) for name, r in result.rois.items()},
+                                 summarize(result.defects), result.heatmaps)
             update_frame.last_record_time = ts
 
-    if len(display_log) > MAX_DISPLAY:
-        display_log[:] = display_log[-MAX_DISPLAY:]
-
-    sobel_bgr = cv2.cvtColor(cv2.resize(sobel, (320, 240)), cv2.COLOR_GRAY2BGR)
-    thresh_bgr = cv2.cvtColor(cv2.resize(sobel_thresh, (320, 240)), cv2.COLOR_GRAY2BGR)
-    gray_bgr = cv2.cvtColor(cv2.resize(gray, (320, 240)), cv2.COLOR_GRAY2BGR)
-    top = np.hstack((annotated, sobel_bgr))
-    bottom = np.hstack((gray_bgr, thresh_bgr))
-    combined = np.vstack((top, bottom))
-
-    img = Image.fromarray(cv2.cvtColor(combined, cv2.COLOR_BGR2RGB))
-    imgtk = ImageTk.PhotoImage(image=img)
-    video_label.imgtk = imgtk
-    video_label.configure(image=imgtk)
-
-
 # ========== 第二攝影機邏輯 ==========
-    ret2, frame2 = cap2.read()
-    if ret2:
-        frame2 = cv2.resize(frame2, (320, 240))
-        img2 = Image.fromarray(cv2.cvtColor(frame2, cv2.COLOR_BGR2RGB))
-        imgtk2 = ImageTk.PhotoImage(image=img2)
-        video_label2.imgtk = imgtk2
-        video_label2.configure(image=imgtk2)
-
-    # ====== 判斷是否達成異常條件 ======
-    try:
-        trigger_count = int(entry_trigger_count.get())
-        trigger_time = int(entry_trigger_time.get())
-    except:
-        trigger_count, trigger_time = 9999, 9999
-
-    try:
-        capture_gap = int(entry_capture_gap.get())
-    except:
-        capture_gap = 10  # 預設 10 秒
+    jig = station.jig_frame()
+    frame2 = jig[1] if jig is not None else None
+    if frame2 is not None:
+        clip_recorder.push("jig", jig[0], frame2)
 
-    now = time.time()
-
-    if recording and defect_count >= trigger_count:
-        if not hasattr(update_frame, "start_time") or update_frame.start_time is None:
-            update_frame.start_time = now
-            update_frame.last_capture_time = 0  # 初始化
-        elif now - update_frame.start_time >= trigger_time:
-            if not hasattr(update_frame, "last_capture_time"):
-                update_frame.last_capture_time = 0
-            if now - update_frame.last_capture_time >= capture_gap:
-                if screenshot_dir:
-                    filename = f"jig_{time.strftime('%Y%m%d_%H%M%S')}.png"
-                    path = os.path.join(screenshot_dir, filename)
-                    cv2.imwrite(path, frame2)
-                    status_var.set(f"📸 已截圖夾具畫面：{filename}")
-                    update_frame.last_capture_time = now
-    else:
-        update_frame.start_time = None
-    root.after(50, update_frame)
+    if now - last_display_time >= 1.0 / DISPLAY_FPS:
+        last_display_time = now
+        render_display(result, frame2)
+        render_grid()
+        publish_stream(result)
 
-root.protocol("WM_DELETE_WINDOW", lambda: (cap.release(), root.destroy()))
-
-periodic_memory_cleanup()
+    # ====== 判斷是否達成異常條件 ======
+    # 任何一個 ROI 的框框數（平滑後）達到基準就算觸發
+    smoothed = station.smoother.smooth(result)
+    hit_rois = [name for name, (count, _) in smoothed.items() if count >= trig.count]
+
+    if station.trigger.update(recording and bool(hit_rois), now, trig.time, trig.gap):
+        # 每次觸發都寫事件；沒有夾具攝影機時 image_path 為 None，片段仍照常錄主畫面
+        path = clip_stem = None
+        if screenshot_dir:
+            stamp = time.strftime('%Y%m%d_%H%M%S')
+            clip_stem = os.path.join(screenshot_dir, f"clip_{stamp}")
+            clip_recorder.trigger(clip_stem, now)
+            if frame2 is not None:
+                path = evidence_writer.submit(os.path.join(screenshot_dir, f"jig_{stamp}"), frame2)
+                filename = os.path.basename(path) if path else "（佇列已滿，略過）"
+                status_var.set(f"📸 已截圖夾具畫面：{filename}（{'、'.join(hit_rois)}）")
+        if frame2 is None:
+            status_var.set(f"⚠️ 達到截圖條件（{'、'.join(hit_rois)}），沒有夾具畫面可截圖")
+        record_event(station, result, smoothed, hit_rois, now, trig, path, clip_stem)
+
+def record_event(st, result, smoothed, hit_rois, now, trig, image_path, clip_stem=None):
+    """截圖觸發：這次達標區間、當時的數值、檢測參數（該站引擎實際使用的）與檔案路徑寫入事件資料庫"""
+    length, area, _, _ = summarize(result.defects)
+    det = st.detector
+    cfg = {"base": asdict(det.base_params), "rois": [asdict(r) for r in det.rois], "trigger": asdict(trig)}
+    event_store.record(Event(now, st.name, result.defect_count, result.wrinkle, window_start=st.trigger.start_time,
+                             hit_rois=tuple(hit_rois), rois=smoothed, total_length=length, max_area=area,
+                             profile=profile_set.active if st is station else None, config=cfg,
+                             image_path=image_path, clip_stem=clip_stem))
+
+def shutdown():
+    if config_watcher is not None:
+        config_watcher.stop()
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+    stream_server.stop()
+    if scheduler is not None:
+        scheduler.stop()
+    for writer in [log_writer] + list(station_logs.values()):
+        if writer is not None:
+            writer.close()
+    evidence_writer.close()
+    event_store.close()
+    clip_recorder.stop()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", shutdown)
+
+profiler.mark("建立 UI")
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,288 @@
+import bisect
+import gc
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+
+# ========= 分段計時 ==========
+class StageTimer:
+    """
+    記錄檢測流程每一段花的時間（秒）。start() 之後每個 mark(stage) 記下與上一個標記的間隔；
+    起點記在各執行緒自己身上，多個 ROI 在執行緒池裡同時跑也不會互相干擾。
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._local.t = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        dt = now - getattr(self._local, "t", now)
+        self._local.t = now
+        with self._lock:
+            self.samples[stage].append(dt)
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+
+# ========= 延遲直方圖 ==========
+# 毫秒，對數間距；超過最後一格的算在 +Inf
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class LatencyHistogram:
+    """固定桶數的延遲直方圖，長時間執行記憶體也不會增加（StageTimer 會保留每一筆，只適合離線量測）"""
+
+    def __init__(self, buckets_ms=HISTOGRAM_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # 可以 pickle（多行程模式由分析行程送回 UI 行程），鎖不跟著送
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        i = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q):
+        """以桶的上緣估計分位數（毫秒）"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        need = q * total
+        acc = 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= need:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def samples(self, name, labels=None):
+        """Prometheus histogram 格式的樣本：_bucket（累計）、_sum、_count，單位秒"""
+        labels = labels or {}
+        with self._lock:
+            counts, total, total_ms = list(self.counts), self.count, self.sum_ms
+        acc = 0
+        for le, c in zip(self.buckets_ms + (None,), counts):
+            acc += c
+            yield f"{name}_bucket", {**labels, "le": "+Inf" if le is None else f"{le / 1000:g}"}, acc
+        yield f"{name}_sum", labels, total_ms / 1000
+        yield f"{name}_count", labels, total
+
+
+class HistogramTimer:
+    """與 StageTimer 相同的 start() / mark(stage) 介面，但每段寫進 LatencyHistogram，可常駐在產線上"""
+
+    def __init__(self):
+        self.stages = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._local.t = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        dt = now - getattr(self._local, "t", now)
+        self._local.t = now
+        hist = self.stages.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self.stages.setdefault(stage, LatencyHistogram())
+        hist.observe(dt)
+
+
+# ========= 速率 ==========
+class RateMeter:
+    """最近 window 秒內的事件速率（例如顯示 fps），只保留有限筆時間戳"""
+
+    def __init__(self, window=5.0, maxlen=1024):
+        self.window = window
+        self.total = 0
+        self._ticks = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def tick(self, now=None):
+        with self._lock:
+            self._ticks.append(time.monotonic() if now is None else now)
+            self.total += 1
+
+    def rate(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            ticks = [t for t in self._ticks if now - t <= self.window]
+        if len(ticks) < 2:
+            return 0.0
+        return (len(ticks) - 1) / (ticks[-1] - ticks[0]) if ticks[-1] > ticks[0] else 0.0
+
+
+# ========= GC 暫停時間 ==========
+class GcMonitor:
+    """用 gc.callbacks 量測每次垃圾回收的暫停時間（各世代分開計數）"""
+
+    def __init__(self):
+        self.pauses = LatencyHistogram()
+        self.collections = [0, 0, 0]
+        self._t0 = None
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._t0 = time.perf_counter()
+        elif self._t0 is not None:
+            self.pauses.observe(time.perf_counter() - self._t0)
+            self.collections[info.get("generation", 0)] += 1
+            self._t0 = None
+
+    def install(self):
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+        return self
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+
+def process_stats():
+    """本行程的 CPU%（自上次呼叫起）與 RSS（MB）；沒有安裝 psutil 時回傳空 dict"""
+    global _process
+    try:
+        import psutil
+    except ImportError:
+        return {}
+    if _process is None:
+        _process = psutil.Process()
+    return {"cpu_percent": _process.cpu_percent(None), "rss_mb": _process.memory_info().rss / 1024 / 1024,
+            "threads": _process.num_threads()}
+
+
+_process = None
+
+
+# ========= 匯出 ==========
+class MetricsRegistry:
+    """
+    收集各元件的指標。collector 為無參數函數，回傳 (名稱, 標籤 dict, 數值) 的序列；
+    在匯出執行緒上呼叫，只能讀取屬性，不可碰 Tk 元件。
+    """
+
+    def __init__(self, prefix="wrinkle_"):
+        self.prefix = prefix
+        self._collectors = []
+
+    def register(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def collect(self):
+        samples = []
+        for collector in self._collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                samples.append(("collector_errors", {"error": type(e).__name__}, 1))
+        return [(self.prefix + name, labels, value) for name, labels, value in samples]
+
+    def to_dict(self):
+        return {_sample_key(name, labels): value for name, labels, value in self.collect()}
+
+    def prometheus_text(self):
+        return "".join(f"{_sample_key(name, labels)} {float(value):g}\n" for name, labels, value in self.collect())
+
+
+def _sample_key(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+    return f"{name}{{{inner}}}"
+
+
+class MetricsExporter(threading.Thread):
+    """
+    定時把指標寫成 JSON 檔（path），並可在 127.0.0.1:port 提供 Prometheus 文字格式（/metrics）。
+    port=0 表示不開 HTTP；只綁 localhost，不對外開放。
+    """
+
+    def __init__(self, registry, path=None, port=0, interval=5.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.registry = registry
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self.last_error = None
+        self._server = None
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        if self.port:
+            try:
+                self._start_http()
+            except OSError as e:
+                self.last_error = e
+        while not self._stop_evt.wait(self.interval):
+            if self.path:
+                try:
+                    self._write_file()
+                except OSError as e:
+                    self.last_error = e
+
+    def _write_file(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "metrics": self.registry.to_dict()}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def _start_http(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self):
+        self._stop_evt.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,490 @@
+"""
+多行程分析（選用）：每台攝影機一個擷取行程，把影格直接讀進 multiprocessing.shared_memory 的槽位；
+每站一個分析行程從共享記憶體取最新影格檢測，只把很小的結果（區塊數、皺褶%、缺陷框與特徵）
+經由 Queue 送回 UI 行程。檢測運算不再和 UI 行程的 Python 程式搶 GIL，多核工業電腦可以吃滿。
+
+共享記憶體配置（每台攝影機一塊）：
+  state  攝影機狀態：最新序號、實際 fps、讀取失敗、是否已開啟、分析端跳過的張數
+  meta   每個槽位的 (序號, 時間, 高, 寬, 通道)；寫入中序號為 -1
+  data   每個槽位 slot_bytes 的影像資料，VideoCapture.read() 直接寫入
+
+讀取端先看序號、複製影像、再確認序號沒變（seqlock），被覆寫到一半的影格直接略過。
+UI 行程這邊的 ProcessStation 介面與 stations.Station 相同，可以和執行緒模式的站混用，
+但 Sobel / 二值化畫面不會送回 UI 行程（只有標註畫面）。
+"""
+
+import importlib.machinery
+import multiprocessing as mp
+import queue
+import sys
+import threading
+import time
+from dataclasses import replace
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import discovery
+from capture import CameraSettings, missed_frames, readback
+from metrics import HistogramTimer, LatencyHistogram
+from stations import Smoother, TriggerState
+from wrinkle_detector import DetectorParams, MultiRoiDetector, RoiSpec, annotate_multi
+
+STATE_DTYPE = np.dtype([("latest", "<i8"), ("fps", "<f8"), ("read_failures", "<i8"),
+                        ("opened", "<i8"), ("dropped", "<i8"), ("missed", "<i8")])
+META_DTYPE = np.dtype([("seq", "<i8"), ("ts", "<f8"), ("h", "<i4"), ("w", "<i4"), ("c", "<i4"), ("pad", "<i4")])
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+STAGE_REPORT_INTERVAL = 2.0  # 秒；分析行程送回各階段延遲直方圖的間隔
+
+_ctx = mp.get_context("spawn")  # Tk 與多執行緒的行程不能 fork
+_main_lock = threading.Lock()
+
+
+# ========= 共享影格槽位 ==========
+class SharedFrames:
+    """一台攝影機的共享記憶體影格槽位；建立者負責 unlink，其他行程用 attach"""
+
+    def __init__(self, shm, slots, slot_bytes, owner):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = owner
+        buf = shm.buf
+        self.state = np.ndarray((1,), STATE_DTYPE, buf)
+        off = 64
+        self.meta = np.ndarray((slots,), META_DTYPE, buf, off)
+        off += -(-slots * META_DTYPE.itemsize // 64) * 64
+        self.data = np.ndarray((slots, slot_bytes), np.uint8, buf, off)
+
+    @staticmethod
+    def nbytes(slots, slot_bytes):
+        return 64 + -(-slots * META_DTYPE.itemsize // 64) * 64 + slots * slot_bytes
+
+    @classmethod
+    def create(cls, slots=4, slot_bytes=DEFAULT_SLOT_BYTES):
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(slots, slot_bytes))
+        frames = cls(shm, slots, slot_bytes, owner=True)
+        frames.state[0] = (0, 0.0, 0, 0, 0, 0)
+        frames.meta["seq"] = 0
+        return frames
+
+    @classmethod
+    def attach(cls, name, slots, slot_bytes):
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            _untrack_attached(shm)
+        return cls(shm, slots, slot_bytes, owner=False)
+
+    # ---- 寫入端（擷取行程） ----
+    def begin_write(self, shape):
+        """回傳 (槽位, 可直接給 VideoCapture.read() 的 view)；shape 未知或放不下時 view 為 None"""
+        i = (int(self.state["latest"][0]) + 1) % self.slots
+        self.meta["seq"][i] = -1
+        if shape is None or int(np.prod(shape)) > self.slot_bytes:
+            return i, None
+        return i, self.data[i, :int(np.prod(shape))].reshape(shape)
+
+    def commit(self, i, view, img, ts):
+        """img 不在槽位裡（第一張或尺寸改變）時複製進去；太大放不下回傳 False"""
+        if img.nbytes > self.slot_bytes:
+            return False
+        if view is None or not np.shares_memory(view, img):
+            self.data[i, :img.nbytes] = img.reshape(-1)
+        seq = int(self.state["latest"][0]) + 1
+        h, w = img.shape[:2]
+        self.meta[i] = (seq, ts, h, w, img.shape[2] if img.ndim == 3 else 1, 0)
+        self.state["latest"] = seq
+        return True
+
+    # ---- 讀取端 ----
+    def read(self, after_seq=0, seq=None, count_dropped=False):
+        """
+        複製出序號 seq（未指定時為最新）的影格，回傳 (序號, 時間, 影像)；
+        沒有比 after_seq 新的、或那一格已被覆寫時回傳 None
+        """
+        latest = int(self.state["latest"][0])
+        seq = latest if seq is None else seq
+        if seq <= after_seq or seq <= 0 or latest - seq >= self.slots - 1:
+            return None
+        i = seq % self.slots
+        m = self.meta[i].copy()
+        if m["seq"] != seq:
+            return None
+        shape = (m["h"], m["w"], m["c"]) if m["c"] > 1 else (m["h"], m["w"])
+        frame = self.data[i, :int(np.prod(shape))].reshape(shape).copy()
+        if self.meta["seq"][i] != seq:  # 複製途中被覆寫
+            return None
+        if count_dropped and after_seq and seq - after_seq > 1:
+            self.state["dropped"] += seq - after_seq - 1
+        return seq, float(m["ts"]), frame
+
+    def close(self):
+        # numpy view 先放掉，否則 SharedMemory.close() 會因為還有 export 而失敗
+        self.state = self.meta = self.data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _untrack_attached(shm):
+    """
+    3.12 以前 attach 也會登記到 resource_tracker。spawn 的子行程沿用建立者的 tracker（_pid 為 None），
+    重複登記沒有影響，這時若 unregister 反而刪掉建立者的登記：unlink 時 tracker 印出 KeyError，
+    UI 行程當掉時也不再清掉 /dev/shm 的區塊。只有自己另外啟動了 tracker 才取消登記，
+    否則那個 tracker 會在本行程結束時把建立者的區塊刪掉
+    """
+    if sys.platform == "win32":
+        return
+    from multiprocessing import resource_tracker
+    if getattr(resource_tracker._resource_tracker, "_pid", None) is None:
+        return
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def slot_bytes_for(source, settings):
+    """依設定的解析度（或搜尋快取）決定槽位大小，至少容得下 1080p"""
+    w, h = (settings.width, settings.height) if settings is not None else (0, 0)
+    info = discovery.cached(source) if isinstance(source, int) else None
+    if not (w and h) and info is not None:
+        w, h = info.width, info.height
+    return max(DEFAULT_SLOT_BYTES, w * h * 3)
+
+
+def _no_main_reimport():
+    """
+    spawn 的子行程預設會重新執行主程式，而 main.py 在模組層級就建立 UI。子行程只需要本模組：
+    把主程式的 __spec__ 名稱設為 "__main__"，multiprocessing 就和 python -m 套件 的 __main__.py 一樣
+    不在子行程重新執行。只改一次、不再還原，也不動 __file__（UI 執行緒隨時會用 get_base_dir 讀它）。
+    （PyInstaller 打包版由 freeze_support 處理）
+    """
+    main = sys.modules["__main__"]
+    with _main_lock:
+        if getattr(getattr(main, "__spec__", None), "name", None) != "__main__":
+            main.__spec__ = importlib.machinery.ModuleSpec("__main__", None)
+
+
+# ========= 子行程 ==========
+def _capture_main(shm_name, slots, slot_bytes, source, settings, info, events, stop):
+    if info is not None:
+        discovery.remember(info)
+    frames = SharedFrames.attach(shm_name, slots, slot_bytes)
+    cap = discovery.open_capture(source)
+    try:
+        actual = {}
+        if cap.isOpened():
+            actual = settings.apply(cap) if settings is not None else readback(cap)
+            events.put(("actual", actual))
+        frames.state["opened"] = 1
+        nominal = actual.get("fps") or 0.0
+        shape, last, fps = None, None, 0.0
+        while not stop.is_set():
+            i, view = frames.begin_write(shape)
+            ret, img = cap.read(view) if view is not None else cap.read()
+            if not ret or img is None:
+                frames.state["read_failures"] += 1
+                last = None
+                stop.wait(0.2)
+                continue
+            now = time.time()
+            if not frames.commit(i, view, img, now):
+                frames.state["read_failures"] += 1
+                continue
+            shape = img.shape
+            if last is not None and now > last:
+                fps += 0.05 * (1.0 / (now - last) - fps)
+                frames.state["fps"] = fps
+                frames.state["missed"] += missed_frames(now - last, nominal)
+            last = now
+    finally:
+        cap.release()
+        frames.close()
+
+
+def _analysis_main(shm_name, slots, slot_bytes, base_params, rois, target_fps, params_q, results_q, stop):
+    frames = SharedFrames.attach(shm_name, slots, slot_bytes)
+    detector = MultiRoiDetector(base_params, rois)
+    detector.timer = HistogramTimer()
+    period = 1.0 / max(0.1, target_fps)
+    seq = 0
+    next_report = time.monotonic() + STAGE_REPORT_INTERVAL
+    try:
+        while not stop.is_set():
+            try:
+                while True:
+                    rois, base_params = params_q.get_nowait()
+                    detector.set_rois(rois, base_params)
+            except queue.Empty:
+                pass
+            t0 = time.monotonic()
+            item = frames.read(seq, count_dropped=True)
+            if item is None:
+                stop.wait(0.002)
+                continue
+            seq, ts, frame = item
+            try:
+                result = detector.process(frame, ts, annotate=False)
+            except Exception as e:
+                # 與 Station.step 相同：記下錯誤、繼續下一張，主行程放進 last_error 顯示
+                _put_latest(results_q, ("error", f"{type(e).__name__}: {e}"))
+                stop.wait(period)
+                continue
+            # 只送小筆資料回去：影像陣列一律拿掉
+            light = replace(result, rois={name: replace(r, sobel=None, thresh=None, frame=None, gray=None,
+                                                        annotated=None) for name, r in result.rois.items()})
+            _put_latest(results_q, ("result", seq, light))
+            if time.monotonic() >= next_report:
+                _put_latest(results_q, ("stages", detector.timer.stages))
+                next_report = time.monotonic() + STAGE_REPORT_INTERVAL
+            stop.wait(max(0.0, period - (time.monotonic() - t0)))
+    finally:
+        detector.close()
+        frames.close()
+
+
+def _put_latest(q, item):
+    """佇列滿了（UI 來不及收）就丟掉這筆，不讓分析行程卡住"""
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        pass
+
+
+# ========= UI 行程端 ==========
+class _Flag:
+    def __init__(self, frames, field):
+        self._frames, self._field = frames, field
+
+    def is_set(self):
+        frames = self._frames
+        return frames.state is not None and bool(frames.state[self._field][0])
+
+
+class SharedCamera:
+    """
+    擷取行程在 UI 行程這端的代理，提供 CameraGrabber 的常用屬性
+    （source、fps、read_failures、missed、actual、opened、ring.seq / ring.dropped）。
+    """
+
+    def __init__(self, source, settings=None, slots=4, name=None):
+        self.source = source
+        self.settings = settings
+        self.frames = SharedFrames.create(slots, slot_bytes_for(source, settings))
+        self.opened = _Flag(self.frames, "opened")
+        self.ring = self
+        self._actual = {}
+        self._events = _ctx.Queue()
+        self._stop = _ctx.Event()
+        info = discovery.cached(source) if isinstance(source, int) else None
+        self._proc = _ctx.Process(target=_capture_main, name=name or f"capture-{source}", daemon=True,
+                                  args=(self.frames.shm.name, slots, self.frames.slot_bytes, source, settings,
+                                        info, self._events, self._stop))
+
+    def _stat(self, field):
+        state = self.frames.state
+        return state[field][0].item() if state is not None else 0
+
+    seq = property(lambda self: self._stat("latest"))
+    dropped = property(lambda self: self._stat("dropped"))
+    fps = property(lambda self: self._stat("fps"))
+    read_failures = property(lambda self: self._stat("read_failures"))
+    missed = property(lambda self: self._stat("missed"))
+
+    @property
+    def actual(self):
+        try:
+            while True:
+                kind, value = self._events.get_nowait()
+                if kind == "actual":
+                    self._actual = value
+        except queue.Empty:
+            pass
+        return self._actual
+
+    def peek(self):
+        """最新影格 (序號, 時間, 影像) 的複本"""
+        return self.frames.read() if self.frames.state is not None else None
+
+    def is_alive(self):
+        return self._proc.is_alive()
+
+    def start(self):
+        _no_main_reimport()
+        self._proc.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._proc.pid is not None:
+            self._proc.join(timeout)
+            if self._proc.is_alive():
+                self._proc.terminate()
+        self.frames.close()
+
+
+class RemoteDetector:
+    """
+    給 UI 使用的檢測參數代理：set_rois() 與 MultiRoiDetector 相同，參數經由 Queue 送到分析行程。
+    timer 的 stages 由分析行程定時送回（只有讀取用）。
+    """
+
+    def __init__(self, base_params=None, rois=()):
+        self.base_params = base_params or DetectorParams()
+        self.rois = tuple(rois) or (RoiSpec("ROI1", self.base_params.roi, self.base_params.edge_threshold,
+                                            self.base_params.min_area, self.base_params.sobel_ksize),)
+        self.timer = None
+        self._queue = None
+
+    def bind(self, q):
+        self._queue = q
+
+    def set_rois(self, rois, base_params=None):
+        if base_params is not None:
+            self.base_params = base_params
+        self.rois = tuple(rois)
+        if self._queue is not None:
+            _put_latest(self._queue, (self.rois, self.base_params))
+
+    def close(self):
+        self._queue = None
+
+
+class ProcessStation:
+    """
+    與 stations.Station 相同介面的一站，但擷取與分析都在子行程。
+    UI 行程收到結果時才從共享記憶體取對應的影格做預覽與標註。
+    """
+
+    def __init__(self, name, main_source, jig_source=None, detector=None, target_fps=15,
+                 main_settings=None, jig_settings=None, slots=4):
+        self.name = name
+        self.detector = detector or RemoteDetector()
+        self.target_fps = target_fps
+        self.main_settings = main_settings or CameraSettings()
+        self.jig_settings = jig_settings or CameraSettings()
+        self.slots = slots
+        self.trigger = TriggerState()
+        self.smoother = Smoother()
+        self.analyzed = 0
+        self.fps = 0.0
+        self.latency = LatencyHistogram()
+        self.last_error = None
+        self.busy = False
+        self.grabber = None
+        self.jig = None
+        self._sources = (main_source, jig_source)
+        self._proc = None
+        self._stop = None
+        self._results = None
+        self._result = None
+        self._last_done = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def set_sources(self, main_source, jig_source=None, main_settings=None, jig_settings=None):
+        """換攝影機：整組子行程重新啟動（擷取與分析都跟著共享記憶體換新）"""
+        if main_settings is not None:
+            self.main_settings = main_settings
+        if jig_settings is not None:
+            self.jig_settings = jig_settings
+        self._sources = (main_source, jig_source)
+        if self._started:
+            self._shutdown()
+            self._started = False
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            main_source, jig_source = self._sources
+            self.grabber = SharedCamera(main_source, self.main_settings, self.slots, f"{self.name}-main")
+            self.jig = (SharedCamera(jig_source, self.jig_settings, self.slots, f"{self.name}-jig")
+                        if jig_source is not None else None)
+            self._stop = _ctx.Event()
+            self._results = _ctx.Queue(maxsize=64)
+            params_q = _ctx.Queue(maxsize=16)
+            self.detector.bind(params_q)
+            frames = self.grabber.frames
+            self._proc = _ctx.Process(target=_analysis_main, name=f"{self.name}-analysis", daemon=True,
+                                      args=(frames.shm.name, frames.slots, frames.slot_bytes,
+                                            self.detector.base_params, self.detector.rois, self.target_fps,
+                                            params_q, self._results, self._stop))
+            for cam in (self.grabber, self.jig):
+                if cam is not None:
+                    cam.start()
+            _no_main_reimport()
+            self._proc.start()
+
+    def ready(self, now):
+        return False  # 不經過 StationScheduler 的執行緒池
+
+    def _drain(self):
+        newest = None
+        try:
+            while True:
+                msg = self._results.get_nowait()
+                if msg[0] == "result":
+                    newest = msg
+                    self.last_error = None
+                    self._count(msg[2].ts)
+                elif msg[0] == "error":
+                    self.last_error = RuntimeError(msg[1])
+                elif msg[0] == "stages" and self.detector.timer is not None:
+                    self.detector.timer.stages = msg[1]
+        except queue.Empty:
+            pass
+        return newest
+
+    def _count(self, ts):
+        self.latency.observe(max(0.0, time.time() - ts))
+        now = time.monotonic()
+        if self._last_done is not None and now > self._last_done:
+            self.fps += 0.1 * (1.0 / (now - self._last_done) - self.fps)
+        self._last_done = now
+        self.analyzed += 1
+
+    def latest(self, after_seq=0):
+        """回傳 (序號, 結果)；結果已補上預覽與標註畫面。沒有新結果時回傳 None"""
+        if self._results is None:
+            return None
+        msg = self._drain()
+        if msg is not None:
+            _, frame_seq, result = msg
+            # 優先用結果對應的那一張；已被覆寫就用最新的
+            item = self.grabber.frames.read(seq=frame_seq) or self.grabber.peek()
+            if item is not None:
+                annotate_multi(result, item[2], self.detector.base_params.frame_size)
+                self._result = result
+        if self.analyzed <= after_seq or self._result is None:
+            return None
+        return self.analyzed, self._result
+
+    def jig_frame(self):
+        item = self.jig.peek() if self.jig is not None else None
+        return (item[1], item[2]) if item is not None else None
+
+    def _shutdown(self):
+        if self._stop is not None:
+            self._stop.set()
+        if self._proc is not None and self._proc.pid is not None:
+            self._proc.join(2.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+        for cam in (self.grabber, self.jig):
+            if cam is not None:
+                cam.stop()
+        self.detector.bind(None)
+
+    def stop(self):
+        with self._lock:
+            if self._started:
+                self._shutdown()
+                self._started = False
@@ -0,0 +1,126 @@
+"""
+開程式的耗時紀錄（main.py --startup-profile）。
+
+主執行緒依序呼叫 mark(名稱)，記下自上一個 mark 起各階段花的時間；
+背景執行緒（例如開攝影機）用 step(名稱) 包住要量的區段，可與主執行緒的階段重疊。
+開啟 import 計時時會暫時包住 builtins.__import__，只記主執行緒最外層的 import：
+一個模組的時間包含它第一次載入的相依模組（例如 stations 會把 numpy、cv2 算進去），
+已載入過的模組不到 1 毫秒，不列出。finish() 之後還原 __import__，之後的延遲載入不再計時。
+"""
+
+import builtins
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+IMPORT_MIN_S = 0.001
+REPORT_FILE = "startup_profile.txt"
+
+
+class StartupProfiler:
+    """
+    各階段時間一律記錄（很便宜，狀態列顯示開機到第一張畫面的秒數用）；
+    enabled 時才計 import 時間，finish() 時才輸出報告。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.t0 = time.perf_counter()
+        self.stages = []   # (名稱, 開始秒, 耗時秒, 執行緒名稱)，秒數從建立 profiler 起算
+        self.imports = []  # (import 名稱, 開始秒, 耗時秒)
+        self.finished = False
+        self._last = self.t0
+        self._lock = threading.Lock()
+        self._thread = threading.current_thread()
+        self._depth = 0
+        self._orig_import = None
+        if enabled:
+            self._install()
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def _add(self, name, start, end):
+        with self._lock:
+            self.stages.append((name, start - self.t0, end - start, threading.current_thread().name))
+
+    def mark(self, name):
+        """主執行緒：名稱為自上一個 mark（或建立時）到現在這一段"""
+        now = time.perf_counter()
+        self._add(name, self._last, now)
+        self._last = now
+
+    @contextmanager
+    def step(self, name):
+        """任何執行緒：量測 with 區塊，不影響 mark 的分段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, start, time.perf_counter())
+
+    # ---------- import 計時 ----------
+    def _install(self):
+        orig = self._orig_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if self._depth or threading.current_thread() is not self._thread:
+                return orig(name, globals, locals, fromlist, level)
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return orig(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                dt = time.perf_counter() - start
+                if dt >= IMPORT_MIN_S:
+                    label = "." * level + name
+                    if fromlist:
+                        label += f" ({', '.join(fromlist)})"
+                    self.imports.append((label, start - self.t0, dt))
+
+        builtins.__import__ = timed_import
+
+    def _uninstall(self):
+        if self._orig_import is not None:
+            builtins.__import__ = self._orig_import
+            self._orig_import = None
+
+    # ---------- 報告 ----------
+    def report(self, top=25):
+        with self._lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+        lines = ["=== 啟動耗時 ===", f"{'階段':<28}{'開始':>9}{'耗時':>9}  執行緒"]
+        for name, start, dt, thread in stages:
+            lines.append(f"{name:<28}{start:>8.3f}s{dt:>8.3f}s  {thread}")
+        if self.imports:
+            lines.append("")
+            lines.append(f"import（含第一次載入的相依模組，前 {top} 名）")
+            for label, start, dt in sorted(self.imports, key=lambda i: -i[2])[:top]:
+                lines.append(f"  {label:<50}{dt:>8.3f}s  （{start:.3f}s 開始）")
+            lines.append(f"  import 合計 {sum(i[2] for i in self.imports):.3f}s")
+        return "\n".join(lines)
+
+    def finish(self, directory=None):
+        """
+        結束量測：還原 __import__；enabled 時印出報告並寫入 directory/startup_profile.txt。
+        回傳報告檔路徑（沒寫檔時為 None）。只有第一次呼叫有作用
+        """
+        if self.finished:
+            return None
+        self.finished = True
+        self._uninstall()
+        if not self.enabled:
+            return None
+        text = self.report()
+        print(text)
+        if directory is None:
+            return None
+        path = os.path.join(directory, REPORT_FILE)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError:
+            return None
+        return path
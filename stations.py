@@ -0,0 +1,308 @@
+"""
+多站（多條產線）檢測：每一站是一台檢測攝影機 + 選配的夾具攝影機，各自有 ROI 與參數。
+所有站共用一個執行緒池分析，StationScheduler 依各站的 target_fps 排程，
+一台工業電腦就能同時監看多條 RTR 線，不必開好幾個程式。
+
+額外的站由 stations.json 設定（與主程式同資料夾），格式：
+[
+  {"name": "L2", "main_cam": 3, "jig_cam": 4, "fps": 10, "gradient": "f32_l2", "blobs": "components", "full_res": false,
+   "threshold_mode": "percentile", "auto_percentile": 99, "adaptive_tiles": 4,
+   "density_cols": 8, "density_rows": 1, "density_half_life": 10,
+   "main_settings": {"width": 1280, "height": 720, "fps": 30, "fourcc": "MJPG", "buffersize": 1},
+   "rois": [{"name": "ROI1", "roi": [0.25, 0.25, 0.5, 0.5], "edge": 50, "min_area": 200, "ksize": 3}]}
+]
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from blobs import BACKENDS as BLOB_BACKENDS
+from capture import CameraGrabber
+from config import ConfigError, _Validator
+from gradient import BACKENDS as GRADIENT_BACKENDS
+from metrics import LatencyHistogram
+from thresholding import MODES as THRESHOLD_MODES
+from wrinkle_detector import DetectorParams, MultiRoiDetector
+
+
+# ========= 觸發判斷 ==========
+class TriggerState:
+    """框框數連續達標 trigger_time 秒才截圖，兩次截圖至少間隔 capture_gap 秒"""
+
+    def __init__(self):
+        self.start_time = None
+        self.last_capture_time = 0
+
+    def update(self, hit, now, trigger_time, capture_gap):
+        """hit：這次是否達標。回傳 True 表示現在該截圖"""
+        if not hit:
+            self.start_time = None
+            return False
+        if self.start_time is None:
+            self.start_time = now
+            self.last_capture_time = 0  # 每次重新達標都重新計算間隔
+            return False
+        if now - self.start_time >= trigger_time and now - self.last_capture_time >= capture_gap:
+            self.last_capture_time = now
+            return True
+        return False
+
+
+class Smoother:
+    """
+    區塊數 / 皺褶% 的時間平滑（每個 ROI 各自計算），單張影格的雜訊不會直接觸發截圖。
+    mode："ema" 指數平滑（alpha 越小越平滑）、"median" 最近 window 張取中位數、"off" 不平滑。
+    """
+
+    MODES = ("off", "ema", "median")
+
+    def __init__(self, mode="ema", alpha=0.3, window=5):
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self._state = {}
+
+    def configure(self, mode=None, alpha=None, window=None):
+        """None 表示不變；改設定會清掉累積的狀態"""
+        if mode is not None:
+            self.mode = mode
+        if alpha is not None:
+            self.alpha = alpha
+        if window is not None:
+            self.window = window
+        self._state = {}
+
+    def update(self, key, count, wrinkle):
+        """餵入一筆原始值，回傳平滑後的 (區塊數, 皺褶%)"""
+        if self.mode == "ema":
+            s = self._state.get(key)
+            if s is None:
+                s = self._state[key] = [float(count), float(wrinkle)]
+            else:
+                s[0] += self.alpha * (count - s[0])
+                s[1] += self.alpha * (wrinkle - s[1])
+            return s[0], s[1]
+        if self.mode == "median":
+            d = self._state.get(key)
+            if d is None:
+                d = self._state[key] = deque(maxlen=self.window)
+            d.append((count, wrinkle))
+            c, w = np.median(np.asarray(d), axis=0)
+            return float(c), float(w)
+        return count, wrinkle
+
+    def smooth(self, result):
+        """MultiRoiResult -> {ROI 名稱: (平滑後區塊數, 平滑後皺褶%)}"""
+        return {name: self.update(name, r.defect_count, r.wrinkle) for name, r in result.rois.items()}
+
+
+# ========= 單站 ==========
+class Station:
+    """
+    一站的攝影機、檢測引擎與最新結果。分析由 StationScheduler 排程，
+    process(frame, ts) 預設為 detector.process，可換成加上其他處理的函數。
+    """
+
+    def __init__(self, name, main_source, jig_source=None, detector=None, target_fps=15, process=None,
+                 main_settings=None, jig_settings=None):
+        self.name = name
+        self.main_settings = main_settings
+        self.jig_settings = jig_settings
+        self.detector = detector or MultiRoiDetector()
+        self.target_fps = target_fps
+        self.process = process or self.detector.process
+        self.grabber = None
+        self.jig = None
+        self.trigger = TriggerState()
+        self.smoother = Smoother()
+        self.analyzed = 0
+        self.fps = 0.0
+        self.latency = LatencyHistogram()  # 擷取到分析完成的延遲
+        self.last_error = None
+        self.busy = False
+        self.next_due = 0.0
+        self._started = False
+        self._frame_seq = 0
+        self._result = None
+        self._last_done = None
+        self._lock = threading.Lock()
+        self.set_sources(main_source, jig_source)
+
+    def set_sources(self, main_source, jig_source=None, main_settings=None, jig_settings=None):
+        """換攝影機（或攝影機設定）：舊的擷取執行緒在背景自行釋放，新的立刻開始；設定給 None 表示沿用"""
+        if main_settings is not None:
+            self.main_settings = main_settings
+        if jig_settings is not None:
+            self.jig_settings = jig_settings
+        old = {}
+        for g in (self.grabber, self.jig):
+            if g is not None:
+                g.stop()
+                old[g.source] = g
+        # 新的執行緒若要開同一台裝置，會先等舊的釋放
+        self.grabber = CameraGrabber(main_source, name=f"{self.name}-main", after=old.get(main_source),
+                                     settings=self.main_settings)
+        self.jig = (CameraGrabber(jig_source, name=f"{self.name}-jig", after=old.get(jig_source),
+                                  settings=self.jig_settings)
+                    if jig_source is not None else None)
+        self._frame_seq = 0
+        if self._started:
+            self.start()
+
+    def start(self):
+        self._started = True
+        for g in (self.grabber, self.jig):
+            if g is not None and not g.is_alive():
+                g.start()
+
+    def stop(self):
+        for g in (self.grabber, self.jig):
+            if g is not None:
+                g.stop()
+        self.detector.close()
+
+    def ready(self, now):
+        return not self.busy and now >= self.next_due and self.grabber.ring.seq > self._frame_seq
+
+    def step(self):
+        """在執行緒池中執行：處理最新一張影格"""
+        grabber = self.grabber
+        item = grabber.ring.latest(self._frame_seq, timeout=0)
+        if item is None:
+            return
+        seq, ts, frame = item
+        try:
+            result = self.process(frame, ts)
+        except Exception as e:
+            self.last_error = e
+            return
+        finally:
+            if grabber is self.grabber:
+                self._frame_seq = seq
+        self.latency.observe(max(0.0, time.time() - ts))
+        now = time.monotonic()
+        if self._last_done is not None and now > self._last_done:
+            # 指數平滑，總覽畫面顯示用
+            self.fps += 0.1 * (1.0 / (now - self._last_done) - self.fps)
+        self._last_done = now
+        self.last_error = None
+        with self._lock:
+            self.analyzed += 1
+            self._result = result
+
+    def latest(self, after_seq=0):
+        """回傳 (序號, 結果)；沒有更新的結果時回傳 None"""
+        with self._lock:
+            if self.analyzed <= after_seq or self._result is None:
+                return None
+            return self.analyzed, self._result
+
+    def jig_frame(self):
+        """夾具攝影機最新影格 (ts, frame)，沒有夾具攝影機或還沒有畫面時回傳 None"""
+        item = self.jig.ring.peek() if self.jig is not None else None
+        return (item[1], item[2]) if item is not None else None
+
+
+# ========= 排程 ==========
+class StationScheduler(threading.Thread):
+    """依各站 target_fps 把分析工作丟進共用執行緒池；同一站同時只會有一個工作在跑"""
+
+    def __init__(self, stations=(), workers=None):
+        super().__init__(name="station-scheduler", daemon=True)
+        self.stations = list(stations)
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="station")
+        self._stop_evt = threading.Event()
+
+    def add(self, station):
+        self.stations = self.stations + [station]
+        station.start()
+
+    def run(self):
+        for st in self.stations:
+            st.start()
+        while not self._stop_evt.is_set():
+            now = time.monotonic()
+            for st in self.stations:
+                if st.ready(now):
+                    st.busy = True
+                    st.next_due = now + 1.0 / max(0.1, st.target_fps)
+                    self._pool.submit(self._run_station, st)
+            self._stop_evt.wait(0.003)
+
+    @staticmethod
+    def _run_station(st):
+        try:
+            st.step()
+        finally:
+            st.busy = False
+
+    def stop(self):
+        self._stop_evt.set()
+        for st in self.stations:
+            st.stop()
+        self._pool.shutdown(wait=False)
+
+
+# ========= 設定檔 ==========
+_STATION_KEYS = ("name", "main_cam", "jig_cam", "fps", "gradient", "blobs", "full_res", "skip_diff", "threshold_mode",
+                 "auto_percentile", "adaptive_tiles", "density_cols", "density_rows", "density_half_life",
+                 "main_settings", "jig_settings", "rois")
+
+
+def _station_config(item, i, frame_size, names, errors):
+    """驗證一站的設定；錯誤累積在 errors，回傳 (名稱, 主攝影機, 夾具攝影機, fps, DetectorParams, ROI, 主 / 副攝影機設定)"""
+    v = _Validator(item, f"[{i}].", errors)
+    name = str(v.data.get("name", f"L{i + 2}"))
+    if name in names:
+        v._error("name", f"重複：{name}")
+    names.add(name)
+    d = DetectorParams
+    base = DetectorParams(frame_size=tuple(frame_size),
+                          gradient=v.choice("gradient", GRADIENT_BACKENDS, d.gradient),
+                          blobs=v.choice("blobs", BLOB_BACKENDS, d.blobs),
+                          full_res=v.boolean("full_res", d.full_res),
+                          skip_diff=v.number("skip_diff", d.skip_diff, 0, 255),
+                          threshold_mode=v.choice("threshold_mode", THRESHOLD_MODES, d.threshold_mode),
+                          auto_percentile=v.number("auto_percentile", d.auto_percentile, 50, 100),
+                          adaptive_tiles=v.integer("adaptive_tiles", d.adaptive_tiles, 0, 16),
+                          density_cols=v.integer("density_cols", d.density_cols, 0, 64),
+                          density_rows=v.integer("density_rows", d.density_rows, 1, 64),
+                          density_half_life=v.number("density_half_life", d.density_half_life, 0, 3600))
+    config = (name, v.source("main_cam"), v.source("jig_cam", optional=True), v.number("fps", 10, 0.1, 1000), base,
+              list(v.rois("rois", ())), v.camera("main_settings"), v.camera("jig_settings"))
+    v.check_unknown(_STATION_KEYS)
+    return config
+
+
+def load_station_configs(path, frame_size=(320, 240), station_cls=None, detector_cls=MultiRoiDetector):
+    """
+    讀取 stations.json，回傳 Station 清單（尚未啟動）；檔案不存在時回傳空清單。
+    內容用與 wrinkle_config.json 相同的規則驗證，有誤時丟 ConfigError 並列出所有有問題的欄位，
+    不會等到分析每一張影格都失敗才發現（例如偶數的 ksize）。
+    多行程模式傳入 multiproc.ProcessStation / RemoteDetector。
+    """
+    station_cls = station_cls or Station
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        items = json.loads(raw.decode("utf-8-sig"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ConfigError([f"格式錯誤：{e}"], path) from None
+    if not isinstance(items, list):
+        raise ConfigError(["最上層應為各站設定的清單"], path)
+    errors, names = [], set()
+    configs = [_station_config(item, i, frame_size, names, errors) for i, item in enumerate(items)]
+    if errors:
+        raise ConfigError(errors, path)
+    return [station_cls(name, main_cam, jig_cam, detector_cls(base, rois), target_fps=fps,
+                        main_settings=main_settings, jig_settings=jig_settings)
+            for name, main_cam, jig_cam, fps, base, rois, main_settings, jig_settings in configs]
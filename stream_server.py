@@ -0,0 +1,365 @@
+"""
+遠端觀看：內建的 asyncio HTTP 伺服器，主管不必站在產線電腦前也能看各線狀況。
+
+  /              簡單的觀看頁面（畫面 + 即時數值）
+  /stream.mjpg   標註畫面的 MJPEG 串流（multipart/x-mixed-replace，瀏覽器 <img> 直接播放）
+  /snapshot.jpg  最新一張 JPEG（標頭 X-Frame-Age：畫面送入後經過的秒數）
+  /events        即時數值的 Server-Sent Events（每筆一個 JSON）
+  /status.json   最新一筆數值
+
+每張畫面只在背景執行緒編碼一次 JPEG，所有連線共用同一份 bytes；沒有人在看時完全不編碼，
+/snapshot.jpg 則讓 UI 送一張新的畫面來編碼（最多等 SNAPSHOT_TIMEOUT 秒，逾時才回最後一張舊的）。
+每個連線各自送「目前最新的一張」：網路慢的連線送不完時中間的畫面直接略過（per-client 丟幀），
+不會拖慢其他連線，也不會回頭卡住檢測或 UI（UI 執行緒只做一次參考交換）。
+預設只綁 127.0.0.1；要給同網段其他電腦看時 host 設 "0.0.0.0"。
+
+不接攝影機在本機試：python stream_server.py --demo，再用瀏覽器開 http://127.0.0.1:8090/
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+
+import cv2
+
+MAX_WRITE_BUFFER = 512 * 1024  # 每個連線送出緩衝的硬上限（正常只會留不到一張，見 _stream_mjpeg）
+SOCKET_SEND_BUFFER = 64 * 1024   # MJPEG 連線的核心送出緩衝（SO_SNDBUF）；系統預設可達數 MB，慢連線會落後好幾秒
+SEND_TIMEOUT = 10.0            # 連線卡住超過此秒數就斷線
+SSE_KEEPALIVE = 15.0
+SNAPSHOT_TIMEOUT = 2.0         # /snapshot.jpg 等新畫面的秒數
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>RTR-TP 皺褶檢測</title>
+<style>body{font-family:sans-serif;background:#222;color:#eee}td{padding:2px 10px}</style></head>
+<body><h3>RTR-TP 皺褶檢測</h3><img src="/stream.mjpg"><table id="t"></table>
+<script>
+new EventSource("/events").onmessage = function (e) {
+  var d = JSON.parse(e.data), rows = "<tr><td>站</td><td>區塊數</td><td>皺褶%</td><td>分析 fps</td><td>各 ROI</td></tr>";
+  for (var name in d.stations) {
+    var s = d.stations[name], rois = [];
+    for (var r in s.rois) rois.push(r + ": " + s.rois[r][0] + " / " + s.rois[r][1].toFixed(2) + "%");
+    rows += "<tr><td>" + name + "</td><td>" + s.defect_count + "</td><td>" + s.wrinkle.toFixed(2) +
+            "</td><td>" + s.fps.toFixed(1) + "</td><td>" + rois.join("　") + "</td></tr>";
+  }
+  document.getElementById("t").innerHTML = rows;
+};
+</script></body></html>
+"""
+
+
+class StreamServer(threading.Thread):
+    """
+    publish_frame() / publish_metrics() 在 UI 執行緒呼叫，只記下最新的資料；
+    編碼與網路全部在伺服器自己的執行緒（asyncio 事件迴圈 + 編碼用執行緒池）。
+    fps：MJPEG 最高張數；metrics_interval：SSE 最短間隔（秒）。
+    """
+
+    def __init__(self, host="127.0.0.1", port=8090, fps=10, quality=75, metrics_interval=0.5, max_clients=16):
+        super().__init__(name="stream-server", daemon=True)
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.quality = quality
+        self.metrics_interval = metrics_interval
+        self.max_clients = max_clients
+        self.mjpeg_clients = 0
+        self.snapshot_waiters = 0  # 等新畫面的 /snapshot.jpg 請求數
+        self.sse_clients = 0
+        self.frames_encoded = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0   # 各連線因為太慢而略過的張數加總
+        self.last_error = None
+        self.ready = threading.Event()
+        self._loop = None
+        self._stop_evt = None
+        self._lock = threading.Lock()
+        self._pending = None       # UI 送來、還沒編碼的 (影像, 是否 RGB, 送入時間)
+        self._encoding = False
+        self._last_frame_time = 0.0
+        self._last_metrics_time = 0.0
+        self._frame = (0, None, 0.0)  # (序號, JPEG bytes, 送入時間 time.monotonic())
+        self._metrics = (0, None)  # (序號, JSON 字串)；有 SSE 連線時才轉 JSON
+        self._raw_metrics = None
+        self._frame_cond = None
+        self._metrics_cond = None
+
+    # ---------- UI 執行緒呼叫 ----------
+    def wants_frame(self, now=None):
+        """有人在看 MJPEG 或等快照，且距上一張超過 1/fps 秒；不需要時呼叫端可省下複製畫面"""
+        now = time.monotonic() if now is None else now
+        return (self._loop is not None and (self.mjpeg_clients > 0 or self.snapshot_waiters > 0)
+                and now - self._last_frame_time >= 1.0 / self.fps)
+
+    def publish_frame(self, image, rgb=False):
+        """送入一張畫面（BGR，rgb=True 表示 RGB）；送入後不可再修改 image"""
+        if not self.wants_frame():
+            return
+        self._last_frame_time = time.monotonic()
+        with self._lock:
+            self._pending = (image, rgb, self._last_frame_time)
+            if self._encoding:
+                return  # 編碼中：結束後會接著取最新的這張
+            self._encoding = True
+        self._call(self._start_encode)
+
+    def publish_metrics(self, data):
+        """送入一筆即時數值（可轉 JSON 的 dict），有 SSE 連線時才處理"""
+        now = time.monotonic()
+        if self._loop is None or now - self._last_metrics_time < self.metrics_interval:
+            return
+        self._last_metrics_time = now
+        self._call(self._set_metrics, data)
+
+    def stop(self):
+        if self._stop_evt is not None:
+            self._call(self._stop_evt.set)
+
+    def _call(self, fn, *args):
+        loop = self._loop
+        try:
+            if loop is not None:
+                loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # 伺服器正在關閉
+
+    # ---------- 事件迴圈 ----------
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except OSError as e:
+            self.last_error = e
+            print("串流伺服器啟動失敗：", e)
+        finally:
+            self._loop = None
+            self.ready.set()
+
+    async def _main(self):
+        self._stop_evt = asyncio.Event()
+        self._frame_cond = asyncio.Condition()
+        self._metrics_cond = asyncio.Condition()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        if not self.port:
+            self.port = server.sockets[0].getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        self.ready.set()
+        try:
+            await self._stop_evt.wait()
+        finally:
+            # 不再接受新連線，並叫醒所有等待中的連線讓它們結束；剩下的由 asyncio.run 取消
+            server.close()
+            for cond in (self._frame_cond, self._metrics_cond):
+                async with cond:
+                    cond.notify_all()
+
+    def _start_encode(self):
+        asyncio.ensure_future(self._encode_pending())
+
+    async def _encode_pending(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                item, self._pending = self._pending, None
+                if item is None:
+                    self._encoding = False
+                    return
+            image, rgb, t = item
+            try:
+                jpeg = await loop.run_in_executor(None, self._encode, image, rgb)
+            except Exception as e:
+                self.last_error = e
+                continue
+            self.frames_encoded += 1
+            async with self._frame_cond:
+                self._frame = (self._frame[0] + 1, jpeg, t)
+                self._frame_cond.notify_all()
+
+    def _encode(self, image, rgb):
+        if rgb:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not ok:
+            raise ValueError("JPEG 編碼失敗")
+        return buf.tobytes()
+
+    def _set_metrics(self, data):
+        self._raw_metrics = data
+        if self.sse_clients:
+            asyncio.ensure_future(self._notify_metrics(_to_json(data)))
+
+    async def _notify_metrics(self, text):
+        async with self._metrics_cond:
+            self._metrics = (self._metrics[0] + 1, text)
+            self._metrics_cond.notify_all()
+
+    async def _wait_newer(self, cond, attr, after, timeout=None):
+        """等到 attr 的序號大於 after（或伺服器停止 / 逾時），回傳 attr 目前的內容（序號在第一個）"""
+        async with cond:
+            try:
+                await asyncio.wait_for(
+                    cond.wait_for(lambda: getattr(self, attr)[0] > after or self._stop_evt.is_set()), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return getattr(self, attr)
+
+    # ---------- HTTP ----------
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            parts = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+            if len(parts) < 2 or parts[0] != "GET":
+                await self._respond(writer, "405 Method Not Allowed", "text/plain", b"GET only")
+                return
+            path = parts[1].split("?")[0]
+            if path == "/":
+                await self._respond(writer, "200 OK", "text/html; charset=utf-8", PAGE.encode("utf-8"))
+            elif path == "/snapshot.jpg":
+                _, jpeg, t = await self._snapshot()
+                if jpeg is None:
+                    await self._respond(writer, "503 Service Unavailable", "text/plain", b"no frame yet")
+                else:
+                    await self._respond(writer, "200 OK", "image/jpeg", jpeg,
+                                        f"X-Frame-Age: {time.monotonic() - t:.3f}\r\n")
+            elif path == "/status.json":
+                text = _to_json(self._raw_metrics)
+                await self._respond(writer, "200 OK", "application/json; charset=utf-8", text.encode("utf-8"))
+            elif path in ("/stream.mjpg", "/events"):
+                if self.mjpeg_clients + self.sse_clients >= self.max_clients:
+                    await self._respond(writer, "503 Service Unavailable", "text/plain", b"too many viewers")
+                elif path == "/stream.mjpg":
+                    await self._stream_mjpeg(writer)
+                else:
+                    await self._stream_sse(writer)
+            else:
+                await self._respond(writer, "404 Not Found", "text/plain", b"not found")
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # stop() 時 asyncio.run 取消還卡在送資料的連線，安靜結束
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, ctype, body, headers=""):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(body)}\r\n{headers}"
+                     f"Cache-Control: no-cache\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+
+    async def _snapshot(self):
+        """
+        最新的一張還在 1/fps 秒內就直接用；否則讓 wants_frame() 回傳 True，
+        等 UI 送來的下一張編碼完（沒有 MJPEG 連線時平常不會編碼）。逾時回傳最後一張（可能是 None）
+        """
+        frame = self._frame
+        if frame[1] is not None and time.monotonic() - frame[2] < 1.0 / self.fps:
+            return frame
+        self.snapshot_waiters += 1
+        try:
+            return await self._wait_newer(self._frame_cond, "_frame", frame[0], SNAPSHOT_TIMEOUT)
+        finally:
+            self.snapshot_waiters -= 1
+
+    async def _stream_mjpeg(self, writer):
+        writer.transport.set_write_buffer_limits(high=MAX_WRITE_BUFFER)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+            except OSError:
+                pass
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        self.mjpeg_clients += 1
+        try:
+            last = 0
+            sent_at = time.monotonic()
+            while not self._stop_evt.is_set() and not writer.is_closing():
+                seq, jpeg, _ = await self._wait_newer(self._frame_cond, "_frame", last)
+                if seq <= last:
+                    continue
+                if last:
+                    self.frames_dropped += seq - last - 1
+                last = seq
+                # 緩衝區裡還有超過一張沒送出去：這張略過，每個連線最多只落後一張（低延遲）；
+                # 一直送不出去超過 SEND_TIMEOUT 就斷線
+                if writer.transport.get_write_buffer_size() > len(jpeg):
+                    self.frames_dropped += 1
+                    if time.monotonic() - sent_at > SEND_TIMEOUT:
+                        break
+                    continue
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                sent_at = time.monotonic()
+                await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+                self.frames_sent += 1
+        finally:
+            self.mjpeg_clients -= 1
+
+    async def _stream_sse(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\nretry: 2000\n\n")
+        self.sse_clients += 1
+        try:
+            last = 0
+            while not self._stop_evt.is_set():
+                seq, text = await self._wait_newer(self._metrics_cond, "_metrics", last, SSE_KEEPALIVE)
+                if seq > last and text is not None:
+                    last = seq
+                    writer.write(f"data: {text}\n\n".encode("utf-8"))
+                else:
+                    writer.write(b": keepalive\n\n")
+                await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+        finally:
+            self.sse_clients -= 1
+
+
+def _to_json(data):
+    return json.dumps(data, ensure_ascii=False, default=float)
+
+
+# ========= 本機測試 ==========
+def _demo(server, fps):
+    """合成畫面與數值：不用攝影機也能用瀏覽器確認串流"""
+    import numpy as np
+    i = 0
+    while True:
+        img = np.full((240, 320, 3), 40, np.uint8)
+        x = 40 + (i * 7) % 240
+        cv2.rectangle(img, (x, 80), (x + 40, 160), (0, 0, 255), 2)
+        cv2.putText(img, time.strftime("%H:%M:%S"), (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+        server.publish_frame(img)
+        count = 5 + (i % 30)
+        server.publish_metrics({"time": time.time(), "recording": False,
+                                "stations": {"L1": {"defect_count": count, "wrinkle": count / 10, "fps": fps,
+                                                    "rois": {"ROI1": [count, count / 10]}}}})
+        i += 1
+        time.sleep(1.0 / fps)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RTR-TP 皺褶檢測 串流伺服器（本機測試）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--fps", type=int, default=10)
+    ap.add_argument("--demo", action="store_true", help="送出合成畫面與數值")
+    args = ap.parse_args(argv)
+    server = StreamServer(args.host, args.port, fps=args.fps)
+    server.start()
+    server.ready.wait()
+    if server.last_error is not None:
+        return 1
+    print(f"http://{args.host}:{server.port}/  （Ctrl+C 結束）")
+    try:
+        if args.demo:
+            _demo(server, args.fps)
+        else:
+            server.join()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from blobs import BACKENDS, DEFECT_DTYPE, find_defects, summarize
+
+
+def blob_image():
+    """三個分開的區塊：實心方塊、30° 的細線、小點"""
+    img = np.zeros((200, 300), np.uint8)
+    img[20:60, 20:70] = 255
+    x0, y0, length = 120, 60, 100
+    x1, y1 = x0 + length * math.cos(math.radians(30)), y0 + length * math.sin(math.radians(30))
+    cv2.line(img, (x0, y0), (int(round(x1)), int(round(y1))), 255, 3)
+    img[170:174, 30:34] = 255
+    return img
+
+
+def by_x(defects):
+    return defects[np.argsort(defects["x"])]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_shapes(backend):
+    square, dot, line = by_x(find_defects(blob_image(), 5, backend))
+    assert tuple(square[["x", "y", "w", "h"]]) == (20, 20, 50, 40)
+    assert square["aspect"] == pytest.approx(50 / 40, rel=0.05)
+    assert square["angle"] == pytest.approx(0, abs=1)
+    assert line["angle"] == pytest.approx(30, abs=2)
+    assert line["length"] == pytest.approx(100, rel=0.05)
+    assert line["aspect"] > 10
+    assert tuple(dot[["w", "h"]]) == (4, 4)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_min_area_and_offset(backend):
+    defects = find_defects(blob_image(), 200, backend, offset=(5, 7))
+    assert len(defects) == 2  # 小點被濾掉
+    assert tuple(by_x(defects)[0][["x", "y"]]) == (25, 27)
+
+
+def test_backends_agree_on_boxes():
+    rng = np.random.default_rng(0)
+    thresh = np.where(cv2.GaussianBlur(rng.random((240, 320)), (0, 0), 3) > 0.52, 255, 0).astype(np.uint8)
+    a = by_x(find_defects(thresh, 30, "contours"))
+    b = by_x(find_defects(thresh, 30, "components"))
+    # components 的面積是像素數、比輪廓面積大，只比兩邊都有的區塊
+    boxes_a = {tuple(d[["x", "y", "w", "h"]]) for d in a}
+    boxes_b = {tuple(d[["x", "y", "w", "h"]]) for d in b}
+    assert len(boxes_a) > 5 and boxes_a <= boxes_b
+    assert np.all(b["area"] > 30)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_empty(backend):
+    defects = find_defects(np.zeros((50, 50), np.uint8), 0, backend)
+    assert defects.dtype == np.dtype(DEFECT_DTYPE) and len(defects) == 0
+    assert summarize(defects) == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        find_defects(np.zeros((5, 5), np.uint8), 0, "watershed")
+
+
+def test_summarize_uses_the_largest_defect():
+    defects = np.array([(0, 0, 5, 5, 10.0, 1.0, 0.0, 4.0), (9, 9, 20, 2, 40.0, 9.0, 12.0, 20.0)], DEFECT_DTYPE)
+    assert summarize(defects) == (24.0, 40.0, 9.0, 12.0)
@@ -0,0 +1,27 @@
+import pytest
+
+from capture import FrameRing, missed_frames
+
+
+@pytest.mark.parametrize("dt, fps, missed", [
+    (1 / 30, 30, 0),
+    (1.4 / 30, 30, 0),    # 抖動
+    (2 / 30, 30, 1),
+    (0.5, 30, 14),
+    (0.5, 0, 0),          # 不知道標稱 fps
+])
+def test_missed_frames(dt, fps, missed):
+    assert missed_frames(dt, fps) == missed
+
+
+def test_ring_counts_frames_the_reader_skipped():
+    ring = FrameRing(2)
+    for i in range(5):
+        ring.put(i, ts=i)
+    seq, _, frame = ring.latest(0, timeout=0)
+    assert (seq, frame, ring.dropped) == (5, 4, 4)
+    ring.put(5)
+    assert ring.latest(seq, timeout=0)[0] == 6 and ring.dropped == 4
+    assert ring.latest(6, timeout=0) is None
+    ring.peek()
+    assert ring.dropped == 4
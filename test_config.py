@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from capture import CameraSettings
+from config import ConfigError, ConfigWatcher, Profile, ProfileSet, TriggerConfig
+from wrinkle_detector import RoiSpec
+
+CUSTOM = Profile(gradient="f32_l2", blobs="components", full_res=True, skip_diff=1.5, smoothing="median",
+                 threshold_mode="percentile", auto_percentile=97.5, adaptive_tiles=4, density_cols=8,
+                 density_rows=2, density_half_life=30.0, trigger=TriggerConfig(10, 3, 20), main_cam=0, jig_cam=None,
+                 main_settings=CameraSettings(1280, 720, 30.0, "MJPG", 1, exposure=-6.0),
+                 evidence_format="png", evidence_quality=3,
+                 rois=(RoiSpec("左", (0.1, 0.2, 0.3, 0.4), 40, 100, 5), RoiSpec("右", (0.5, 0.2, 0.4, 0.4))))
+
+
+def write(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "wrinkle_config.json")
+    profiles = ProfileSet().with_profile("A100", CUSTOM)
+    assert config.save(path, profiles) == profiles
+    assert config.load(path) == profiles
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_toml(tmp_path):
+    path = tmp_path / "wrinkle_config.toml"
+    path.write_text('active = "B"\n[profiles.B]\ngradient = "s16_l1"\n[profiles.B.trigger]\ncount = 5\n'
+                    '[[profiles.B.rois]]\nname = "R"\nksize = 7\n', encoding="utf-8")
+    current = config.load(str(path)).current
+    assert (current.gradient, current.trigger.count, current.rois[0].sobel_ksize) == ("s16_l1", 5, 7)
+
+
+def test_defaults_for_missing_fields(tmp_path):
+    assert config.load(write(tmp_path / "c.json", {"profiles": {"A": {}}})).current == Profile()
+
+
+def test_all_errors_are_listed(tmp_path):
+    path = write(tmp_path / "c.json", {"active": "A", "profiles": {"A": {
+        "gradient": "f16", "skip_diff": "x", "trigger": {"count": -1}, "main_settings": {"fps": "fast"},
+        "rois": [{"ksize": 4}, {"roi": [0.8, 0, 0.5, 0.5]}], "colour": 1}}})
+    with pytest.raises(ConfigError) as info:
+        config.load(path)
+    fields = [e.split(" ", 1)[0] for e in info.value.errors]
+    assert fields == ["A.gradient", "A.skip_diff", "A.trigger.count", "A.main_settings.fps",
+                      "A.rois[0].ksize", "A.rois[1].roi", "A.colour"]
+    assert info.value.path == path and str(info.value).startswith("c.json：")
+
+
+@pytest.mark.parametrize("text", ['{"profiles": {"A": {"skip_diff": NaN}}}',
+                                  '{"profiles": {"A": {"trigger": {"time": 1e400}}}}',
+                                  '{"profiles": {"A": {"main_settings": {"fps": Infinity}}}}'])
+def test_non_finite_numbers(tmp_path, text):
+    path = tmp_path / "c.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ConfigError, match="有限"):
+        config.load(str(path))
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"profiles": {}}, "profiles"),
+    ({"active": "B", "profiles": {"A": {}}}, "active"),
+    ({"profiles": {"A": {"jig_cam": 1.5}}}, "整數"),
+    ({"profiles": {"A": {"main_settings": {"fourcc": "MJPEG"}}}}, "fourcc"),
+    ({"profiles": {"A": {"rois": []}}}, "rois"),
+    ({"profiles": {"A": {"rois": [{"name": "R"}, {"name": "R"}]}}}, "重複"),
+])
+def test_invalid_values(tmp_path, data, message):
+    with pytest.raises(ConfigError, match=message):
+        config.load(write(tmp_path / "c.json", data))
+
+
+def test_bad_json(tmp_path):
+    path = tmp_path / "c.json"
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(ConfigError, match="格式錯誤"):
+        config.load(str(path))
+
+
+def test_save_refuses_invalid_profiles(tmp_path):
+    path = write(tmp_path / "c.json", ProfileSet().to_dict())
+    before = open(path, "rb").read()
+    bad = ProfileSet().with_profile("A", Profile(rois=(RoiSpec("R", sobel_ksize=4),)))
+    with pytest.raises(ConfigError):
+        config.save(path, bad)
+    assert open(path, "rb").read() == before
+
+
+def test_backup(tmp_path):
+    path = write(tmp_path / "c.json", {"profiles": "broken"})
+    dest = config.backup(path)
+    assert os.path.basename(dest).startswith("c.json.bad-")
+    assert open(dest, "rb").read() == open(path, "rb").read()
+
+
+def test_merge_legacy():
+    legacy = {"edge_threshold": "70", "min_area": "150", "sobel_ksize": "5", "roi_width": "160",
+              "roi_height": "60", "gradient": "s16_l1", "main_width": "640", "main_height": "480"}
+    merged = Profile().merge_legacy(legacy, (320, 240))
+    roi = merged.rois[0]
+    assert (roi.edge_threshold, roi.min_area, roi.sobel_ksize) == (70, 150, 5)
+    assert roi.roi[2:] == pytest.approx((0.5, 0.25))
+    assert merged.gradient == "s16_l1" and merged.main_settings.width == 640
+    with pytest.raises(ConfigError, match="sobel_ksize"):
+        Profile().merge_legacy({"sobel_ksize": "2"}, (320, 240))
+
+
+def test_watcher_reports_external_changes_only(tmp_path):
+    path = str(tmp_path / "c.json")
+    config.save(path, ProfileSet())
+    watcher = ConfigWatcher(path, interval=0.02)
+    watcher.start()
+    try:
+        config.save(path, ProfileSet().with_profile("A", CUSTOM))
+        watcher.acknowledge()  # 自己存的檔不算外部修改
+        time.sleep(0.1)
+        assert watcher.take() is None
+        write(tmp_path / "c.json", {"profiles": {"B": {"gradient": "s16_l1"}}})
+        deadline = time.monotonic() + 2
+        while (item := watcher.take()) is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert item[1] is None and item[0].current.gradient == "s16_l1"
+        write(tmp_path / "c.json", {"profiles": {"B": {"gradient": "?"}}})
+        deadline = time.monotonic() + 2
+        while (item := watcher.take()) is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert item[0] is None and isinstance(item[1], ConfigError)
+    finally:
+        watcher.stop()
+        watcher.join(1)
+
+
+def test_acknowledge_during_a_load_drops_the_result(tmp_path, monkeypatch):
+    path = str(tmp_path / "c.json")
+    config.save(path, ProfileSet())
+    watcher = ConfigWatcher(path, interval=0.01)
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load(p):
+        loading.set()
+        release.wait(2)
+        return ProfileSet()
+
+    monkeypatch.setattr(config, "load", slow_load)
+    watcher.start()
+    try:
+        write(tmp_path / "c.json", ProfileSet().with_profile("A", CUSTOM).to_dict())  # 自己存檔，監看執行緒先看到
+        assert loading.wait(2)
+        watcher.acknowledge()
+        release.set()
+        time.sleep(0.1)
+        assert watcher.take() is None
+    finally:
+        watcher.stop()
+        watcher.join(1)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from density import DEFAULT_FRAME_DT, DensityHeatmap, decode_tiles, draw_heatmap, encode_tiles, tile_density
+
+
+def brute_force(thresh, cols, rows):
+    h, w = thresh.shape
+    xs = np.linspace(0, w, cols + 1).round().astype(int)
+    ys = np.linspace(0, h, rows + 1).round().astype(int)
+    return np.array([[(thresh[ys[r]:ys[r + 1], xs[c]:xs[c + 1]] > 0).mean() * 100 for c in range(cols)]
+                     for r in range(rows)])
+
+
+@pytest.mark.parametrize("shape, cols, rows", [((120, 160), 8, 1), ((97, 131), 7, 3), ((30, 40), 40, 30)])
+def test_tile_density_matches_brute_force(shape, cols, rows):
+    rng = np.random.default_rng(0)
+    thresh = np.where(rng.random(shape) > 0.8, 255, 0).astype(np.uint8)
+    tiles, white = tile_density(thresh, cols, rows)
+    assert tiles.shape == (rows, cols) and tiles.dtype == np.float32
+    np.testing.assert_allclose(tiles, brute_force(thresh, cols, rows), rtol=1e-5)
+    assert white == np.count_nonzero(thresh)
+
+
+def test_more_tiles_than_pixels():
+    tiles, _ = tile_density(np.full((4, 6), 255, np.uint8), 10, 10)
+    assert tiles.shape == (4, 6) and np.all(tiles == 100)
+
+
+def test_large_roi_does_not_overflow():
+    thresh = np.full((3000, 3000), 255, np.uint8)  # 超過 int32 積分圖的範圍
+    tiles, white = tile_density(thresh, 2, 2)
+    assert np.allclose(tiles, 100) and white == thresh.size
+
+
+def test_heatmap_half_life():
+    heat = DensityHeatmap()
+    np.testing.assert_array_equal(heat.update(np.array([[10.0, 0.0]]), 0.0, 10.0), [[10.0, 0.0]])
+    out = heat.update(np.array([[0.0, 40.0]]), 10.0, 10.0)  # 經過一個半衰期：各靠近一半
+    np.testing.assert_allclose(out, [[5.0, 20.0]])
+    assert heat.update(np.array([[0.0, 40.0]]), None, 0)[0, 1] == 40.0  # half_life 0：不累積
+
+
+def test_heatmap_without_timestamps_uses_frame_interval():
+    heat = DensityHeatmap()
+    heat.update(np.zeros((1, 1)), None, 1.0)
+    out = heat.update(np.full((1, 1), 100.0), None, 1.0)
+    assert out[0, 0] == pytest.approx(100 * (1 - 0.5 ** DEFAULT_FRAME_DT), rel=1e-5)
+
+
+def test_heatmap_resets_when_tile_count_changes():
+    heat = DensityHeatmap()
+    heat.update(np.zeros((1, 4)), 0.0, 10.0)
+    np.testing.assert_array_equal(heat.update(np.full((2, 2), 7.0), 1.0, 10.0), np.full((2, 2), 7.0))
+
+
+def test_encode_round_trip():
+    heat = np.array([[0.0, 3.0, 15.2], [0.25, 99.9, 100.0]], np.float32)
+    text = encode_tiles(heat)
+    assert text.startswith("3x2:") and len(text) == 4 + 2 * 6
+    np.testing.assert_allclose(decode_tiles(text), heat, atol=0.25)
+    assert encode_tiles(np.array([[0.0, 3.0, 15.0, 1.0]])) == "4x1:00061e02"
+
+
+def test_draw_heatmap_clips_to_image():
+    img = np.zeros((50, 50, 3), np.uint8)
+    draw_heatmap(img, np.array([[0.0, 50.0]], np.float32), (30, 30, 80, 80))
+    assert img[:30].max() == 0 and img[:, :30].max() == 0 and img[30:, 30:].max() > 0
+    assert draw_heatmap(img, np.ones((1, 1)), (60, 60, 90, 90)) is img
@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import events
+from events import Event, EventStore, connect, prune, query_events
+
+T0 = 1_700_000_000.0
+
+
+def store_events(path, items, **kwargs):
+    store = EventStore(str(path), flush_interval=0.05, **kwargs)
+    store.start()
+    for e in items:
+        store.record(e)
+    store.close()
+    assert store.last_error is None
+    return store
+
+
+def sample(i, station="L1", **kwargs):
+    kwargs.setdefault("config", {"edge": 50, "rois": ("ROI1",)})
+    return Event(T0 + i, station, 10 + i, i / 10, window_start=T0 + i - 5, hit_rois=("ROI1",),
+                 rois={"ROI1": (10 + i, i / 10)}, **kwargs)
+
+
+def test_insert_and_query(tmp_path):
+    db = tmp_path / "events.db"
+    items = [sample(i, "L1" if i % 2 else "L2") for i in range(10)]
+    store = store_events(db, items)
+    assert store.written == 10
+    rows = query_events(str(db))
+    assert [r["ts"] for r in rows] == [T0 + i for i in reversed(range(10))]  # 新的在前
+    assert [r["ts"] - T0 for r in query_events(str(db), start=T0 + 3, end=T0 + 7)] == [6, 5, 4, 3]
+    assert {r["station"] for r in query_events(str(db), station="L2")} == {"L2"}
+    assert [r["defect_count"] for r in query_events(str(db), min_count=17)] == [19, 18, 17]
+    assert len(query_events(str(db), limit=3)) == 3
+    row = query_events(str(db), with_config=True)[0]
+    assert json.loads(row["rois"]) == {"ROI1": [19.0, 0.9]} and row["hit_rois"] == "ROI1"
+    assert json.loads(row["config"]) == {"edge": 50, "rois": ["ROI1"]}
+
+
+def test_identical_configs_are_stored_once(tmp_path):
+    db = tmp_path / "events.db"
+    store_events(db, [sample(i) for i in range(5)] + [Event(T0, "L1", 1, 0.1, config={"edge": 60}),
+                                                     Event(T0, "L1", 1, 0.1)])
+    conn = connect(str(db))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM configs").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def test_missing_database(tmp_path):
+    assert query_events(str(tmp_path / "none.db")) == []
+
+
+def test_prune_removes_old_events_and_their_files(tmp_path):
+    db = tmp_path / "events.db"
+    old_image, new_image = tmp_path / "old.jpg", tmp_path / "new.jpg"
+    for f in (old_image, new_image, tmp_path / "clip_main.avi", tmp_path / "clip_jig.avi"):
+        f.write_bytes(b"x")
+    store_events(db, [sample(0, image_path=str(old_image), clip_stem=str(tmp_path / "clip")),
+                      sample(1, image_path=str(tmp_path / "gone.jpg")),
+                      sample(100, image_path=str(new_image), config={"edge": 70})])
+    conn = connect(str(db))
+    try:
+        assert prune(conn, T0 + 50, chunk=1) == 2
+        assert conn.execute("SELECT COUNT(*) FROM configs").fetchone()[0] == 1
+    finally:
+        conn.close()
+    assert sorted(p for p in os.listdir(tmp_path) if not p.startswith("events.db")) == ["new.jpg"]
+    assert [r["ts"] for r in query_events(str(db))] == [T0 + 100]
+
+
+def test_prune_keeps_events_whose_files_cannot_be_removed(tmp_path, monkeypatch):
+    db = tmp_path / "events.db"
+    image = tmp_path / "locked.jpg"
+    image.write_bytes(b"x")
+    store_events(db, [sample(0, image_path=str(image)), sample(1)])
+    real_remove = os.remove
+
+    def locked(path):
+        if path == str(image):
+            raise PermissionError(path)
+        real_remove(path)
+
+    monkeypatch.setattr(events.os, "remove", locked)
+    conn = connect(str(db))
+    try:
+        assert prune(conn, T0 + 50) == 1
+    finally:
+        conn.close()
+    assert [r["image_path"] for r in query_events(str(db))] == [str(image)]
+
+
+def test_failed_batch_is_reported_and_store_keeps_running(tmp_path):
+    db = tmp_path / "events.db"
+    store = EventStore(str(db), flush_interval=0.05)
+    store.start()
+    store.record(Event(T0, "L1", "many", 0.0))  # int("many") 失敗
+    store.record(sample(1))
+    store.close()
+    assert isinstance(store.last_error, ValueError)
+    store_events(db, [sample(2)])
+    stamps = [r["ts"] for r in query_events(str(db))]
+    assert stamps[0] == T0 + 2 and T0 not in stamps
+
+
+def test_schema_version(tmp_path):
+    conn = connect(str(tmp_path / "events.db"))
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == events.SCHEMA_VERSION
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO events (ts, station, defect_count) VALUES (NULL, 'L1', 1)")
+    finally:
+        conn.close()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from gradient import BACKENDS, GradientBackend, measure_backend_delta
+
+KSIZES = range(1, 32, 2)  # 滑桿與設定檔驗證允許的所有核心大小
+
+
+def sample_images():
+    """平坦區域 + 邊緣 + 雜訊：大核心在平坦區域的抵消誤差、邊緣的飽和都會出現"""
+    rng = np.random.default_rng(0)
+    flat = np.full((120, 160), 90, np.uint8)
+    flat[40:80, 50:110] = 200
+    noise = rng.integers(0, 256, (120, 160), dtype=np.uint8)
+    ramp = np.tile(np.linspace(0, 255, 160).astype(np.uint8), (120, 1))
+    return {"flat": flat, "noise": noise, "ramp": ramp}
+
+
+@pytest.mark.parametrize("ksize", KSIZES)
+@pytest.mark.parametrize("name", sorted(sample_images()))
+def test_f32_l2_matches_f64_within_one_level(name, ksize):
+    gray = sample_images()[name]
+    report = measure_backend_delta(gray, ksize)["f32_l2"]
+    assert report["max_abs"] <= 1
+    assert abs(report["wrinkle_delta"]) < 1.0
+
+
+@pytest.mark.parametrize("ksize", KSIZES)
+def test_f32_l2_only_rounds_up(ksize):
+    gray = sample_images()["noise"]
+    ref = GradientBackend("f64").compute(gray, ksize).astype(np.int16)
+    out = GradientBackend("f32_l2").compute(gray, ksize).astype(np.int16)
+    assert set(np.unique(out - ref)) <= {0, 1}
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_buffers_follow_shape_and_ksize_changes(name):
+    backend = GradientBackend(name)
+    images = sample_images()
+    for gray, ksize in ((images["flat"], 3), (images["noise"][:60, :80], 31), (images["ramp"], 5)):
+        out = backend.compute(gray, ksize)
+        assert out.dtype == np.uint8 and out.shape == gray.shape
+        np.testing.assert_array_equal(out, GradientBackend(name).compute(gray, ksize))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        GradientBackend("f16")
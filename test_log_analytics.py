@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from log_analytics import LOG_DTYPE, LogAnalyzer, analyze, load_logs, log_series
+from log_writer import LogWriter
+
+T0 = 1_700_000_000.0
+
+
+def write_log(path, rows, **kwargs):
+    """rows：(相對秒數, 區塊數, 皺褶%)"""
+    writer = LogWriter(str(path), flush_interval=0.05, **kwargs)
+    writer.start()
+    for t, count, wrinkle in rows:
+        writer.write(T0 + t, count, wrinkle, {"ROI1": (count, wrinkle)}, (10.0, 5.0, 2.0, 45.0))
+    writer.close()
+    return writer
+
+
+def exceeding(start, stop, count=30):
+    return [(t, count if start <= t < stop else 0, 1.0) for t in np.arange(0, 60, 0.5)]
+
+
+@pytest.mark.parametrize("ext", [".txt", ".wrkl"])
+def test_round_trip(tmp_path, ext):
+    rows = [(t, int(t) % 40, t / 10) for t in range(100)]
+    write_log(tmp_path / f"wrinkle_a{ext}", rows)
+    data = load_logs([str(tmp_path / f"wrinkle_a{ext}")])
+    assert len(data) == 100
+    np.testing.assert_allclose(data["ts"], [T0 + t for t, _, _ in rows], atol=1e-3)
+    np.testing.assert_array_equal(data["count"], [c for _, c, _ in rows])
+    np.testing.assert_allclose(data["wrinkle"], [w for _, _, w in rows], rtol=1e-5)
+    if ext == ".txt":
+        assert np.all(data["length"] == 10.0)
+    else:
+        assert np.isnan(data["length"]).all()
+
+
+def test_overlapping_station_logs_are_tracked_separately(tmp_path):
+    # L1 在 40~49.5 秒超標、L2 在 1~10.5 秒超標：兩檔時間重疊，不能接成倒退的一段
+    write_log(tmp_path / "wrinkle_x.txt", exceeding(40, 50))
+    write_log(tmp_path / "wrinkle_x_L2.txt", exceeding(1, 11))
+    a = analyze([str(tmp_path / "wrinkle_x.txt"), str(tmp_path / "wrinkle_x_L2.txt")], trigger_count=20, period=0.5)
+    assert a.event_count == 2
+    assert [round(e[0] - T0, 1) for e in a.events] == [1.0, 40.0]
+    assert a.event_seconds == pytest.approx(20.0)
+    assert a.summary()["exceed_seconds"] == pytest.approx(20.0)
+
+
+def test_run_continues_across_rotated_files(tmp_path):
+    rows = [(t, 30 if 10 <= t < 30 else 0, 1.0) for t in range(40)]
+    writer = write_log(tmp_path / "wrinkle_r.txt", rows[:20])
+    assert writer.paths == [str(tmp_path / "wrinkle_r.txt")]
+    write_log(tmp_path / "wrinkle_r_001.txt", rows[20:])
+    assert log_series(str(tmp_path / "wrinkle_r_001.txt")) == log_series(str(tmp_path / "wrinkle_r.txt"))
+    a = analyze([str(tmp_path / "wrinkle_r_001.txt"), str(tmp_path / "wrinkle_r.txt")], trigger_count=20)
+    assert a.event_count == 1
+    assert a.events[0][2] == pytest.approx(20.0)
+
+
+def test_time_going_backwards_breaks_a_run():
+    a = LogAnalyzer(trigger_count=20)
+    chunk = np.zeros(6, LOG_DTYPE)
+    chunk["ts"] = T0 + np.array([10, 11, 12, 3, 4, 5])
+    chunk["count"] = 30
+    a.feed(chunk)
+    a.finish()
+    assert [e[2] for e in a.events] == [3.0, 3.0]
+
+
+def test_events_split_by_gap_and_chunks():
+    a = LogAnalyzer(trigger_count=20, max_gap=5)
+    ts = T0 + np.concatenate((np.arange(0, 10), np.arange(20, 25)))
+    data = np.zeros(len(ts), LOG_DTYPE)
+    data["ts"] = ts
+    data["count"] = 25
+    for i in range(0, len(data), 4):  # 區間跨過塊的邊界
+        a.feed(data[i:i + 4])
+    a.finish()
+    assert [(e[0] - T0, e[2]) for e in a.events] == [(0.0, 10.0), (20.0, 5.0)]
+    assert a.summary()["percentiles"]["count"][50] == 25
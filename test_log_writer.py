@@ -0,0 +1,57 @@
+import numpy as np
+
+import log_writer
+from log_analytics import load_logs, log_series
+from log_writer import BIN_DTYPE, BIN_MAGIC, LogWriter
+
+T0 = 1_700_000_000.0
+
+
+def write(path, n, **kwargs):
+    writer = LogWriter(str(path), flush_interval=0.05, flush_rows=1, **kwargs)
+    writer.start()
+    for i in range(n):
+        writer.write(T0 + i, i, 1.5)
+    writer.close()
+    assert writer.last_error is None
+    return writer
+
+
+def test_existing_files_are_not_truncated(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"old")
+    (tmp_path / "a_001.txt").write_bytes(b"old 1")
+    writer = write(tmp_path / "a.txt", 3)
+    assert writer.paths == [str(tmp_path / "a_002.txt")]
+    assert (tmp_path / "a.txt").read_bytes() == b"old"
+    assert (tmp_path / "a_001.txt").read_bytes() == b"old 1"
+    assert log_series(writer.paths[0]) == log_series(str(tmp_path / "a.txt"))
+
+
+def test_rotation_skips_existing_files(tmp_path):
+    (tmp_path / "b_002.wrkl").write_bytes(b"old 2")
+    writer = write(tmp_path / "b.wrkl", 9, max_bytes=len(BIN_MAGIC) + 3 * np.dtype(BIN_DTYPE).itemsize)
+    assert [p[len(str(tmp_path)) + 1:] for p in writer.paths] == ["b.wrkl", "b_001.wrkl", "b_003.wrkl"]
+    assert (tmp_path / "b_002.wrkl").read_bytes() == b"old 2"
+    assert list(load_logs(writer.paths)["count"]) == list(range(9))
+
+
+def test_overwrite_only_applies_to_the_chosen_file(tmp_path):
+    (tmp_path / "c.txt").write_bytes(b"old")
+    (tmp_path / "c_001.txt").write_bytes(b"old 1")
+    writer = write(tmp_path / "c.txt", 4, overwrite=True, max_bytes=200)
+    assert writer.paths[0] == str(tmp_path / "c.txt") and str(tmp_path / "c_001.txt") not in writer.paths
+    assert (tmp_path / "c_001.txt").read_bytes() == b"old 1"
+    assert len(load_logs(writer.paths)) == 4
+
+
+def test_gives_up_when_every_suffix_is_taken(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_writer, "MAX_ROTATIONS", 2)
+    for name in ("d.txt", "d_001.txt", "d_002.txt"):
+        (tmp_path / name).write_bytes(b"old")
+    writer = LogWriter(str(tmp_path / "d.txt"), flush_interval=0.05)
+    writer.start()
+    writer.write(T0, 1, 1.0)
+    writer.close()
+    assert isinstance(writer.last_error, FileExistsError)
+    assert writer.paths == []
+    assert all((tmp_path / name).read_bytes() == b"old" for name in ("d.txt", "d_001.txt", "d_002.txt"))
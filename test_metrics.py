@@ -0,0 +1,49 @@
+import pickle
+
+import pytest
+
+from metrics import LatencyHistogram, MetricsRegistry, RateMeter
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = LatencyHistogram(buckets_ms=(1, 10, 100))
+    for ms in (0.5, 0.5, 5, 50, 500):
+        hist.observe(ms / 1000)
+    assert hist.counts == [2, 1, 1, 1]  # 超過最後一格算在 +Inf
+    assert hist.quantile(0.4) == 1
+    assert hist.quantile(0.6) == 10
+    assert hist.quantile(1.0) == pytest.approx(500)  # +Inf 桶以最大值估計
+    samples = {(name, labels.get("le")): value for name, labels, value in hist.samples("x")}
+    assert samples[("x_bucket", "0.01")] == 3  # 累計
+    assert samples[("x_bucket", "+Inf")] == 5
+    assert samples[("x_count", None)] == 5
+    assert samples[("x_sum", None)] == pytest.approx(0.556)
+
+
+def test_histogram_survives_pickle():
+    # 多行程模式由分析行程把直方圖送回 UI 行程
+    hist = LatencyHistogram()
+    hist.observe(0.002)
+    copy = pickle.loads(pickle.dumps(hist))
+    copy.observe(0.003)
+    assert copy.count == 2 and hist.count == 1
+
+
+def test_rate_meter_uses_only_the_window():
+    meter = RateMeter(window=5.0)
+    for t in (0, 1, 10, 10.5, 11):
+        meter.tick(t)
+    assert meter.rate(11) == pytest.approx(2.0)
+    assert meter.rate(100) == 0.0
+    assert meter.total == 5
+
+
+def test_registry_prefixes_and_reports_collector_errors():
+    registry = MetricsRegistry()
+    registry.register(lambda: [("fps", {"station": "L1"}, 12.5)])
+    registry.register(lambda: 1 / 0)
+    assert registry.to_dict() == {
+        'wrinkle_fps{station="L1"}': 12.5,
+        'wrinkle_collector_errors{error="ZeroDivisionError"}': 1,
+    }
+    assert 'wrinkle_fps{station="L1"} 12.5\n' in registry.prometheus_text()
@@ -0,0 +1,121 @@
+import multiprocessing as mp
+import time
+
+import numpy as np
+import pytest
+
+from multiproc import SharedFrames
+
+
+@pytest.fixture
+def frames():
+    frames = SharedFrames.create(4, 64 * 48 * 3)
+    yield frames
+    frames.close()
+
+
+def put(frames, img, ts=0.0, shape=None):
+    i, view = frames.begin_write(shape)
+    if view is not None:
+        view[...] = img
+        img = view
+    assert frames.commit(i, view, img, ts)
+    return int(frames.state["latest"][0])
+
+
+def test_round_trip(frames):
+    color = np.arange(48 * 64 * 3, dtype=np.uint32).astype(np.uint8).reshape(48, 64, 3)
+    assert put(frames, color, 1.5) == 1
+    seq, ts, out = frames.read()
+    assert (seq, ts) == (1, 1.5)
+    np.testing.assert_array_equal(out, color)
+    gray = np.full((10, 20), 7, np.uint8)
+    put(frames, gray, 2.0)
+    np.testing.assert_array_equal(frames.read(1)[2], gray)
+    assert frames.read(2) is None  # 沒有更新的
+
+
+def test_write_in_place(frames):
+    put(frames, np.zeros((48, 64, 3), np.uint8))
+    i, view = frames.begin_write((48, 64, 3))
+    assert view is not None and np.shares_memory(view, frames.data)
+    view[...] = 9
+    assert frames.commit(i, view, view, 3.0)
+    assert frames.read()[2].max() == 9
+
+
+def test_too_large(frames):
+    i, view = frames.begin_write((100, 100, 3))
+    assert view is None
+    assert not frames.commit(i, view, np.zeros((100, 100, 3), np.uint8), 0.0)
+    assert frames.read() is None
+
+
+def test_overwritten_slots_and_dropped(frames):
+    for k in range(1, 7):
+        put(frames, np.full((4, 4), k, np.uint8))
+    assert frames.read(seq=2) is None      # 槽位已被覆寫
+    assert frames.read(seq=3) is None      # 下一張要寫進這一格，也不讀
+    assert frames.read(seq=4)[2][0, 0] == 4
+    seq, _, img = frames.read(2, count_dropped=True)
+    assert seq == 6 and img[0, 0] == 6
+    assert frames.state["dropped"][0] == 3
+
+
+def test_frame_overwritten_while_copying_is_rejected(frames):
+    """讀取端複製途中寫入端繞回同一格：seqlock 的序號檢查要丟掉這張"""
+    for k in range(1, 4):
+        put(frames, np.full((4, 4), k, np.uint8))
+    data = frames.data
+
+    class Racing:
+        def __getitem__(self, key):
+            view = data[key]
+            frames.data = data
+            for k in range(4, 4 + frames.slots):  # 繞一圈，覆寫正在讀的那一格
+                put(frames, np.full((4, 4), k, np.uint8))
+            return view
+
+    frames.data = Racing()
+    assert frames.read(seq=3) is None
+    assert frames.read()[2][0, 0] == 3 + frames.slots
+
+
+def _writer(name, slots, slot_bytes, count, done):
+    frames = SharedFrames.attach(name, slots, slot_bytes)
+    try:
+        shape = None
+        for k in range(1, count + 1):
+            i, view = frames.begin_write(shape)
+            img = np.full((480, 640, 3), k % 256, np.uint8) if view is None else view
+            if view is not None:
+                view[...] = k % 256
+            frames.commit(i, view, img, float(k))
+            shape = img.shape
+    finally:
+        frames.close()
+        done.set()
+
+
+def test_reader_never_sees_a_torn_frame():
+    # 只有兩格、影格夠大：讀取端複製的同時，寫入端很快就會繞回同一格
+    frames = SharedFrames.create(2, 640 * 480 * 3)
+    ctx = mp.get_context("spawn")
+    done = ctx.Event()
+    proc = ctx.Process(target=_writer, args=(frames.shm.name, frames.slots, frames.slot_bytes, 3000, done))
+    proc.start()
+    reads = 0
+    last = 0
+    deadline = time.monotonic() + 30
+    while (not done.is_set() or reads == 0) and time.monotonic() < deadline:
+        item = frames.read(last)
+        if item is None:
+            continue
+        seq, ts, img = item
+        assert ts == float(seq)
+        assert img.min() == img.max() == seq % 256, "讀到寫到一半的影格"
+        last = seq
+        reads += 1
+    proc.join(10)
+    frames.close()
+    assert proc.exitcode == 0 and reads > 10
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from config import ConfigError
+from stations import Smoother, TriggerState, load_station_configs
+
+
+class FakeStation:
+    """只記下建構參數，不開攝影機"""
+
+    def __init__(self, name, main_source, jig_source=None, detector=None, target_fps=15, **kwargs):
+        self.name, self.main_source, self.jig_source = name, main_source, jig_source
+        self.detector, self.target_fps, self.settings = detector, target_fps, kwargs
+
+
+class FakeDetector:
+    def __init__(self, base, rois):
+        self.base, self.rois = base, rois
+
+
+def load(tmp_path, items):
+    path = tmp_path / "stations.json"
+    path.write_text(json.dumps(items), encoding="utf-8")
+    return load_station_configs(str(path), (320, 240), FakeStation, FakeDetector)
+
+
+def test_missing_file(tmp_path):
+    assert load_station_configs(str(tmp_path / "stations.json")) == []
+
+
+def test_valid_file(tmp_path):
+    stations = load(tmp_path, [
+        {"name": "L2", "main_cam": 3, "jig_cam": 4, "fps": 5, "gradient": "f32_l2", "threshold_mode": "percentile",
+         "main_settings": {"width": 1280, "height": 720, "fourcc": "MJPG"},
+         "rois": [{"name": "A", "roi": [0.1, 0.1, 0.5, 0.5], "ksize": 5}]},
+        {"main_cam": "line3.mp4"},
+    ])
+    l2, l3 = stations
+    assert (l2.name, l2.main_source, l2.jig_source, l2.target_fps) == ("L2", 3, 4, 5.0)
+    assert l2.detector.base.gradient == "f32_l2" and l2.detector.base.threshold_mode == "percentile"
+    assert [(r.name, r.sobel_ksize) for r in l2.detector.rois] == [("A", 5)]
+    assert l2.settings["main_settings"].width == 1280
+    assert (l3.name, l3.main_source, l3.jig_source, l3.detector.rois) == ("L3", "line3.mp4", None, [])
+
+
+@pytest.mark.parametrize("item, field", [
+    ({"main_cam": 1, "rois": [{"ksize": 4}]}, "[0].rois[0].ksize"),
+    ({"main_cam": 1, "gradient": "f16"}, "[0].gradient"),
+    ({"main_cam": 1, "blobs": "x"}, "[0].blobs"),
+    ({"main_cam": 1, "threshold_mode": "auto"}, "[0].threshold_mode"),
+    ({"main_cam": 1, "main_settings": {"width": "wide"}}, "[0].main_settings.width"),
+    ({"main_cam": 1, "fps": 0}, "[0].fps"),
+    ({"main_cam": -1}, "[0].main_cam"),
+    ({"jig_cam": 2}, "[0].main_cam"),
+    ({"main_cam": 1, "ksize": 3}, "[0].ksize"),
+])
+def test_invalid_entries(tmp_path, item, field):
+    with pytest.raises(ConfigError) as info:
+        load(tmp_path, [item])
+    assert any(e.startswith(field) for e in info.value.errors), info.value.errors
+    assert "stations.json" in str(info.value)
+
+
+def test_all_errors_are_reported(tmp_path):
+    with pytest.raises(ConfigError) as info:
+        load(tmp_path, [{"name": "L2", "main_cam": 1, "gradient": "f16"},
+                        {"name": "L2", "main_cam": 2, "rois": [{"ksize": 2}]}])
+    assert len(info.value.errors) == 3  # gradient、重複的站名、ksize
+
+
+@pytest.mark.parametrize("text", ["{not json", '{"main_cam": 1}'])
+def test_bad_format(tmp_path, text):
+    path = tmp_path / "stations.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ConfigError):
+        load_station_configs(str(path))
+
+
+def test_smoother_modes():
+    ema = Smoother("ema", alpha=0.5)
+    assert ema.update("A", 10, 1.0) == (10.0, 1.0)
+    assert ema.update("A", 20, 3.0) == (15.0, 2.0)
+    assert ema.update("B", 0, 0.0) == (0.0, 0.0)  # 每個 ROI 各自平滑
+    median = Smoother("median", window=3)
+    assert [median.update("A", c, c / 10)[0] for c in (5, 100, 6, 7, 8)] == [5, 52.5, 6, 7, 7]
+    assert Smoother("off").update("A", 3, 0.5) == (3, 0.5)
+
+
+def test_smoother_configure_resets_state():
+    s = Smoother("ema", alpha=0.1)
+    s.update("A", 100, 1.0)
+    s.configure(alpha=0.5)
+    assert s.update("A", 10, 1.0) == (10.0, 1.0)
+
+
+def test_trigger_needs_a_continuous_window_and_a_gap():
+    t0 = 1_700_000_000
+    t = TriggerState()
+    hits = [now - t0 for now in range(t0, t0 + 21) if t.update(True, now, 5, 10)]
+    assert hits == [5, 15]  # 連續 5 秒才截圖，之後每 10 秒一張
+    assert not t.update(False, t0 + 21, 5, 10)
+    assert [now - t0 for now in range(t0 + 22, t0 + 30) if t.update(True, now, 5, 10)] == [27]  # 中斷後重新計時
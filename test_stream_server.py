@@ -0,0 +1,63 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+import stream_server
+from stream_server import StreamServer
+
+
+@pytest.fixture
+def server():
+    server = StreamServer(port=0, fps=20)
+    server.start()
+    server.ready.wait(5)
+    yield server
+    server.stop()
+    server.join(5)
+
+
+def fake_ui(server, stop, published):
+    """模擬 UI 迴圈：只有 wants_frame() 時才複製並送出畫面"""
+    while not stop.is_set():
+        if server.wants_frame():
+            server.publish_frame(np.zeros((48, 64, 3), np.uint8))
+            published.append(time.monotonic())
+        time.sleep(0.01)
+
+
+def get(server, path):
+    return urllib.request.urlopen(f"http://127.0.0.1:{server.port}{path}", timeout=5)
+
+
+def test_snapshot_without_mjpeg_viewer_encodes_a_fresh_frame(server):
+    stop, published = threading.Event(), []
+    ui = threading.Thread(target=fake_ui, args=(server, stop, published))
+    ui.start()
+    try:
+        time.sleep(0.2)
+        assert published == []  # 沒有人看就不送
+        for _ in range(2):
+            with get(server, "/snapshot.jpg") as resp:
+                assert resp.headers["Content-Type"] == "image/jpeg"
+                assert resp.read(2) == b"\xff\xd8"
+                assert 0 <= float(resp.headers["X-Frame-Age"]) < 0.5
+            time.sleep(0.3)  # 上一張變舊之後再要一次，也要是新的
+        count = len(published)
+        assert server.frames_encoded == count >= 2
+        time.sleep(0.2)
+        assert len(published) == count and server.snapshot_waiters == 0  # 要完快照就停
+    finally:
+        stop.set()
+        ui.join()
+
+
+def test_snapshot_times_out_without_frames(server, monkeypatch):
+    monkeypatch.setattr(stream_server, "SNAPSHOT_TIMEOUT", 0.2)
+    with pytest.raises(urllib.error.HTTPError) as info:
+        get(server, "/snapshot.jpg")
+    assert info.value.code == 503
+    assert server.snapshot_waiters == 0
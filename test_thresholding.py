@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+
+from thresholding import LEVEL_RANGE, AutoThreshold, otsu_levels, percentile_levels
+from wrinkle_detector import DetectorParams
+
+
+def histogram(img):
+    return np.bincount(img.ravel(), minlength=256).astype(np.float64)[None, :]
+
+
+def gradient_like(shape=(120, 160), scale=20.0, seed=0):
+    """多數是弱梯度、少數強梯度的 uint8 影像"""
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.exponential(scale, shape), 0, 255).astype(np.uint8)
+
+
+def test_otsu_matches_opencv():
+    rng = np.random.default_rng(1)
+    img = np.concatenate((rng.normal(60, 10, 4000), rng.normal(170, 15, 2000))).clip(0, 255).astype(np.uint8)
+    level, _ = cv2.threshold(img.reshape(1, -1), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    assert abs(otsu_levels(histogram(img))[0] - level) <= 1
+
+
+@pytest.mark.parametrize("p", [50, 90, 99, 99.9])
+def test_percentile_matches_numpy(p):
+    img = gradient_like()
+    assert abs(percentile_levels(histogram(img), p)[0] - np.percentile(img, p)) <= 1
+
+
+def test_histogram_is_smoothed_over_frames():
+    params = DetectorParams(threshold_mode="percentile", auto_percentile=95, auto_alpha=0.05)
+    auto = AutoThreshold()
+    for _ in range(5):
+        _, quiet = auto.apply(gradient_like(), params)
+    _, burst = auto.apply(gradient_like(scale=80.0), params)
+    assert burst - quiet < 0.25 * quiet  # 突然變亮的一張不會把門檻一下拉高
+    for _ in range(200):
+        _, level = auto.apply(gradient_like(scale=80.0), params)
+    assert level == pytest.approx(np.percentile(gradient_like(scale=80.0), 95), abs=3)
+
+
+def test_thresholded_pixels_are_above_the_level():
+    params = DetectorParams(threshold_mode="otsu")
+    sobel = gradient_like()
+    thresh, level = AutoThreshold().apply(sobel, params)
+    np.testing.assert_array_equal(thresh > 0, sobel > level)
+
+
+def test_adaptive_tiles_follow_uneven_lighting():
+    sobel = np.hstack((gradient_like(scale=5.0), gradient_like(scale=60.0, seed=1)))
+    auto = AutoThreshold()
+    thresh, _ = auto.apply(sobel, DetectorParams(threshold_mode="percentile", auto_percentile=95, adaptive_tiles=2))
+    left, right = auto.levels.reshape(2, 2).mean(axis=0)
+    assert right > 3 * left
+    # 兩邊各自約有 5% 是白點，不會全部集中在梯度大的一邊
+    assert 0.01 < (thresh[:, :160] > 0).mean() < 0.15 and 0.01 < (thresh[:, 160:] > 0).mean() < 0.15
+
+
+def test_levels_are_clamped():
+    auto = AutoThreshold()
+    _, level = auto.apply(np.zeros((40, 40), np.uint8), DetectorParams(threshold_mode="percentile"))
+    assert level == LEVEL_RANGE[0]
+
+
+def test_history_resets_when_the_roi_changes():
+    params = DetectorParams(threshold_mode="percentile", auto_percentile=95)
+    auto = AutoThreshold()
+    for _ in range(5):
+        auto.apply(gradient_like(scale=5.0), params)
+    sobel = gradient_like((60, 80), scale=60.0)
+    _, level = auto.apply(sobel, params)
+    assert level == AutoThreshold().apply(sobel, params)[1]  # 與重新開始累積的結果相同
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+import pytest
+
+from wrinkle_detector import DetectorParams, MultiRoiDetector, RoiSpec, WrinkleDetector
+
+
+def frames(n=24, seed=0):
+    """雜訊底 + 每張不同位置的斜紋；每隔幾張重複一次，skip_diff 才有東西可沿用"""
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        if i % 4 == 3:
+            out.append(out[-1].copy())
+            continue
+        img = rng.integers(60, 120, (240, 320, 3), dtype=np.uint8)
+        for k in range(i % 5 + 1):
+            x = 90 + 25 * k + 3 * i % 20
+            img[70:170, x:x + 3] = 230
+        out.append(img)
+    return out
+
+
+def summary(results):
+    return [(r.defect_count, round(r.wrinkle, 6), r.threshold, r.reused,
+             None if r.heatmap is None else r.heatmap.round(6).tolist()) for r in results]
+
+
+@pytest.mark.parametrize("params", [
+    DetectorParams(),
+    DetectorParams(gradient="f32_l2", blobs="components", sobel_ksize=5),
+    DetectorParams(skip_diff=0.5),
+    DetectorParams(threshold_mode="percentile"),
+    DetectorParams(threshold_mode="otsu", adaptive_tiles=2),
+    DetectorParams(density_cols=4, density_rows=2),
+], ids=["fixed", "backends", "skip_diff", "percentile", "otsu_tiles", "density"])
+def test_parallel_batch_matches_sequential(params):
+    sequential = summary(WrinkleDetector(params).process_batch(frames(), workers=1))
+    parallel = summary(WrinkleDetector(params).process_batch(frames(), workers=4))
+    assert parallel == sequential
+
+
+def test_stateful_params():
+    assert not DetectorParams().stateful
+    assert not DetectorParams(gradient="f32_l2", full_res=True).stateful
+    for changes in ({"skip_diff": 1.0}, {"threshold_mode": "otsu"}, {"density_cols": 8}):
+        assert DetectorParams(**changes).stateful
+
+
+def baseline(frame, edge, min_area, ksize, roi=(80, 60, 160, 120)):
+    """拆出引擎前 update_frame 的處理流程（320x240、CV_64F Sobel、findContours）"""
+    frame = cv2.resize(frame, (320, 240))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    x0, y0, w0, h0 = roi
+    roi_gray = gray[y0:y0 + h0, x0:x0 + w0]
+    sobel = cv2.magnitude(cv2.Sobel(roi_gray, cv2.CV_64F, 1, 0, ksize=ksize),
+                          cv2.Sobel(roi_gray, cv2.CV_64F, 0, 1, ksize=ksize))
+    sobel = np.uint8(np.clip(sobel, 0, 255))
+    _, thresh = cv2.threshold(sobel, edge, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = sorted((x0 + x, y0 + y, w, h) for x, y, w, h in
+                   (cv2.boundingRect(c) for c in contours if cv2.contourArea(c) > min_area))
+    wrinkle = cv2.countNonZero(thresh) / thresh.size * 100
+    return len(boxes), wrinkle, boxes
+
+
+@pytest.mark.parametrize("edge, min_area, ksize", [(50, 200, 3), (30, 50, 5), (120, 0, 1), (80, 20, 7)])
+def test_detector_matches_baseline_pipeline(edge, min_area, ksize):
+    detector = WrinkleDetector(DetectorParams(edge_threshold=edge, min_area=min_area, sobel_ksize=ksize))
+    for frame in frames(8) + [cv2.resize(f, (640, 480)) for f in frames(4, seed=1)]:
+        count, wrinkle, boxes = baseline(frame, edge, min_area, ksize)
+        result = detector.process(frame, annotate=False)
+        assert result.defect_count == count
+        assert result.wrinkle == pytest.approx(wrinkle)
+        assert sorted(tuple(b) for b in result.boxes) == boxes
+
+
+def test_annotate_outputs_preview_sized_images():
+    result = WrinkleDetector().process(cv2.resize(frames(1)[0], (640, 480)))
+    assert result.frame.shape == (240, 320, 3) and result.gray.shape == (240, 320)
+    assert result.annotated.shape == (240, 320, 3)
+    assert result.sobel.shape == result.thresh.shape == (120, 160)
+
+
+def test_multi_roi_matches_single_roi_detectors():
+    rois = (RoiSpec("A", (0.1, 0.1, 0.4, 0.5), 40, 50, 3), RoiSpec("B", (0.5, 0.2, 0.45, 0.6), 70, 100, 5),
+            RoiSpec("C", (0.3, 0.6, 0.3, 0.3), 30, 0, 1))
+    multi = MultiRoiDetector(DetectorParams(), rois, workers=3)
+    try:
+        for frame in frames(6):
+            result = multi.process(frame, ts=1.0)
+            assert list(result.rois) == ["A", "B", "C"]
+            for spec in rois:
+                single = WrinkleDetector(multi.params_for(spec)).process(frame, 1.0, annotate=False)
+                r = result.rois[spec.name]
+                assert (r.defect_count, r.wrinkle, r.boxes) == (single.defect_count, single.wrinkle, single.boxes)
+            area = {n: r.roi_px[2] * r.roi_px[3] for n, r in result.rois.items()}
+            assert result.defect_count == sum(r.defect_count for r in result.rois.values())
+            assert result.wrinkle == pytest.approx(
+                sum(r.wrinkle * area[n] for n, r in result.rois.items()) / sum(area.values()))
+            assert result.annotated.shape == (240, 320, 3)
+        multi.set_rois(rois[:1])
+        assert list(multi.process(frames(1)[0]).rois) == ["A"] and list(multi._detectors) == ["A"]
+    finally:
+        multi.close()
+
+
+def test_multi_roi_defaults_to_the_base_roi():
+    base = DetectorParams(roi=(0.2, 0.2, 0.3, 0.3), edge_threshold=60, min_area=10, sobel_ksize=5)
+    (spec,) = MultiRoiDetector(base).rois
+    assert (spec.roi, spec.edge_threshold, spec.min_area, spec.sobel_ksize) == (base.roi, 60, 10, 5)
+
+
+def test_skip_diff_reuses_results_of_unchanged_frames():
+    detector = WrinkleDetector(DetectorParams(skip_diff=1.0))
+    first, second = frames(2)
+    a = detector.process(first, annotate=False)
+    b = detector.process(first + 0, annotate=False)  # 同一張
+    c = detector.process(cv2.add(first, 1), annotate=False)  # 平均灰階差 1：不超過門檻
+    d = detector.process(second, annotate=False)
+    assert (a.reused, b.reused, c.reused, d.reused) == (False, True, True, False)
+    assert (b.defect_count, b.wrinkle) == (a.defect_count, a.wrinkle) and detector.reused == 2
+    assert d.wrinkle == WrinkleDetector().process(second, annotate=False).wrinkle
@@ -0,0 +1,94 @@
+"""
+梯度二值化門檻的自動模式，取代手動一直調整的「邊緣強度」。
+
+  fixed       原本做法：固定 edge_threshold
+  otsu        由梯度直方圖算 Otsu 門檻（平坦的底材與有紋路的區域之間自動找分界）
+  percentile  門檻取梯度直方圖的第 auto_percentile 百分位數，例如 99：只有梯度最強的 1% 可能被判為白點。
+              光線或膜材變化讓整體梯度變大 / 變小時門檻跟著移動
+
+直方圖不是每張重新算一個門檻，而是以 auto_alpha 指數平滑累積（alpha 越小越穩定），
+突然出現的皺褶不會馬上把門檻拉高而被「吃掉」，緩慢的光線變化則會被跟上。
+adaptive_tiles = N（N > 1）時 ROI 切成 N×N 格，每格各自一個直方圖與門檻，
+門檻圖以雙線性內插放大到 ROI 大小，照明不均勻（一邊亮一邊暗）時各區各自適應。
+自動門檻限制在 LEVEL_RANGE 之內，全黑或過曝的畫面不會算出 0 或 255。
+"""
+
+import cv2
+import numpy as np
+
+MODES = ("fixed", "otsu", "percentile")
+LEVEL_RANGE = (5, 250)
+
+
+def otsu_levels(hist):
+    """hist：(列數, 256)，每列一個直方圖，回傳各列的 Otsu 門檻（≤ 門檻為背景）"""
+    bins = np.arange(hist.shape[1])
+    w0 = np.cumsum(hist, axis=1)
+    m0 = np.cumsum(hist * bins, axis=1)
+    total = w0[:, -1:]
+    mean_total = m0[:, -1:]
+    denom = w0 * (total - w0)
+    between = (mean_total * w0 - m0 * total) ** 2 / np.where(denom > 0, denom, np.inf)
+    return np.argmax(between, axis=1).astype(np.float64)
+
+
+def percentile_levels(hist, percentile):
+    """hist：(列數, 256)，回傳各列第 percentile 百分位數的梯度值"""
+    cum = np.cumsum(hist, axis=1)
+    cum /= np.maximum(cum[:, -1:], 1e-12)
+    return np.argmax(cum >= percentile / 100.0, axis=1).astype(np.float64)
+
+
+class AutoThreshold:
+    """
+    單一 WrinkleDetector 使用的自動門檻狀態（不是執行緒安全的，與 GradientBackend 一樣一個引擎一個）。
+    直方圖只取每 stride 個像素，計算量約為全部像素的 1/stride²。
+    ROI 大小、格數、梯度方式或核心大小改變時重新累積。
+    """
+
+    def __init__(self, stride=2):
+        self.stride = stride
+        self.levels = None      # 最近一次的門檻（每格一個）
+        self._key = None
+        self._hist = None
+        self._tile_of = None    # 取樣點所屬格子編號 * 256
+
+    def _reset(self, key, shape, tiles):
+        self._key = key
+        self._hist = None
+        sh = -(-shape[0] // self.stride)
+        sw = -(-shape[1] // self.stride)
+        ty = np.arange(sh) * tiles // sh
+        tx = np.arange(sw) * tiles // sw
+        self._tile_of = ((ty[:, None] * tiles + tx[None, :]) * 256).astype(np.intp)
+
+    def apply(self, sobel, params):
+        """sobel：uint8 梯度強度，回傳 (二值化結果, 平均門檻)"""
+        tiles = max(1, params.adaptive_tiles)
+        key = (sobel.shape, tiles, params.sobel_ksize, params.gradient, params.threshold_mode)
+        if key != self._key:
+            self._reset(key, sobel.shape, tiles)
+
+        sample = sobel[::self.stride, ::self.stride]
+        hist = np.bincount((self._tile_of + sample).ravel(), minlength=tiles * tiles * 256)
+        hist = hist.reshape(tiles * tiles, 256).astype(np.float64)
+        hist /= np.maximum(hist.sum(axis=1, keepdims=True), 1)
+        if self._hist is None:
+            self._hist = hist
+        else:
+            self._hist += params.auto_alpha * (hist - self._hist)
+
+        if params.threshold_mode == "otsu":
+            levels = otsu_levels(self._hist)
+        else:
+            levels = percentile_levels(self._hist, params.auto_percentile)
+        self.levels = levels = np.clip(levels, *LEVEL_RANGE)
+
+        if tiles == 1:
+            _, thresh = cv2.threshold(sobel, float(levels[0]), 255, cv2.THRESH_BINARY)
+        else:
+            grid = levels.reshape(tiles, tiles).astype(np.float32)
+            level_map = cv2.resize(grid, (sobel.shape[1], sobel.shape[0]), interpolation=cv2.INTER_LINEAR)
+            # 梯度是整數：sobel > 門檻 與 sobel > floor(門檻) 相同
+            thresh = cv2.compare(sobel, level_map.astype(np.uint8), cv2.CMP_GT)
+        return thresh, float(levels.mean())
@@ -0,0 +1,407 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+import cv2
+import numpy as np
+
+from blobs import find_defects
+from density import DensityHeatmap, draw_heatmap, tile_density
+from gradient import GradientBackend
+from thresholding import AutoThreshold
+
+
+# ========= 檢測參數與結果 ==========
+@dataclass(frozen=True)
+class DetectorParams:
+    """
+    皺褶檢測參數（對應 UI 上的邊緣強度 / 最小區塊面積 / Sobel 核心 / ROI）。
+    roi 以 0~1 的比例表示，與攝影機解析度無關；min_area 以 frame_size 的像素計，
+    全解析度模式下會依面積比例換算，同一組參數在兩種模式下判斷的缺陷大小一致。
+    """
+    edge_threshold: int = 50
+    min_area: int = 200
+    sobel_ksize: int = 3
+    roi: tuple = (0.25, 0.25, 0.5, 0.5)  # (x, y, w, h)，佔整張影像的比例
+    frame_size: tuple = (320, 240)       # 縮放分析與預覽的尺寸
+    full_res: bool = False               # True：ROI 直接在原始解析度上分析
+    gradient: str = "f64"                # 梯度計算方式，見 gradient.py
+    blobs: str = "contours"              # 區塊分析方式，見 blobs.py
+    skip_diff: float = 0.0               # ROI 縮圖與上次分析時的平均灰階差 ≤ 此值就沿用上次結果；0 = 每張都分析
+    threshold_mode: str = "fixed"        # 二值化門檻：fixed 用 edge_threshold，otsu / percentile 自動，見 thresholding.py
+    auto_percentile: float = 99.0        # percentile 模式的百分位數
+    auto_alpha: float = 0.05             # 自動門檻的直方圖平滑係數（越小越穩定）
+    adaptive_tiles: int = 0              # >1：ROI 切成 N×N 格各自算自動門檻
+    density_cols: int = 0                # >0：ROI 切成 欄×列 格統計皺褶密度並累積熱度圖，見 density.py
+    density_rows: int = 1
+    density_half_life: float = 10.0      # 熱度圖衰減的半衰期（秒）
+
+    def updated(self, **changes):
+        return replace(self, **changes)
+
+    @property
+    def stateful(self):
+        """結果會受前面的影格影響（沿用上次結果、自動門檻平滑、熱度圖累積），只能依序處理"""
+        return self.skip_diff > 0 or self.threshold_mode != "fixed" or self.density_cols > 0
+
+
+@dataclass
+class DetectionResult:
+    defect_count: int
+    wrinkle: float                      # 皺褶 %（門檻後白點佔 ROI 比例）
+    boxes: list = field(default_factory=list)   # 每個缺陷框 (x, y, w, h)，image_size 座標
+    ts: float = None
+    params: DetectorParams = None
+    image_size: tuple = None            # boxes / roi_px 所在影像的 (寬, 高)
+    roi_px: tuple = None                # 實際分析的 ROI (x, y, w, h)，image_size 座標
+    frame: np.ndarray = None            # frame_size 的 BGR 預覽（annotate 時才有）
+    gray: np.ndarray = None             # 預覽的灰階（annotate 時才有）
+    sobel: np.ndarray = None            # ROI 梯度強度 (uint8)
+    thresh: np.ndarray = None           # ROI 二值化結果
+    annotated: np.ndarray = None        # 畫上缺陷框與 ROI 的影像
+    reused: bool = False                # True：畫面沒變，沿用上一次的分析結果
+    defects: np.ndarray = None          # 每個缺陷的外框與特徵（blobs.DEFECT_DTYPE），座標同 boxes
+    threshold: float = None             # 實際使用的二值化門檻（分格時為各格平均）
+    tiles: np.ndarray = None            # 分格密度模式：這張的各格白點 %，(列, 欄)
+    heatmap: np.ndarray = None          # 分格密度模式：隨時間衰減累積的各格白點 %
+
+    @property
+    def total_length(self):
+        """所有缺陷長軸長度加總（image_size 像素）"""
+        return float(self.defects["length"].sum()) if self.defects is not None else 0.0
+
+
+# ========= 檢測引擎 ==========
+CHANGE_SIG_SIZE = (32, 24)  # 判斷畫面有沒有變時比對的 ROI 縮圖大小
+
+
+class WrinkleDetector:
+    """
+    與 Tk 無關的皺褶檢測引擎。process() 只依賴傳入影格與目前參數，
+    可在分析執行緒、伺服器批次重跑錄影、或無畫面的產線電腦上使用。
+    """
+
+    def __init__(self, params=None):
+        self.params = params or DetectorParams()
+        self.timer = None   # 設定為 metrics.StageTimer 時記錄每一段的耗時
+        self.reused = 0     # 因畫面沒變而沿用結果的張數
+        self._gradient = None
+        self._auto = None
+        self._heat = None
+        self._last = None   # skip_diff 模式：上次實際分析的結果與它的 ROI 縮圖
+        self._last_sig = None
+
+    def set_params(self, params):
+        """整包替換參數；process() 每張影格只讀一次，執行緒間替換是安全的"""
+        self.params = params
+
+    def process(self, frame, ts=None, annotate=True):
+        params = self.params
+        timer = self.timer or _NO_TIMER
+        timer.start()
+        fh, fw = frame.shape[:2]
+        crop, size, (rx, ry, rw, rh) = crop_roi(frame, params)
+        timer.mark("resize")
+
+        result = sig = None
+        if params.skip_diff > 0:
+            sig = cv2.resize(crop, CHANGE_SIG_SIZE, interpolation=cv2.INTER_AREA)
+            result = self._reuse(sig, params, size, ts)
+            timer.mark("change_check")
+        if result is None:
+            result = self._analyze(crop, params, (fw, fh), size, (rx, ry, rw, rh), ts, timer)
+            self._last, self._last_sig = (result, sig) if sig is not None else (None, None)
+        if result.tiles is not None:
+            if self._heat is None:
+                self._heat = DensityHeatmap()
+            # 沿用的結果也算一張：畫面沒變，熱度照樣往這一張的密度靠
+            result.heatmap = self._heat.update(result.tiles, ts, params.density_half_life)
+        if annotate:
+            result.frame = make_preview(frame, params.frame_size)
+            result.gray = cv2.cvtColor(result.frame, cv2.COLOR_BGR2GRAY)
+            result.annotated = draw_result(result.frame.copy(), result)
+            timer.mark("annotate")
+        return result
+
+    def _reuse(self, sig, params, size, ts):
+        """
+        ROI 縮圖與上次「實際分析」時的縮圖比平均灰階差，沒超過 skip_diff 就沿用那次的結果。
+        比的是上次分析的畫面而不是上一張，緩慢變化累積起來仍會觸發重新分析。
+        """
+        last = self._last
+        if (last is None or last.params != params or last.image_size != size
+                or cv2.norm(sig, self._last_sig, cv2.NORM_L1) / sig.size > params.skip_diff):
+            return None
+        self.reused += 1
+        return replace(last, ts=ts, reused=True, frame=None, gray=None, annotated=None)
+
+    def _analyze(self, crop, params, frame_wh, size, roi_px, ts, timer):
+        fw, fh = frame_wh
+        rx, ry, rw, rh = roi_px
+        roi_gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        timer.mark("cvtColor")
+
+        if self._gradient is None or self._gradient.name != params.gradient:
+            self._gradient = GradientBackend(params.gradient)
+        sobel = self._gradient.compute(roi_gray, params.sobel_ksize, timer)
+        if params.threshold_mode == "fixed":
+            _, thresh = cv2.threshold(sobel, params.edge_threshold, 255, cv2.THRESH_BINARY)
+            level = float(params.edge_threshold)
+        else:
+            if self._auto is None:
+                self._auto = AutoThreshold()
+            thresh, level = self._auto.apply(sobel, params)
+        timer.mark("threshold")
+
+        min_area = params.min_area
+        if params.full_res:
+            min_area *= (fw * fh) / (params.frame_size[0] * params.frame_size[1])
+
+        defects = find_defects(thresh, min_area, params.blobs, (rx, ry), timer)
+        boxes = defects[["x", "y", "w", "h"]].tolist()
+
+        tiles = None
+        if params.density_cols > 0:
+            # 積分圖的右下角就是整體白點數，不必另外 countNonZero
+            tiles, white = tile_density(thresh, params.density_cols, params.density_rows)
+            timer.mark("density")
+        else:
+            white = cv2.countNonZero(thresh)
+        wrinkle = (white / (thresh.shape[0] * thresh.shape[1])) * 100
+
+        return DetectionResult(len(boxes), wrinkle, boxes, ts, params, size, (rx, ry, rw, rh),
+                               sobel=sobel, thresh=thresh, defects=defects, threshold=level, tiles=tiles)
+
+    def process_batch(self, frames, workers=1, annotate=False):
+        """
+        依序處理多張影格（list 或 generator 皆可），回傳結果 generator，順序與輸入一致。
+        workers > 1 時以執行緒池平行處理（OpenCV 運算會釋放 GIL），每條執行緒各用一個引擎；
+        參數有跨影格的狀態（params.stateful）時狀態會被拆到各執行緒，結果與依序處理不同，所以一律依序處理。
+        """
+        if workers <= 1 or self.params.stateful:
+            for frame in frames:
+                yield self.process(frame, annotate=annotate)
+            return
+
+        local = threading.local()
+        params = self.params
+
+        def run(frame):
+            det = getattr(local, "detector", None)
+            if det is None:
+                det = local.detector = type(self)(params)
+            return det.process(frame, annotate=annotate)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # 一次只送出有限數量，避免整段影片讀進記憶體
+            pending = []
+            for frame in frames:
+                pending.append(pool.submit(run, frame))
+                if len(pending) >= workers * 2:
+                    yield pending.pop(0).result()
+            for fut in pending:
+                yield fut.result()
+
+
+# ========= 多 ROI ==========
+@dataclass(frozen=True)
+class RoiSpec:
+    """一個具名 ROI 與它自己的檢測參數；其餘參數（梯度方式、解析度）沿用共用設定"""
+    name: str
+    roi: tuple = (0.25, 0.25, 0.5, 0.5)
+    edge_threshold: int = 50
+    min_area: int = 200
+    sobel_ksize: int = 3
+
+
+@dataclass
+class MultiRoiResult:
+    ts: float
+    rois: dict                          # name -> DetectionResult，順序同 RoiSpec
+    frame: np.ndarray = None
+    gray: np.ndarray = None
+    annotated: np.ndarray = None
+
+    @property
+    def defect_count(self):
+        return sum(r.defect_count for r in self.rois.values())
+
+    @property
+    def total_length(self):
+        """各 ROI 總皺褶長度加總（ROI 解析度不同時各自以自己的像素計）"""
+        return sum(r.total_length for r in self.rois.values())
+
+    @property
+    def defects(self):
+        """所有 ROI 的缺陷合在一起"""
+        parts = [r.defects for r in self.rois.values() if r.defects is not None]
+        return np.concatenate(parts) if parts else None
+
+    @property
+    def heatmaps(self):
+        """分格密度模式的 ROI：{名稱: 熱度圖}"""
+        return {name: r.heatmap for name, r in self.rois.items() if r.heatmap is not None}
+
+    @property
+    def reused(self):
+        """所有 ROI 都沿用上次結果（畫面沒變）"""
+        return all(r.reused for r in self.rois.values())
+
+    @property
+    def wrinkle(self):
+        """所有 ROI 依面積加權的皺褶 %"""
+        area = sum(r.roi_px[2] * r.roi_px[3] for r in self.rois.values())
+        if not area:
+            return 0.0
+        return sum(r.wrinkle * r.roi_px[2] * r.roi_px[3] for r in self.rois.values()) / area
+
+
+class MultiRoiDetector:
+    """
+    同一張影格上檢測多個 ROI。每個 ROI 有自己的 WrinkleDetector（各自的緩衝區），
+    多於一個 ROI 時丟到執行緒池平行跑；OpenCV 運算會釋放 GIL，可以吃滿多核。
+    """
+
+    def __init__(self, base_params=None, rois=(), workers=None):
+        self.base_params = base_params or DetectorParams()
+        self.rois = tuple(rois) or (RoiSpec("ROI1", self.base_params.roi, self.base_params.edge_threshold,
+                                            self.base_params.min_area, self.base_params.sobel_ksize),)
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.timer = None
+        self._detectors = {}
+        self._pool = None
+
+    def set_rois(self, rois, base_params=None):
+        """整包替換 ROI 清單（與共用參數），下一張影格生效"""
+        if base_params is not None:
+            self.base_params = base_params
+        self.rois = tuple(rois)
+
+    def params_for(self, spec, base=None):
+        return (base or self.base_params).updated(roi=spec.roi, edge_threshold=spec.edge_threshold,
+                                                  min_area=spec.min_area, sobel_ksize=spec.sobel_ksize)
+
+    def process(self, frame, ts=None, annotate=True):
+        base, rois = self.base_params, self.rois
+
+        def run(spec):
+            det = self._detectors.get(spec.name)
+            if det is None:
+                det = self._detectors[spec.name] = WrinkleDetector()
+            det.timer = self.timer
+            det.set_params(self.params_for(spec, base))
+            return det.process(frame, ts, annotate=False)
+
+        if len(rois) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="roi")
+            results = list(self._pool.map(run, rois))
+        else:
+            results = [run(spec) for spec in rois]
+        for name in set(self._detectors) - {spec.name for spec in rois}:
+            del self._detectors[name]
+
+        result = MultiRoiResult(ts, {spec.name: r for spec, r in zip(rois, results)})
+        if annotate:
+            timer = self.timer or _NO_TIMER
+            timer.start()
+            annotate_multi(result, frame, base.frame_size)
+            timer.mark("annotate")
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+# ========= 工具函數 ==========
+class _NullTimer:
+    def start(self):
+        pass
+
+    def mark(self, stage):
+        pass
+
+
+_NO_TIMER = _NullTimer()
+
+
+def make_preview(frame, size):
+    """預覽與分析分開：預覽固定縮到 size，原本就是這個大小時不複製"""
+    if (frame.shape[1], frame.shape[0]) == tuple(size):
+        return frame
+    return cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+
+
+def crop_roi(frame, params):
+    """
+    依參數裁切 ROI，回傳 (BGR ROI, 分析座標系的 (寬, 高), ROI 像素 (x, y, w, h))。
+    先裁切再處理：只有 ROI 做灰階轉換，縮放模式下也只縮放 ROI 那一塊。
+    """
+    fh, fw = frame.shape[:2]
+    size = (fw, fh) if params.full_res else tuple(params.frame_size)
+    rx, ry, rw, rh = roi_to_pixels(params.roi, size)
+    if params.full_res:
+        crop = frame[ry:ry + rh, rx:rx + rw]
+    else:
+        sx, sy = fw / size[0], fh / size[1]
+        crop = frame[int(ry * sy):int(round((ry + rh) * sy)), int(rx * sx):int(round((rx + rw) * sx))]
+        if crop.shape[1] != rw or crop.shape[0] != rh:
+            crop = cv2.resize(crop, (rw, rh))
+    return crop, size, (rx, ry, rw, rh)
+
+
+def roi_to_pixels(roi, size):
+    """把比例 ROI 換成 size=(寬, 高) 影像上的像素座標，限制在影像內且最小 10x10"""
+    nx, ny, nw, nh = roi
+    fw, fh = size
+    w = max(10, min(int(round(nw * fw)), fw))
+    h = max(10, min(int(round(nh * fh)), fh))
+    x = max(0, min(int(round(nx * fw)), fw - w))
+    y = max(0, min(int(round(ny * fh)), fh - h))
+    return x, y, w, h
+
+
+def pixels_to_roi(x, y, w, h, size):
+    """像素 ROI（例如預覽畫面上拖曳的框）換成比例 ROI"""
+    fw, fh = size
+    return x / fw, y / fh, w / fw, h / fh
+
+
+def annotate_multi(result, frame, frame_size):
+    """MultiRoiResult 補上預覽、灰階與標註畫面（多 ROI 時框旁標上 ROI 名稱）"""
+    result.frame = make_preview(frame, frame_size)
+    result.gray = cv2.cvtColor(result.frame, cv2.COLOR_BGR2GRAY)
+    img = result.frame.copy()
+    for name, r in result.rois.items():
+        draw_result(img, r, label=name if len(result.rois) > 1 else None)
+    result.annotated = img
+    return result
+
+
+def draw_result(img, result, label=None):
+    """在影像上畫出缺陷框（紅）與 ROI（黃），依 img 與 image_size 的比例換算座標；有熱度圖時先疊在 ROI 上"""
+    sx = img.shape[1] / result.image_size[0]
+    sy = img.shape[0] / result.image_size[1]
+    if result.heatmap is not None:
+        x, y, w, h = result.roi_px
+        draw_heatmap(img, result.heatmap, (int(x * sx), int(y * sy), int(round((x + w) * sx)),
+                                           int(round((y + h) * sy))))
+
+    def corners(boxes):
+        b = np.asarray(boxes, np.float64).reshape(-1, 4)
+        x0, y0 = b[:, 0] * sx, b[:, 1] * sy
+        x1, y1 = (b[:, 0] + b[:, 2]) * sx, (b[:, 1] + b[:, 3]) * sy
+        return list(np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1).astype(np.int32).reshape(-1, 4, 2))
+
+    # 缺陷框一次 polylines 畫完，不逐一呼叫 rectangle
+    if len(result.boxes):
+        cv2.polylines(img, corners(result.boxes), True, (0, 0, 255), 2)
+    cv2.polylines(img, corners([result.roi_px]), True, (0, 255, 255), 2)
+    if label:
+        x, y = int(result.roi_px[0] * sx), int(result.roi_px[1] * sy)
+        cv2.putText(img, f"{label}:{result.defect_count}", (x + 3, max(12, y - 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
+    return img